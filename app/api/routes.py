@@ -1,42 +1,77 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Query, Request, Depends
+from fastapi.responses import StreamingResponse
 # import stripe
-from app.schemas.models import AnalyzeRequest, AnalyzeResponse, FeedbackRequest
-from app.services.transcript import TranscriptService
-from app.services.llm import LLMService
-from app.services.video_metadata import fetch_video_metadata
-from app.services.comments import CommentsService
+from app.schemas.models import (
+    AnalyzeRequest,
+    AnalyzeResponse,
+    BatchAnalyzeRequest,
+    BatchItemResponse,
+    BatchResponse,
+    FeedbackRequest,
+    JobResponse,
+    LibrarySearchResponse,
+    TranscriptPage,
+    TranscriptSearchResponse,
+)
+from app.services.admission import OverloadedError, RateLimitedError, admission
+from app.services.analysis_cache import analysis_cache
+from app.services.auth import InvalidTokenError, token_verifier
+from app.services.analysis_flow import (
+    analysis_etag,
+    analyze_for_user,
+    build_analysis_response,
+    build_transcript_handle,
+    get_shared_analysis,
+    is_legacy_analysis,
+    record_user_analysis,
+)
+from app.services.batch import BATCH_MAX_VIDEOS, Batch, batch_scheduler
+from app.services.generation import SECTIONS
+from app.services.jobs import QueueFullError, job_queue
+from app.services.library import SEARCH_MAX_RESULTS, search_library
+from app.services.progress import progress
+from app.services.transcripts import TRANSCRIPT_MAX_PAGE_SIZE, TRANSCRIPT_PAGE_SIZE, first_page, transcript_store
+from app.services.users import AnalysisContext, CreditsExhaustedError, begin_analysis, get_or_create_user, load_analysis_context, load_user_for_analysis
+from app.utils.http import json_response, not_modified
 from app.utils.logger import logger
-from app.services.supabase_client import supabase
-from jose import jwt
+from app.utils.sse import format_event
+from app.utils.youtube import extract_video_id
+from app.services.supabase_client import supabase, execute
+from app.utils.executors import run_blocking, STAGE_TIMEOUTS
 import asyncio
-import re
 import os
+from dataclasses import asdict
+from functools import lru_cache
+from typing import Optional
 import uuid
-from datetime import datetime, timedelta, timezone
-import razorpay
 
 router = APIRouter()
 
-CLERK_JWT_ISSUER = os.getenv("CLERK_JWT_ISSUER", "https://clerk.com/")
-CLERK_JWT_PUBLIC_KEY = os.getenv("CLERK_JWT_PUBLIC_KEY")
-
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
 
-razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+@lru_cache(maxsize=None)
+def get_razorpay_client():
+    """Created on first use; most cold starts never take a payment."""
+    import razorpay
+    return razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+
+# Analyses are per-user, so only the browser may keep them, and must revalidate
+ANALYSIS_CACHE_CONTROL = os.getenv("ANALYSIS_CACHE_CONTROL", "private, no-cache")
+# Transcripts are only served to users who analyzed the video, so they stay out of shared caches too
+TRANSCRIPT_CACHE_CONTROL = os.getenv("TRANSCRIPT_CACHE_CONTROL", "private, max-age=3600, stale-while-revalidate=86400")
 
 # Helper to get Clerk user from JWT
-def get_clerk_user(request: Request):
+async def get_clerk_user(request: Request):
     auth_header = request.headers.get("authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
     token = auth_header.split(" ", 1)[1]
-    if not CLERK_JWT_PUBLIC_KEY:
-        raise HTTPException(status_code=500, detail="CLERK_JWT_PUBLIC_KEY not set in environment variables")
+    if not token_verifier.configured:
+        raise HTTPException(status_code=500, detail="CLERK_JWT_PUBLIC_KEY or CLERK_JWKS_URL not set in environment variables")
     try:
-        payload = jwt.decode(token, CLERK_JWT_PUBLIC_KEY, algorithms=["RS256"], issuer=CLERK_JWT_ISSUER)
-        return payload
-    except Exception as e:
+        return await token_verifier.verify(token)
+    except InvalidTokenError as e:
         raise HTTPException(status_code=401, detail=f"Invalid Clerk token: {e}")
 
 @router.post("/create-razorpay-order")
@@ -48,7 +83,7 @@ async def create_razorpay_order(clerk_user: dict = Depends(get_clerk_user)):
 
         order_receipt = f"order_{uuid.uuid4().hex[:20]}"
 
-        order = razorpay_client.order.create({
+        order = await run_blocking("payment", get_razorpay_client().order.create, {
             "amount": amount,
             "currency": currency,
             "receipt": order_receipt,
@@ -56,151 +91,334 @@ async def create_razorpay_order(clerk_user: dict = Depends(get_clerk_user)):
             "notes": {
                 "user_id": str(user['id'])
             }
-        })
+        }, timeout=STAGE_TIMEOUTS["payment"])
         return {"order_id": order['id'], "amount": amount, "currency": currency}
     except Exception as e:
         logger.error(f"Error creating Razorpay order: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def clean_section(text: str) -> str:
-    text = re.sub(r"^(here (is|are)\b[^:]*:|summary:|tweet:?|key takeaway:?|takeaway:?|hashtags?:?)", "", text, flags=re.IGNORECASE).strip()
-    return text.strip('"\' \n')
-
-async def get_or_create_user(clerk_user: dict) -> dict:
-    clerk_id = clerk_user["sub"]
-    user_resp = supabase.table("users").select("*").eq("clerk_id", clerk_id).execute()
-    if not user_resp.data:
-        logger.info(f"User with clerk_id {clerk_id} not found. Creating new user.")
-        user_insert = supabase.table("users").insert({
-            "clerk_id": clerk_id,
-            "email": clerk_user.get("email"),
-        }).execute()
-        return user_insert.data[0]
-    else:
-        logger.info(f"User with clerk_id {clerk_id} found. Retrieving existing user.")
-        return user_resp.data[0]
-
-@router.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_video(request: AnalyzeRequest, clerk_user: dict = Depends(get_clerk_user)):
+@router.post("/analyze", response_model=AnalyzeResponse, responses={202: {"model": JobResponse}})
+async def analyze_video(request: AnalyzeRequest, http_request: Request, clerk_user: dict = Depends(get_clerk_user)):
+    try:
+        youtube_video_id = extract_video_id(request.youtube_url)
+        if not youtube_video_id:
+            raise HTTPException(status_code=400, detail="Invalid YouTube URL")
+
+        context = await load_analysis_context(clerk_user, youtube_video_id)
+        admission.remember_tier(clerk_user["sub"], context.user["tier"])
+
+        # Queued jobs are throttled by the queue's own per-user limits instead
+        if request.run_async:
+            job, _ = await job_queue.enqueue(context.user["id"], youtube_video_id, context.user["tier"])
+            return json_response(http_request, build_job_response(job), cache_control="no-store", status_code=202)
+
+        response = await analyze_for_user(context, youtube_video_id, clerk_id=clerk_user["sub"])
+        return json_response(http_request, response, cache_control="no-store")
+
+    except HTTPException:
+        raise
+    except CreditsExhaustedError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except RateLimitedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except (QueueFullError, OverloadedError) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in /analyze: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, request: Request, clerk_user: dict = Depends(get_clerk_user)):
     try:
         user = await get_or_create_user(clerk_user)
-        user_id = user["id"]
+        job = await job_queue.get(job_id)
+        if not job or job["user_id"] != user["id"]:
+            raise HTTPException(status_code=404, detail="Job not found.")
+        return json_response(request, build_job_response(job), cache_control="private, no-cache")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in /jobs: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def build_job_response(job: dict) -> JobResponse:
+    return JobResponse(
+        id=job["id"],
+        status=job["status"],
+        youtube_video_id=job["youtube_video_id"],
+        attempts=job["attempts"],
+        error=job.get("error"),
+        result=job.get("result"),
+        created_at=job.get("created_at"),
+        updated_at=job.get("updated_at"),
+    )
+
+@router.post("/analyze/batch", response_model=BatchResponse, status_code=202)
+async def analyze_batch(request: BatchAnalyzeRequest, clerk_user: dict = Depends(get_clerk_user)):
+    try:
+        video_ids = [extract_video_id(url) for url in request.urls]
+        if not request.url and not video_ids:
+            raise HTTPException(status_code=400, detail="Provide a playlist/channel url or a list of urls.")
+        if not all(video_ids):
+            raise HTTPException(status_code=400, detail="Invalid YouTube URL in urls.")
+
+        user = await load_user_for_analysis(clerk_user)
+        admission.remember_tier(clerk_user["sub"], user["tier"])
 
-        # Monthly credit reset logic
-        last_reset = datetime.fromisoformat(user['credits_last_reset'])
-        if datetime.now(timezone.utc) - last_reset > timedelta(days=30):
-            user['credits_remaining'] = 5 # Reset credits for free tier
-            user['credits_last_reset'] = datetime.now(timezone.utc).isoformat()
-            supabase.table('users').update({
-                'credits_remaining': user['credits_remaining'],
-                'credits_last_reset': user['credits_last_reset']
-            }).eq('id', user_id).execute()
-
-        # Check credits
-        if user['tier'] == 'free' and user['credits_remaining'] <= 0:
-            raise HTTPException(status_code=429, detail="You have exhausted your free credits for the month.")
-
-        # Get or create video
-        video_resp = supabase.table("videos").select("*").eq("youtube_url", request.youtube_url).execute()
-        if not video_resp.data:
-            metadata = fetch_video_metadata(request.youtube_url)
-            if metadata is None:
-                metadata = {}
-            video_insert = supabase.table("videos").insert({
-                "youtube_url": request.youtube_url,
-                "title": metadata.get('title'),
-                "channel_name": metadata.get('channel_name'),
-                "channel_url": metadata.get('channel_url'),
-                "thumbnail_url": metadata.get('thumbnail_url'),
-                "duration_seconds": metadata.get('duration_seconds'),
-                "published_date": metadata.get('published_date').isoformat() if metadata.get('published_date') else None
-            }).execute()
-            video = video_insert.data[0]
-        else:
-            video = video_resp.data[0]
-        video_id = video["id"]
-        logger.info(f"Video object before AnalyzeResponse: {video}")
-
-        # Check for cached analysis
-        analysis = None
+        limit = min(request.max_videos or BATCH_MAX_VIDEOS, BATCH_MAX_VIDEOS)
         try:
-            analysis_resp = supabase.table("video_analysis").select("*").eq("video_id", video_id).eq("user_id", user_id).single().execute()
-            analysis = analysis_resp.data
+            entries = await batch_scheduler.enumerate(request.url, video_ids, limit)
         except Exception as e:
-            # If the error is "no rows", treat as cache miss
-            if hasattr(e, "args") and e.args and ("PGRST116" in str(e.args[0]) or "multiple (or no) rows returned" in str(e.args[0])):
-                analysis = None
-            else:
-                # Re-raise other unexpected exceptions
-                raise
-
-        if analysis:
-            return AnalyzeResponse(
-                **analysis,
-                title=video.get("title"),
-                channel_name=video.get("channel_name"),
-                thumbnail_url=video.get("thumbnail_url")
-            )
-
-        transcript = TranscriptService.fetch_transcript(request.youtube_url)
-        if not transcript:
-            raise HTTPException(status_code=404, detail="Transcript not found.")
-
-        transcript_str = " ".join([entry["text"] for entry in transcript])[:12000]
-
-        # Generate content with OpenAI
-        summary_prompt = f"Summarize the following transcript in 2-3 sentences: {transcript_str}"
-        takeaways_prompt = f"List 5 key takeaways from the following transcript: {transcript_str}"
-        hashtags_prompt = f"Generate 5 relevant hashtags for the following transcript: {transcript_str}"
-        thread_prompt = f"Write a 3-tweet Twitter thread summarizing the following transcript: {transcript_str}"
-
-        summary_resp, takeaways_resp, hashtags_resp, thread_resp = await asyncio.gather(
-            LLMService.generate_content(summary_prompt),
-            LLMService.generate_content(takeaways_prompt),
-            LLMService.generate_content(hashtags_prompt),
-            LLMService.generate_content(thread_prompt),
-        )
-
-        top_comments = CommentsService.fetch_top_comments(request.youtube_url)
-
-        summary = clean_section(summary_resp)
-        key_takeaways = [clean_section(t) for t in re.split(r'^(?:\d+\.\s*|[-•*]\s*)', takeaways_resp, flags=re.MULTILINE) if clean_section(t)][:5]
-        hashtags = [h for h in hashtags_resp.replace(',', ' ').split() if h.startswith('#')][:5]
-        twitter_thread = [clean_section(t) for t in thread_resp.split('\n') if clean_section(t)][:3]
-
-        # Store analysis and decrement credits
-        analysis_insert = supabase.table("video_analysis").insert({
-            "video_id": video_id,
-            "user_id": user_id,
-            "summary": summary,
-            "key_takeaways": key_takeaways,
-            "hashtags": hashtags,
-            "twitter_thread": twitter_thread,
-            "transcript": transcript,
-            "top_comments": top_comments
-        }).execute()
-        analysis = analysis_insert.data[0]
-
-        # Decrement credits and get updated user info
-        updated_user_resp = supabase.table('users').update({'credits_remaining': user['credits_remaining'] - 1}).eq('id', user_id).execute()
-        updated_user = updated_user_resp.data[0]
-
-        # Log usage
-        supabase.table("user_usage").insert({
-            "user_id": user_id,
-            "analysis_id": analysis['id']
-        }).execute()
-
-        return AnalyzeResponse(
-            **analysis,
-            title=video.get("title"),
-            channel_name=video.get("channel_name"),
-            thumbnail_url=video.get("thumbnail_url"),
-            credits_remaining=updated_user['credits_remaining']
-        )
+            logger.warning(f"Could not list videos for {request.url}: {e}")
+            raise HTTPException(status_code=400, detail="Could not list the videos of this playlist or channel.")
+        if not entries:
+            raise HTTPException(status_code=400, detail="No videos found.")
+
+        return build_batch_response(await batch_scheduler.submit(user, entries, clerk_user["sub"]))
+
+    except HTTPException:
+        raise
+    except CreditsExhaustedError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except RateLimitedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.error(f"Error in /analyze/batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/analyze/batch/{batch_id}", response_model=BatchResponse)
+async def get_batch(batch_id: str, clerk_user: dict = Depends(get_clerk_user)):
+    try:
+        user = await get_or_create_user(clerk_user)
+        batch = await batch_scheduler.get(batch_id)
+        if batch is None or batch.user_id != user["id"]:
+            raise HTTPException(status_code=404, detail="Batch not found.")
+        return build_batch_response(batch)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in /analyze/batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
+def build_batch_response(batch: Batch) -> BatchResponse:
+    return BatchResponse(
+        id=batch.id,
+        status=batch.status,
+        total=len(batch.items),
+        counts=batch.counts(),
+        credits_charged=batch.credits_charged,
+        credits_remaining=batch.credits_remaining,
+        error=batch.error,
+        items=[BatchItemResponse(**asdict(item)) for item in batch.items.values()],
+    )
+
+@router.post("/analyze/stream")
+async def analyze_video_stream(request: AnalyzeRequest, clerk_user: dict = Depends(get_clerk_user)):
+    """Server-Sent Events variant of /analyze.
+
+    Emits `metadata`, `transcript`, `summary_delta`, `summary`, `key_takeaways`,
+    `hashtags`, `twitter_thread` and `comments` events as each stage finishes,
+    then a final `done` event carrying the full AnalyzeResponse (or `error`).
+    Persistence and credit rules are the same as /analyze.
+    """
+    youtube_video_id = extract_video_id(request.youtube_url)
+    if not youtube_video_id:
+        raise HTTPException(status_code=400, detail="Invalid YouTube URL")
+    # Credit checks happen before the stream opens so they surface as plain HTTP errors
+    try:
+        context = await load_analysis_context(clerk_user, youtube_video_id)
+        admission.remember_tier(clerk_user["sub"], context.user["tier"])
+    except CreditsExhaustedError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
-        logger.error(f"Error in /analyze: {e}")
+        logger.error(f"Error in /analyze/stream: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        stream_analysis_events(context, youtube_video_id, clerk_user["sub"]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def stream_analysis_events(context: AnalysisContext, youtube_video_id: str, clerk_id: str):
+    user, video, analysis_ref = context.user, context.video, context.analysis_ref
+    sent = set()
+
+    def event(name: str, data) -> str:
+        sent.add(name)
+        return format_event(name, data)
+
+    try:
+        if video:
+            yield event("metadata", video)
+        if is_legacy_analysis(analysis_ref):
+            response = build_analysis_response(analysis_ref, analysis_ref, video)
+            yield format_event("done", response.model_dump(mode="json"))
+            return
+
+        shared = await analysis_cache.get(youtube_video_id)
+        if shared is None:
+            # Subscribe before starting so no pipeline event is missed
+            queue = progress.subscribe(youtube_video_id)
+            emit = lambda name, data: progress.publish(youtube_video_id, name, data)
+            task = asyncio.create_task(get_shared_analysis(youtube_video_id, tier=user["tier"], emit=emit, clerk_id=clerk_id))
+            try:
+                while True:
+                    getter = asyncio.create_task(queue.get())
+                    done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                    if getter not in done:
+                        getter.cancel()
+                        break
+                    name, data = getter.result()
+                    if name != "metadata" or "metadata" not in sent:
+                        yield event(name, data)
+                while not queue.empty():
+                    name, data = queue.get_nowait()
+                    yield event(name, data)
+            finally:
+                progress.unsubscribe(youtube_video_id, queue)
+            shared = await task
+
+        # Anything not streamed (cache hits, or a run owned by another worker) is sent now
+        if "transcript" not in sent:
+            handle = build_transcript_handle(youtube_video_id, shared)
+            yield event("transcript", {"transcript": first_page(shared.get("transcript")), "total_lines": handle.total_lines})
+        for section in SECTIONS:
+            if section not in sent:
+                yield event(section, {section: shared.get(section)})
+        if "comments" not in sent:
+            yield event("comments", {"top_comments": shared.get("top_comments") or []})
+
+        response = await record_user_analysis(user, youtube_video_id, video, analysis_ref, shared)
+        yield format_event("done", response.model_dump(mode="json"))
+    except CreditsExhaustedError as e:
+        yield format_event("error", {"status_code": 429, "detail": str(e)})
+    except RateLimitedError as e:
+        yield format_event("error", {"status_code": 429, "detail": str(e), "retry_after": e.retry_after})
+    except OverloadedError as e:
+        yield format_event("error", {"status_code": 503, "detail": str(e), "retry_after": e.retry_after})
+    except LookupError as e:
+        yield format_event("error", {"status_code": 404, "detail": str(e)})
+    except Exception as e:
+        logger.error(f"Error in /analyze/stream: {e}")
+        yield format_event("error", {"status_code": 500, "detail": str(e)})
+
+async def ensure_video_access(clerk_user: dict, youtube_video_id: str) -> None:
+    """404 unless the user has an analysis of the video, the same as for a missing transcript."""
+    if extract_video_id(youtube_video_id) != youtube_video_id:
+        raise HTTPException(status_code=400, detail="Invalid YouTube video ID")
+    try:
+        context = await begin_analysis(clerk_user, youtube_video_id)
+    except Exception as e:
+        logger.error(f"Error checking access to {youtube_video_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if context.analysis_ref is None:
+        raise HTTPException(status_code=404, detail="Transcript not found.")
+
+@router.get("/videos/{youtube_video_id}/transcript", response_model=TranscriptPage)
+async def get_transcript(
+    youtube_video_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(TRANSCRIPT_PAGE_SIZE, ge=1, le=TRANSCRIPT_MAX_PAGE_SIZE),
+    start: Optional[float] = Query(None, ge=0),
+    end: Optional[float] = Query(None, ge=0),
+    clerk_user: dict = Depends(get_clerk_user),
+):
+    """A page of a video's stored transcript.
+
+    Pages by line `offset`, or from the first line at or after `start` seconds
+    when given; `end` stops before the first line at or after that time.
+    """
+    await ensure_video_access(clerk_user, youtube_video_id)
+    try:
+        transcript = await transcript_store.get(youtube_video_id)
+    except Exception as e:
+        logger.error(f"Error fetching transcript for {youtube_video_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if transcript is None:
+        raise HTTPException(status_code=404, detail="Transcript not found.")
+
+    if start is not None:
+        offset = transcript.index_at(start)
+    stop = transcript.index_at(end) if end is not None else len(transcript)
+    lines = transcript.lines(offset, max(0, min(limit, stop - offset)))
+    page = TranscriptPage(
+        youtube_video_id=youtube_video_id,
+        total_lines=len(transcript),
+        duration_seconds=transcript.duration,
+        offset=offset,
+        lines=lines,
+        next_offset=offset + len(lines) if offset + len(lines) < stop else None,
+    )
+    return json_response(request, page, cache_control=TRANSCRIPT_CACHE_CONTROL)
+
+@router.get("/videos/{youtube_video_id}/search", response_model=TranscriptSearchResponse)
+async def search_transcript(
+    youtube_video_id: str,
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=SEARCH_MAX_RESULTS),
+    clerk_user: dict = Depends(get_clerk_user),
+):
+    """Transcript lines of a video that mention `q`, best match first, with their start times."""
+    await ensure_video_access(clerk_user, youtube_video_id)
+    try:
+        hits = await transcript_store.search(youtube_video_id, q, limit)
+    except Exception as e:
+        logger.error(f"Error searching the transcript of {youtube_video_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if hits is None:
+        raise HTTPException(status_code=404, detail="Transcript not found.")
+    response = TranscriptSearchResponse(youtube_video_id=youtube_video_id, query=q, hits=hits)
+    return json_response(request, response, cache_control=TRANSCRIPT_CACHE_CONTROL)
+
+@router.get("/search", response_model=LibrarySearchResponse)
+async def search_user_library(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_RESULTS),
+    clerk_user: dict = Depends(get_clerk_user),
+):
+    """Search the titles, analyses and transcripts of every video the user has analyzed."""
+    try:
+        results = await search_library(clerk_user, q, limit)
+    except Exception as e:
+        logger.error(f"Error in /search: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return json_response(request, LibrarySearchResponse(query=q, results=results), cache_control=ANALYSIS_CACHE_CONTROL)
+
+@router.get("/videos/{youtube_video_id}/analysis", response_model=AnalyzeResponse)
+async def get_video_analysis(youtube_video_id: str, request: Request, clerk_user: dict = Depends(get_clerk_user)):
+    """The user's existing analysis of a video; never runs or charges anything.
+
+    If-None-Match is answered with 304 from the reference and the content
+    hash alone, before the analysis itself is loaded.
+    """
+    if extract_video_id(youtube_video_id) != youtube_video_id:
+        raise HTTPException(status_code=400, detail="Invalid YouTube video ID")
+    try:
+        context = await begin_analysis(clerk_user, youtube_video_id)
+        analysis_ref = context.analysis_ref
+        if analysis_ref is None:
+            raise HTTPException(status_code=404, detail="Analysis not found.")
+        etag = await analysis_etag(analysis_ref, youtube_video_id)
+        if etag is not None:
+            cached = not_modified(request, etag, ANALYSIS_CACHE_CONTROL)
+            if cached is not None:
+                return cached
+
+        shared = analysis_ref if is_legacy_analysis(analysis_ref) else await analysis_cache.get(youtube_video_id)
+        if shared is None:
+            raise HTTPException(status_code=404, detail="Analysis not found.")
+        response = build_analysis_response(analysis_ref, shared, context.video)
+        return json_response(request, response, etag=etag, cache_control=ANALYSIS_CACHE_CONTROL)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in /videos/{youtube_video_id}/analysis: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/user_info")
@@ -219,12 +437,12 @@ async def get_user_info(clerk_user: dict = Depends(get_clerk_user)):
 async def submit_feedback(request: FeedbackRequest, clerk_user: dict = Depends(get_clerk_user)):
     try:
         user = await get_or_create_user(clerk_user)
-        supabase.table("analysis_feedback").insert({
+        await execute(supabase.table("analysis_feedback").insert({
             "analysis_id": str(request.analysis_id),
             "user_id": str(user["id"]),
             "rating": request.rating,
             "comment": request.comment
-        }).execute()
+        }))
         return {"message": "Feedback submitted successfully"}
     except Exception as e:
         logger.error(f"Error in /feedback: {e}")
@@ -238,10 +456,10 @@ async def upgrade_user(clerk_user: dict = Depends(get_clerk_user)):
 
         # In a real app, you'd have a payment flow here.
         # For this example, we'll just upgrade the user directly.
-        supabase.table("users").update({
+        await execute(supabase.table("users").update({
             "tier": "pro",
             "credits_remaining": 1_000_000 # Effectively unlimited
-        }).eq("id", user_id).execute()
+        }).eq("id", user_id))
 
         return {"message": "User upgraded to pro successfully"}
     except Exception as e:
@@ -1,23 +1,72 @@
+import asyncio
 import os
 from dotenv import load_dotenv
 # Explicitly load .env from project root
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.env'))
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from app.api.routes import router as api_router
+from app.services.auth import token_verifier
+from app.services.jobs import JOB_BACKEND
+from app.services.llm import llm_service
+from app.utils.executors import shutdown_executors
+from app.utils.metrics import MetricsMiddleware, registry
+from app.warmup import APP_WARMUP, WARMUP_TOKEN, warmup, warmup_authorized
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(root_path="/api")
 
 app.include_router(api_router)
 
+# With the in-memory job backend nothing else can see the queue, so the API
+# process runs the worker itself; shared backends use `python -m app.worker`
+JOB_INPROCESS_WORKER = os.getenv("JOB_INPROCESS_WORKER", str(JOB_BACKEND == "local")).lower() == "true"
+job_worker_stop = asyncio.Event()
+
+@app.on_event("startup")
+async def on_startup():
+    await token_verifier.start()
+    if APP_WARMUP:
+        app.state.warmup = asyncio.create_task(warmup())
+    if JOB_INPROCESS_WORKER:
+        from app.worker import JobWorker
+        app.state.job_worker = asyncio.create_task(JobWorker().run(job_worker_stop))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    job_worker_stop.set()
+    if JOB_INPROCESS_WORKER:
+        await app.state.job_worker
+    await llm_service.close()
+    await token_verifier.close()
+    shutdown_executors()
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"} 
 
+@app.get("/warmup")
+async def warmup_endpoint(request: Request):
+    if not WARMUP_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not warmup_authorized(request.headers.get("authorization")):
+        raise HTTPException(status_code=403, detail="Invalid warmup token")
+    return {"status": "ok", "seconds": await warmup()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus exposition of stage latencies, cache, LLM and job counters."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=os.environ.get("FRONTEND_URL", "http://localhost:3000").split(","),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-)
\ No newline at end of file
+    # Lets the frontend read per-stage timings from responses
+    expose_headers=["Server-Timing"],
+)
+
+# Outermost, so the timing covers CORS handling too
+app.add_middleware(MetricsMiddleware)
\ No newline at end of file
@@ -1,14 +1,62 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from datetime import datetime
+from typing import Dict, List, Literal, Optional
 import uuid
 
 class AnalyzeRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     youtube_url: str
+    # {"async": true} queues the analysis and returns a job to poll at /jobs/{id}
+    run_async: bool = Field(False, alias="async")
 
 class TranscriptLine(BaseModel):
     start: float
     text: str
 
+class TranscriptHandle(BaseModel):
+    # The rest of the transcript is served by GET /videos/{youtube_video_id}/transcript
+    youtube_video_id: str
+    total_lines: int
+    next_offset: Optional[int] = None
+
+class TranscriptPage(BaseModel):
+    youtube_video_id: str
+    total_lines: int
+    duration_seconds: Optional[float] = None
+    offset: int
+    lines: List[TranscriptLine]
+    next_offset: Optional[int] = None
+
+class TranscriptHit(BaseModel):
+    # `line` is an offset into GET /videos/{youtube_video_id}/transcript
+    line: int
+    start: float
+    end: Optional[float] = None
+    text: str
+    score: float
+
+class TranscriptSearchResponse(BaseModel):
+    youtube_video_id: str
+    query: str
+    hits: List[TranscriptHit]
+
+class LibrarySearchResult(BaseModel):
+    analysis_id: uuid.UUID
+    youtube_video_id: str
+    title: Optional[str] = None
+    channel_name: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    rank: float
+    # Summary excerpt with the matches wrapped in <b></b>
+    headline: Optional[str] = None
+    transcript_match: bool = False
+    hits: List[TranscriptHit] = []
+
+class LibrarySearchResponse(BaseModel):
+    query: str
+    results: List[LibrarySearchResult]
+
 class Comment(BaseModel):
     text: str
     author: str
@@ -21,7 +69,9 @@ class AnalyzeResponse(BaseModel):
     key_takeaways: List[str]
     hashtags: List[str]
     twitter_thread: List[str]
+    # First page only; see transcript_handle
     transcript: List[TranscriptLine]
+    transcript_handle: Optional[TranscriptHandle] = None
     # Optional video metadata fields
     title: Optional[str] = None
     channel_name: Optional[str] = None
@@ -29,6 +79,46 @@ class AnalyzeResponse(BaseModel):
     credits_remaining: Optional[int] = None # Added for credit tracking
     top_comments: List[Comment] = []
 
+class JobResponse(BaseModel):
+    id: uuid.UUID
+    status: Literal["queued", "running", "succeeded", "failed"]
+    youtube_video_id: str
+    attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[AnalyzeResponse] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class BatchAnalyzeRequest(BaseModel):
+    # A playlist or channel URL, a list of video URLs, or both
+    url: Optional[str] = None
+    urls: List[str] = []
+    max_videos: Optional[int] = Field(None, ge=1)
+
+class BatchItemResponse(BaseModel):
+    youtube_video_id: str
+    title: Optional[str] = None
+    status: str
+    cached: bool = False
+    analysis_id: Optional[uuid.UUID] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    id: uuid.UUID
+    status: Literal["running", "completed", "failed"]
+    total: int
+    counts: Dict[str, int]
+    credits_charged: int = 0
+    credits_remaining: Optional[int] = None
+    error: Optional[str] = None
+    items: List[BatchItemResponse]
+
+class GeneratedSections(BaseModel):
+    summary: str = Field(..., min_length=1)
+    key_takeaways: List[str] = Field(..., min_length=1)
+    hashtags: List[str] = Field(..., min_length=1)
+    twitter_thread: List[str] = Field(..., min_length=1)
+
 class FeedbackRequest(BaseModel):
     analysis_id: uuid.UUID
     rating: int = Field(..., ge=1, le=5)
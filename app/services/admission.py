@@ -0,0 +1,261 @@
+import asyncio
+import math
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from app.utils.cache import LRUCache
+from app.utils.executors import run_blocking
+from app.utils.logger import logger
+from app.utils.metrics import registry
+from app.utils.rate_limit import TokenBucket
+
+ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", "local")
+# "tier:requests_per_minute/burst,..."; a tier that isn't listed is not limited
+ADMISSION_USER_LIMITS = os.getenv("ADMISSION_USER_LIMITS", "free:10/5,basic:30/10,pro:60/20")
+# The same, shared by every user of a tier
+ADMISSION_TIER_LIMITS = os.getenv("ADMISSION_TIER_LIMITS", "free:120/30")
+# Assumed until a user's tier has been seen, so first requests are admitted cheaply
+ADMISSION_DEFAULT_TIER = os.getenv("ADMISSION_DEFAULT_TIER", "free")
+ADMISSION_TIER_CACHE_SECONDS = float(os.getenv("ADMISSION_TIER_CACHE_SECONDS", "300"))
+ADMISSION_MAX_KEYS = int(os.getenv("ADMISSION_MAX_KEYS", "100000"))
+# Pipeline runs per process (0 for no cap), callers allowed to wait for one, and for how long
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+ADMISSION_MAX_WAITING = int(os.getenv("ADMISSION_MAX_WAITING", "32"))
+ADMISSION_WAIT_SECONDS = float(os.getenv("ADMISSION_WAIT_SECONDS", "10"))
+ADMISSION_OVERLOAD_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_OVERLOAD_RETRY_AFTER_SECONDS", "5"))
+
+ADMISSIONS = registry.counter("admission_decisions_total", "Admission decisions for expensive requests", ["result"])
+
+# (key, tokens per second, capacity)
+Bucket = Tuple[str, float, float]
+
+class AdmissionError(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RateLimitedError(AdmissionError):
+    """The user (or their tier) is over its request rate; answered with 429."""
+
+class OverloadedError(AdmissionError):
+    """Too many pipeline runs are already running or waiting; answered with 503."""
+
+def parse_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """"free:4/2,pro:60/10" -> {"free": (4 / 60, 2.0), "pro": (1.0, 10.0)}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        tier, _, limit = item.partition(":")
+        per_minute, _, burst = limit.partition("/")
+        limits[tier.strip()] = (float(per_minute) / 60, float(burst or per_minute))
+    return limits
+
+class RateLimitBackend:
+    """Token buckets keyed by string, taken from all-or-nothing.
+
+    `take` removes `amount` tokens from every bucket and returns 0, or leaves
+    them all untouched and returns the seconds until it could succeed.
+    """
+    shared = True
+
+    def take(self, buckets: List[Bucket], amount: float) -> float:
+        raise NotImplementedError
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """In-process buckets; each worker process then enforces the limits on its own."""
+    shared = False
+
+    def __init__(self, max_keys: int = ADMISSION_MAX_KEYS):
+        # An evicted bucket comes back full, which only ever errs towards admitting
+        self.buckets = LRUCache(maxsize=max_keys)
+
+    def take(self, buckets: List[Bucket], amount: float) -> float:
+        taken = []
+        for key, rate, capacity in buckets:
+            bucket = self.buckets.get(key)
+            if bucket is None or bucket.rate != rate or bucket.capacity != capacity:
+                bucket = TokenBucket(rate, capacity)
+                self.buckets.set(key, bucket)
+            wait = bucket.try_acquire(amount)
+            if wait > 0:
+                for previous in taken:
+                    previous.adjust(-min(amount, previous.capacity))
+                return wait
+            taken.append(bucket)
+        return 0.0
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """Buckets in a SQLite file, shared by every worker on the same host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_limit_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def take(self, buckets: List[Bucket], amount: float) -> float:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            levels, wait = [], 0.0
+            for key, rate, capacity in buckets:
+                row = conn.execute("SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                needed = min(amount, capacity)
+                if tokens < needed:
+                    wait = max(wait, (needed - tokens) / rate)
+                levels.append((key, tokens - needed))
+            if wait == 0:
+                conn.executemany(
+                    "INSERT INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                    [(key, tokens, now) for key, tokens in levels],
+                )
+            conn.execute("COMMIT")
+            return wait
+
+class SupabaseRateLimitBackend(RateLimitBackend):
+    """Buckets in the `rate_limit_buckets` table via the take_rate_limit_tokens function."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def take(self, buckets: List[Bucket], amount: float) -> float:
+        resp = self.client.rpc("take_rate_limit_tokens", {
+            "p_buckets": [{"key": key, "rate": rate, "capacity": capacity} for key, rate, capacity in buckets],
+            "p_amount": amount,
+        }).execute()
+        return float(resp.data or 0)
+
+def create_rate_limit_backend(spec: str = ADMISSION_BACKEND) -> RateLimitBackend:
+    if spec == "local":
+        return LocalRateLimitBackend()
+    if spec.startswith("sqlite:///"):
+        return SQLiteRateLimitBackend(spec[len("sqlite:///"):])
+    if spec == "supabase":
+        from app.services.supabase_client import supabase
+        return SupabaseRateLimitBackend(supabase)
+    raise ValueError(f"Unknown ADMISSION_BACKEND: {spec}")
+
+class AdmissionController:
+    """Decides whether a request may start pipeline work.
+
+    `admit` charges the caller's per-user bucket and their tier's shared
+    bucket, sized by tier. It is called only where a pipeline run is about
+    to start, so reads of owned or already-analyzed videos are never
+    charged. The tier comes from a short-lived cache filled by
+    `remember_tier` once the user row has been loaded, so the check itself
+    costs nothing but the buckets. `pipeline_slot` caps concurrent pipeline
+    runs in this process; up to `max_waiting` callers queue for a slot for
+    `wait_seconds`, and the rest are turned away at once. Background work
+    (batches) passes `block=True` to queue for as long as it takes, outside
+    that limit.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[RateLimitBackend] = None,
+        user_limits: str = ADMISSION_USER_LIMITS,
+        tier_limits: str = ADMISSION_TIER_LIMITS,
+        default_tier: str = ADMISSION_DEFAULT_TIER,
+        max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+        max_waiting: int = ADMISSION_MAX_WAITING,
+        wait_seconds: float = ADMISSION_WAIT_SECONDS,
+    ):
+        self.backend = backend or LocalRateLimitBackend()
+        self.user_limits = parse_limits(user_limits)
+        self.tier_limits = parse_limits(tier_limits)
+        self.default_tier = default_tier
+        self.tiers = LRUCache(maxsize=ADMISSION_MAX_KEYS, ttl=ADMISSION_TIER_CACHE_SECONDS)
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_seconds = wait_seconds
+        self.running = 0
+        self.waiting = 0
+        self.queued = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def remember_tier(self, clerk_id: str, tier: str) -> None:
+        self.tiers.set(clerk_id, tier)
+
+    def buckets(self, clerk_id: str) -> List[Bucket]:
+        tier = self.tiers.get(clerk_id) or self.default_tier
+        buckets = []
+        if tier in self.user_limits:
+            buckets.append((f"user:{clerk_id}", *self.user_limits[tier]))
+        if tier in self.tier_limits:
+            buckets.append((f"tier:{tier}", *self.tier_limits[tier]))
+        return buckets
+
+    async def admit(self, clerk_id: str, amount: float = 1.0) -> None:
+        """Raise RateLimitedError unless the user may start `amount` more analyses now."""
+        buckets = self.buckets(clerk_id)
+        if not buckets:
+            return
+        try:
+            if self.backend.shared:
+                wait = await run_blocking("db", self.backend.take, buckets, amount)
+            else:
+                wait = self.backend.take(buckets, amount)
+        except Exception as e:
+            # A limiter outage shouldn't take /analyze down with it
+            logger.error(f"Rate limit check failed for {clerk_id}, admitting: {e}")
+            ADMISSIONS.inc(result="error")
+            return
+        if wait > 0:
+            ADMISSIONS.inc(result="rate_limited")
+            raise RateLimitedError("Too many analysis requests; slow down.", retry_after=max(1, math.ceil(wait)))
+        ADMISSIONS.inc(result="admitted")
+
+    @asynccontextmanager
+    async def pipeline_slot(self, block: bool = False) -> AsyncIterator[None]:
+        if self.max_concurrent <= 0:
+            yield
+            return
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        if self._slots.locked() and block:
+            self.queued += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self.queued -= 1
+        elif self._slots.locked():
+            if self.waiting >= self.max_waiting:
+                ADMISSIONS.inc(result="overloaded")
+                raise OverloadedError("The analyzer is at capacity; try again shortly.", retry_after=ADMISSION_OVERLOAD_RETRY_AFTER_SECONDS)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.wait_seconds)
+            except asyncio.TimeoutError:
+                ADMISSIONS.inc(result="overloaded")
+                raise OverloadedError("The analyzer is at capacity; try again shortly.", retry_after=ADMISSION_OVERLOAD_RETRY_AFTER_SECONDS) from None
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def metrics(self) -> list:
+        return [
+            "# HELP admission_pipeline_running Pipeline runs holding a slot",
+            "# TYPE admission_pipeline_running gauge",
+            f"admission_pipeline_running {self.running}",
+            "# HELP admission_pipeline_waiting Pipeline runs waiting for a slot",
+            "# TYPE admission_pipeline_waiting gauge",
+            f"admission_pipeline_waiting {self.waiting}",
+            "# HELP admission_pipeline_queued Background pipeline runs queued for a slot",
+            "# TYPE admission_pipeline_queued gauge",
+            f"admission_pipeline_queued {self.queued}",
+        ]
+
+admission = AdmissionController(create_rate_limit_backend())
+registry.collectors.append(admission.metrics)
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from typing import Optional
+from app.services.comments import comment_budget_for_tier
+from app.services.transcript import TranscriptService
+from app.services.transcripts import first_page
+from app.services.generation import Emit, strategy_for_tier
+from app.services.preprocess import transcript_preprocessor
+from app.services.summarizer import transcript_summarizer
+from app.services.source_cache import source_cache
+from app.services.video_metadata import extract_video_details, extract_video_metadata, fallback_metadata
+from app.utils.executors import run_blocking, STAGE_TIMEOUTS
+from app.utils.logger import logger
+from app.utils.metrics import span
+from app.utils.youtube import extract_video_id
+
+class AnalysisService:
+    """YouTube fetches go through the source cache, keyed by canonical video ID."""
+
+    @staticmethod
+    async def fetch_metadata(youtube_url: str) -> dict:
+        try:
+            return await source_cache.get_or_fetch(
+                "metadata",
+                extract_video_id(youtube_url),
+                lambda: run_blocking("ytdlp", extract_video_metadata, youtube_url, timeout=STAGE_TIMEOUTS["metadata"]),
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Metadata fetch timed out for {youtube_url}")
+            return fallback_metadata(youtube_url)
+        except Exception as e:
+            logger.error(f"Error fetching video metadata for {youtube_url} using yt-dlp: {e}")
+            return fallback_metadata(youtube_url)
+
+    @staticmethod
+    async def fetch_details(youtube_url: str, tier: Optional[str] = None) -> dict:
+        """Metadata and top comments from one yt-dlp extraction.
+
+        Cached per comment budget, so a higher tier never gets comments that
+        were crawled under a lower tier's budget.
+        """
+        video_id = extract_video_id(youtube_url)
+        budget = comment_budget_for_tier(tier)
+        cache_key = f"{video_id}@{budget.max_pages}x{budget.seconds:g}"
+
+        async def fetch() -> dict:
+            details = await run_blocking("ytdlp", extract_video_details, youtube_url, tier, timeout=STAGE_TIMEOUTS["comments"])
+            # The same extraction refreshes the metadata entry used by record_user_analysis
+            await source_cache.put("metadata", video_id, details["metadata"])
+            return details
+
+        try:
+            return await source_cache.get_or_fetch("details", cache_key, fetch)
+        except asyncio.TimeoutError:
+            logger.warning(f"Video details fetch timed out for {youtube_url}")
+            return {"metadata": await AnalysisService.fetch_metadata(youtube_url), "top_comments": []}
+        except Exception as e:
+            logger.error(f"Error fetching video details for {youtube_url} using yt-dlp: {e}")
+            return {"metadata": await AnalysisService.fetch_metadata(youtube_url), "top_comments": []}
+
+    @staticmethod
+    async def run_pipeline(youtube_url: str, tier: Optional[str] = None, emit: Optional[Emit] = None) -> dict:
+        """Run metadata, transcript, LLM and comment extraction for a single video.
+
+        The YouTube fetches run concurrently on their own executors; only the LLM
+        calls wait for the transcript. The tier picks the generation strategy and
+        comment budget, and `emit` receives each stage's output as soon as it is
+        ready. The result is user-independent and is what gets stored in the
+        shared analysis layer.
+        """
+        publish = emit or (lambda event, data: None)
+
+        # The comment crawl can take its whole time budget, so metadata comes
+        # from its own quick (and source-cached) fetch to reach the client first
+        async def metadata_stage() -> dict:
+            metadata = await AnalysisService.fetch_metadata(youtube_url)
+            publish("metadata", metadata)
+            return metadata
+
+        async def details_stage() -> dict:
+            details = await AnalysisService.fetch_details(youtube_url, tier)
+            publish("comments", {"top_comments": details["top_comments"]})
+            return details
+
+        metadata_task = asyncio.create_task(metadata_stage())
+        details_task = asyncio.create_task(details_stage())
+        try:
+            transcript = await AnalysisService.fetch_transcript(youtube_url)
+            publish("transcript", {"transcript": first_page(transcript), "total_lines": len(transcript)})
+            generated = await AnalysisService.generate(transcript, tier=tier, emit=emit)
+            metadata, details = await asyncio.gather(metadata_task, details_task)
+        except BaseException:
+            metadata_task.cancel()
+            details_task.cancel()
+            raise
+
+        return {
+            **generated,
+            "transcript": transcript,
+            "top_comments": details["top_comments"],
+            # The full extraction's metadata is the fresher of the two unless it fell back
+            "metadata": metadata if details["metadata"].get("fallback") else details["metadata"],
+        }
+
+    @staticmethod
+    async def fetch_transcript(youtube_url: str) -> list:
+        try:
+            transcript = await source_cache.get_or_fetch(
+                "transcript",
+                extract_video_id(youtube_url),
+                lambda: run_blocking("transcript", TranscriptService.fetch_transcript, youtube_url, timeout=STAGE_TIMEOUTS["transcript"]),
+            )
+        except asyncio.TimeoutError:
+            raise RuntimeError("Timed out fetching transcript.")
+        if not transcript:
+            raise LookupError("Transcript not found.")
+        return transcript
+
+    @staticmethod
+    async def generate(transcript: list, tier: Optional[str] = None, emit: Optional[Emit] = None) -> dict:
+        """The LLM half of the pipeline: preprocess, condense and generate the sections."""
+        with span("preprocess"):
+            preprocessed = await run_blocking("cpu", transcript_preprocessor.process, transcript)
+        logger.info(f"Preprocessed transcript: {preprocessed.report()}")
+
+        # Long transcripts are condensed map-reduce style instead of being truncated
+        map_started = time.monotonic()
+        with span("condense"):
+            condensed = await transcript_summarizer.condense(preprocessed.segments)
+        map_latency = time.monotonic() - map_started
+
+        with span("generate"):
+            generation = await strategy_for_tier(tier).generate(condensed.text, emit=emit)
+        generation.stats.merge(condensed.stats)
+        generation.stats.chunks = condensed.chunks
+        generation.stats.latency += map_latency
+
+        return {
+            **generation.sections,
+            "generation": generation.stats.as_dict(),
+            "preprocessing": preprocessed.report(),
+        }
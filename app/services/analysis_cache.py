@@ -0,0 +1,96 @@
+import hashlib
+import os
+from typing import Dict, List, Optional
+from app.services.supabase_client import supabase, execute
+from app.services.transcripts import first_page, transcript_store
+from app.utils.cache import LRUCache
+from app.utils.http import dumps
+from app.utils.logger import logger
+from app.utils.metrics import registry
+
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "256"))
+ANALYSIS_CACHE_TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "3600"))
+
+# Content columns of the shared, user-independent analysis layer
+ANALYSIS_FIELDS = ("summary", "key_takeaways", "hashtags", "twitter_thread", "transcript", "top_comments")
+
+def compute_content_hash(row: dict) -> str:
+    content = {field: row.get(field) for field in (*ANALYSIS_FIELDS, "transcript_lines")}
+    return hashlib.sha256(dumps(content, sort_keys=True)).hexdigest()[:32]
+
+def shared_row(video_id: str, sections: dict) -> dict:
+    row = {"youtube_video_id": video_id}
+    row.update({field: sections.get(field) for field in ANALYSIS_FIELDS})
+    row["transcript"] = first_page(sections.get("transcript"))
+    row["transcript_lines"] = len(sections.get("transcript") or [])
+    row["content_hash"] = compute_content_hash(row)
+    return row
+
+ANALYSIS_CACHE_LOOKUPS = registry.counter("analysis_cache_lookups_total", "Shared analysis lookups by where they were answered", ["result"])
+
+class AnalysisCache:
+    """Shared analysis layer keyed on the canonical 11-character video ID.
+
+    Lookups go through an in-process LRU/TTL tier before falling back to the
+    `shared_analysis` table, so hot videos never leave the process. Rows only
+    hold the first page of the transcript; the full one goes to the
+    transcript store.
+    """
+
+    def __init__(self, maxsize: int = ANALYSIS_CACHE_SIZE, ttl: float = ANALYSIS_CACHE_TTL_SECONDS):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, video_id: str) -> Optional[dict]:
+        analysis = self.memory.get(video_id)
+        if analysis is not None:
+            ANALYSIS_CACHE_LOOKUPS.inc(result="memory")
+            return analysis
+        resp = await execute(supabase.table("shared_analysis").select("*").eq("youtube_video_id", video_id).limit(1))
+        if not resp.data:
+            ANALYSIS_CACHE_LOOKUPS.inc(result="miss")
+            return None
+        ANALYSIS_CACHE_LOOKUPS.inc(result="db")
+        analysis = resp.data[0]
+        self.memory.set(video_id, analysis)
+        return analysis
+
+    async def content_hash(self, video_id: str) -> Optional[str]:
+        """The stored analysis's content hash, without loading the row when it isn't cached."""
+        analysis = self.memory.get(video_id)
+        if analysis is None:
+            resp = await execute(supabase.table("shared_analysis").select("content_hash").eq("youtube_video_id", video_id).limit(1))
+            if not resp.data:
+                return None
+            if resp.data[0]["content_hash"]:
+                return resp.data[0]["content_hash"]
+            analysis = await self.get(video_id)
+        return analysis.get("content_hash") or compute_content_hash(analysis)
+
+    async def put(self, video_id: str, sections: dict) -> dict:
+        await transcript_store.put_many({video_id: sections.get("transcript")})
+        resp = await execute(supabase.table("shared_analysis").upsert(shared_row(video_id, sections), on_conflict="youtube_video_id"))
+        analysis = resp.data[0]
+        self.memory.set(video_id, analysis)
+        logger.info(f"Stored shared analysis for video {video_id}")
+        return analysis
+
+    async def get_many(self, video_ids: List[str]) -> Dict[str, dict]:
+        found = {}
+        missing = []
+        for video_id in video_ids:
+            analysis = self.memory.get(video_id)
+            if analysis is not None:
+                found[video_id] = analysis
+            else:
+                missing.append(video_id)
+        if missing:
+            resp = await execute(supabase.table("shared_analysis").select("*").in_("youtube_video_id", missing))
+            for analysis in resp.data:
+                self.memory.set(analysis["youtube_video_id"], analysis)
+                found[analysis["youtube_video_id"]] = analysis
+            ANALYSIS_CACHE_LOOKUPS.inc(len(resp.data), result="db")
+            ANALYSIS_CACHE_LOOKUPS.inc(len(missing) - len(resp.data), result="miss")
+        ANALYSIS_CACHE_LOOKUPS.inc(len(video_ids) - len(missing), result="memory")
+        return found
+
+analysis_cache = AnalysisCache()
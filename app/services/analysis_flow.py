@@ -0,0 +1,192 @@
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.schemas.models import AnalyzeResponse, TranscriptHandle
+from app.services.admission import admission
+from app.services.analysis import AnalysisService
+from app.services.analysis_cache import analysis_cache, compute_content_hash, ANALYSIS_FIELDS
+from app.services.generation import Emit
+from app.services.llm import llm_cost
+from app.services.singleflight import analysis_flight
+from app.services.supabase_client import supabase, execute
+from app.services.transcripts import first_page
+from app.services.users import AnalysisContext, CreditsExhaustedError
+from app.utils.http import make_etag
+from app.utils.logger import logger
+from app.utils.metrics import current_request
+from app.utils.youtube import canonical_url
+
+# Produces the sections run_pipeline would, including "metadata"
+Pipeline = Callable[[], Awaitable[dict]]
+
+async def get_video(youtube_video_id: str) -> Optional[dict]:
+    video_resp = await execute(supabase.table("videos").select("*").eq("youtube_video_id", youtube_video_id))
+    return video_resp.data[0] if video_resp.data else None
+
+def video_row(youtube_video_id: str, metadata: dict) -> dict:
+    return {
+        "youtube_url": canonical_url(youtube_video_id),
+        "youtube_video_id": youtube_video_id,
+        "title": metadata.get('title'),
+        "channel_name": metadata.get('channel_name'),
+        "channel_url": metadata.get('channel_url'),
+        "thumbnail_url": metadata.get('thumbnail_url'),
+        "duration_seconds": metadata.get('duration_seconds'),
+        "published_date": metadata.get('published_date').isoformat() if metadata.get('published_date') else None
+    }
+
+async def upsert_video(youtube_video_id: str, metadata: dict) -> dict:
+    # Upsert so concurrent first requests for the same video don't collide on the UNIQUE key
+    video_insert = await execute(supabase.table("videos").upsert(video_row(youtube_video_id, metadata), on_conflict="youtube_video_id"))
+    return video_insert.data[0]
+
+async def upsert_videos(entries: List[dict]) -> Dict[str, dict]:
+    """Create any missing video rows in one upsert; return every row keyed by video ID."""
+    if not entries:
+        return {}
+    await execute(supabase.table("videos").upsert(
+        [video_row(entry["youtube_video_id"], entry) for entry in entries],
+        on_conflict="youtube_video_id", ignore_duplicates=True,
+    ))
+    return await get_videos([entry["youtube_video_id"] for entry in entries])
+
+async def get_videos(youtube_video_ids: List[str]) -> Dict[str, dict]:
+    if not youtube_video_ids:
+        return {}
+    videos_resp = await execute(supabase.table("videos").select("*").in_("youtube_video_id", youtube_video_ids))
+    return {video["youtube_video_id"]: video for video in videos_resp.data}
+
+def is_legacy_analysis(analysis_ref: Optional[dict]) -> bool:
+    # Rows written before the shared layer existed carry their own content
+    return bool(analysis_ref and not analysis_ref.get("shared_analysis_id") and analysis_ref.get("summary"))
+
+async def run_shared_analysis(youtube_video_id: str, tier: Optional[str] = None, emit: Optional[Emit] = None, run: Optional[Pipeline] = None, block: bool = False) -> dict:
+    # Another worker may have finished while we were waiting for the lease
+    shared = await analysis_cache.get(youtube_video_id)
+    if shared is not None:
+        return shared
+    async with admission.pipeline_slot(block=block):
+        logger.info(f"No shared analysis for video {youtube_video_id}. Running pipeline.")
+        if run is None:
+            sections = await AnalysisService.run_pipeline(canonical_url(youtube_video_id), tier=tier, emit=emit)
+        else:
+            sections = await run()
+    # Metadata came from the same concurrent fetch, so store the video row now. Placeholder
+    # metadata would blank out a stored row; record_user_analysis creates a missing one.
+    if not sections["metadata"].get("fallback"):
+        await upsert_video(youtube_video_id, sections["metadata"])
+    return await analysis_cache.put(youtube_video_id, sections)
+
+async def get_shared_analysis(youtube_video_id: str, tier: Optional[str] = None, emit: Optional[Emit] = None, run: Optional[Pipeline] = None, block: bool = False, clerk_id: Optional[str] = None) -> dict:
+    """The video's shared analysis, running the pipeline at most once across workers.
+
+    `run` replaces run_pipeline (batches bring their own staged version) and
+    `block` waits for a pipeline slot instead of failing when they're busy.
+    With `clerk_id`, that user's admission buckets are charged when this
+    call starts a run; cache hits and joining a run already in flight in
+    this process are free. The charge happens before joining, so one user's
+    rate limit never fails the run for everyone waiting on it.
+    """
+    shared = await analysis_cache.get(youtube_video_id)
+    if shared is None:
+        if clerk_id is not None and not analysis_flight.in_flight(youtube_video_id):
+            await admission.admit(clerk_id)
+        shared = await analysis_flight.do(
+            youtube_video_id,
+            lambda: run_shared_analysis(youtube_video_id, tier=tier, emit=emit, run=run, block=block),
+            lookup=lambda: analysis_cache.get(youtube_video_id),
+        )
+    return shared
+
+def build_transcript_handle(youtube_video_id: str, shared: dict) -> TranscriptHandle:
+    # Legacy rows still hold the whole transcript and have no line count
+    total_lines = shared.get("transcript_lines")
+    if total_lines is None:
+        total_lines = len(shared.get("transcript") or [])
+    page = len(first_page(shared.get("transcript")))
+    return TranscriptHandle(youtube_video_id=youtube_video_id, total_lines=total_lines, next_offset=page if page < total_lines else None)
+
+async def analysis_etag(analysis_ref: dict, youtube_video_id: str) -> Optional[str]:
+    """Strong validator for the user's analysis, from its ID and the content hash alone."""
+    if is_legacy_analysis(analysis_ref):
+        content_hash = compute_content_hash(analysis_ref)
+    else:
+        content_hash = await analysis_cache.content_hash(youtube_video_id)
+    return make_etag(analysis_ref["id"], content_hash) if content_hash else None
+
+def build_analysis_response(analysis_ref: dict, shared: dict, video: dict, credits_remaining=None) -> AnalyzeResponse:
+    sections = {field: shared.get(field) for field in ANALYSIS_FIELDS}
+    sections["top_comments"] = sections["top_comments"] or []
+    sections["transcript"] = first_page(sections["transcript"])
+    youtube_video_id = shared.get("youtube_video_id") or video.get("youtube_video_id")
+    return AnalyzeResponse(
+        id=analysis_ref["id"],
+        **sections,
+        transcript_handle=build_transcript_handle(youtube_video_id, shared) if youtube_video_id else None,
+        title=video.get("title"),
+        channel_name=video.get("channel_name"),
+        thumbnail_url=video.get("thumbnail_url"),
+        credits_remaining=credits_remaining
+    )
+
+class VideoNotFoundError(LookupError):
+    pass
+
+async def record_analysis(user_id: str, youtube_video_id: str, shared_analysis_id: str, video: Optional[dict] = None) -> dict:
+    # Loaded with the Supabase client, not at import
+    from postgrest.exceptions import APIError
+    # LLM usage of the current request; zero when the analysis came from the shared layer
+    request = current_request()
+    prompt_tokens, completion_tokens = (request.prompt_tokens, request.completion_tokens) if request else (0, 0)
+    try:
+        resp = await execute(supabase.rpc("record_analysis", {
+            "p_user_id": user_id,
+            "p_youtube_video_id": youtube_video_id,
+            "p_shared_analysis_id": shared_analysis_id,
+            "p_video": video,
+            "p_tokens_used": prompt_tokens + completion_tokens,
+            "p_cost": llm_cost(prompt_tokens, completion_tokens),
+        }))
+    except APIError as e:
+        if e.message == "credits_exhausted":
+            raise CreditsExhaustedError("You have exhausted your free credits for the month.")
+        if e.message == "video_not_found":
+            raise VideoNotFoundError(f"Video {youtube_video_id} is not recorded yet.")
+        raise
+    return resp.data
+
+async def record_batch(user_id: str, items: List[dict]) -> dict:
+    """References, usage rows and the credit charge for a batch, in one transaction."""
+    from postgrest.exceptions import APIError
+    try:
+        resp = await execute(supabase.rpc("record_batch_analyses", {"p_user_id": user_id, "p_items": items}))
+    except APIError as e:
+        if e.message == "credits_exhausted":
+            raise CreditsExhaustedError("Not enough credits left for these analyses.")
+        raise
+    return resp.data
+
+async def record_user_analysis(user: dict, youtube_video_id: str, video: Optional[dict], analysis_ref: Optional[dict], shared: dict) -> AnalyzeResponse:
+    """Point the user's reference at the shared analysis, charging a credit for new ones.
+
+    The record_analysis function does the video, reference, credit and usage
+    writes in one transaction; a concurrent request from the same user that
+    inserted the reference first is the one that pays.
+    """
+    if analysis_ref and analysis_ref.get("shared_analysis_id") == shared["id"]:
+        return build_analysis_response(analysis_ref, shared, video)
+
+    try:
+        recorded = await record_analysis(user["id"], youtube_video_id, shared["id"])
+    except VideoNotFoundError:
+        # The pipeline run stores the row, so this is a cache hit on a video nobody has recorded yet
+        metadata = await AnalysisService.fetch_metadata(canonical_url(youtube_video_id))
+        recorded = await record_analysis(user["id"], youtube_video_id, shared["id"], video_row(youtube_video_id, metadata))
+
+    credits_remaining = recorded["credits_remaining"] if recorded["charged"] else None
+    return build_analysis_response(recorded["analysis"], shared, recorded["video"], credits_remaining=credits_remaining)
+
+async def analyze_for_user(context: AnalysisContext, youtube_video_id: str, clerk_id: Optional[str] = None) -> AnalyzeResponse:
+    """The full /analyze flow for an already credit-checked user, rate-limited as `clerk_id` when given."""
+    if is_legacy_analysis(context.analysis_ref):
+        return build_analysis_response(context.analysis_ref, context.analysis_ref, context.video)
+    shared = await get_shared_analysis(youtube_video_id, tier=context.user["tier"], clerk_id=clerk_id)
+    return await record_user_analysis(context.user, youtube_video_id, context.video, context.analysis_ref, shared)
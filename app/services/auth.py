@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, Optional
+from app.utils.cache import LRUCache
+from app.utils.logger import logger
+from app.utils.metrics import registry, span
+
+CLERK_JWT_ISSUER = os.getenv("CLERK_JWT_ISSUER", "https://clerk.com/")
+CLERK_JWT_PUBLIC_KEY = os.getenv("CLERK_JWT_PUBLIC_KEY")
+# Clerk's (or a local stand-in's) key set, e.g. https://<frontend-api>/.well-known/jwks.json
+CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL")
+CLERK_JWKS_REFRESH_SECONDS = float(os.getenv("CLERK_JWKS_REFRESH_SECONDS", "3600"))
+# Unknown `kid`s trigger a refetch at most this often
+CLERK_JWKS_MIN_REFRESH_SECONDS = float(os.getenv("CLERK_JWKS_MIN_REFRESH_SECONDS", "30"))
+CLERK_JWKS_TIMEOUT_SECONDS = float(os.getenv("CLERK_JWKS_TIMEOUT_SECONDS", "5"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# Upper bound for tokens without `exp`, and for long-lived ones
+AUTH_CACHE_MAX_TTL_SECONDS = float(os.getenv("AUTH_CACHE_MAX_TTL_SECONDS", "3600"))
+
+ALGORITHMS = ["RS256"]
+
+AUTH_CACHE_LOOKUPS = registry.counter("auth_token_cache_total", "Verified-token cache lookups", ["result"])
+AUTH_FAILURES = registry.counter("auth_failures_total", "Rejected bearer tokens", ["reason"])
+JWKS_REFRESHES = registry.counter("auth_jwks_refreshes_total", "JWKS fetches", ["outcome"])
+
+class InvalidTokenError(Exception):
+    pass
+
+class TokenVerifier:
+    """Verifies Clerk session tokens.
+
+    Key material is parsed once: the static PEM from CLERK_JWT_PUBLIC_KEY on
+    first use (or warmup), and the JWKS at CLERK_JWKS_URL on start and then every
+    `refresh_interval` in the background, or early when a token names a `kid`
+    we haven't seen. Verified claims are cached by the token's SHA-256 until
+    its `exp`, so repeat requests with the same token skip the RSA check.
+    A cached token stops being accepted as soon as its key leaves the key set.
+    """
+
+    def __init__(
+        self,
+        issuer: str = CLERK_JWT_ISSUER,
+        public_key: Optional[str] = CLERK_JWT_PUBLIC_KEY,
+        jwks_url: Optional[str] = CLERK_JWKS_URL,
+        refresh_interval: float = CLERK_JWKS_REFRESH_SECONDS,
+        min_refresh_interval: float = CLERK_JWKS_MIN_REFRESH_SECONDS,
+        cache_size: int = AUTH_CACHE_SIZE,
+        max_ttl: float = AUTH_CACHE_MAX_TTL_SECONDS,
+    ):
+        self.issuer = issuer
+        self.jwks_url = jwks_url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.max_ttl = max_ttl
+        self.public_key = public_key
+        self._static_key = None
+        self._static_key_loaded = False
+        self.keys: Dict[str, object] = {}
+        self.cache = LRUCache(maxsize=cache_size)
+        self._last_refresh = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.public_key) or bool(self.jwks_url)
+
+    @property
+    def static_key(self):
+        if not self._static_key_loaded:
+            from jose import jwk
+            from jose.exceptions import JOSEError
+            self._static_key_loaded = True
+            if self.public_key:
+                try:
+                    self._static_key = jwk.construct(self.public_key, ALGORITHMS[0])
+                except JOSEError as e:
+                    logger.error(f"Could not parse CLERK_JWT_PUBLIC_KEY: {e}")
+        return self._static_key
+
+    async def verify(self, token: str) -> dict:
+        cache_key = hashlib.sha256(token.encode()).digest()
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            kid, claims = cached
+            if kid is None or kid in self.keys:
+                AUTH_CACHE_LOOKUPS.inc(result="hit")
+                return dict(claims)
+            self.cache.pop(cache_key)
+        AUTH_CACHE_LOOKUPS.inc(result="miss")
+
+        from jose import jwt
+        from jose.exceptions import JOSEError
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except JOSEError as e:
+            AUTH_FAILURES.inc(reason="malformed")
+            raise InvalidTokenError(str(e)) from e
+        key = self.keys.get(kid) if kid is not None else None
+        if key is None and kid is not None and self.jwks_url:
+            await self.refresh(force=False)
+            key = self.keys.get(kid)
+        if key is None:
+            key = self.static_key
+        if key is None:
+            AUTH_FAILURES.inc(reason="unknown_key")
+            raise InvalidTokenError(f"Unknown signing key {kid}")
+
+        try:
+            with span("auth"):
+                claims = jwt.decode(token, key, algorithms=ALGORITHMS, issuer=self.issuer)
+        except JOSEError as e:
+            AUTH_FAILURES.inc(reason=type(e).__name__)
+            raise InvalidTokenError(str(e)) from e
+
+        ttl = self.max_ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            ttl = min(ttl, claims["exp"] - time.time())
+        if ttl > 0:
+            self.cache.set(cache_key, (kid if kid in self.keys else None, claims), ttl=ttl)
+        return dict(claims)
+
+    async def refresh(self, force: bool = True) -> None:
+        """Refetch the JWKS; concurrent callers share one fetch."""
+        if not self.jwks_url:
+            return
+        if not force and time.monotonic() - self._last_refresh < self.min_refresh_interval:
+            return
+        if self._refresh is None:
+            self._refresh = asyncio.create_task(self._fetch_keys())
+            self._refresh.add_done_callback(self._refreshed)
+        await asyncio.shield(self._refresh)
+
+    def _refreshed(self, task: asyncio.Task) -> None:
+        self._refresh = None
+
+    async def _fetch_keys(self) -> None:
+        import httpx
+        from jose import jwk
+        from jose.exceptions import JOSEError
+        self._last_refresh = time.monotonic()
+        try:
+            async with httpx.AsyncClient(timeout=CLERK_JWKS_TIMEOUT_SECONDS) as client:
+                resp = await client.get(self.jwks_url)
+                resp.raise_for_status()
+                jwks = resp.json()
+            keys = {}
+            for key in jwks.get("keys", []):
+                if key.get("kty") != "RSA" or key.get("use", "sig") != "sig" or not key.get("kid"):
+                    continue
+                keys[key["kid"]] = jwk.construct(key, key.get("alg", ALGORITHMS[0]))
+        except (httpx.HTTPError, ValueError, JOSEError) as e:
+            JWKS_REFRESHES.inc(outcome="error")
+            logger.warning(f"Failed to refresh JWKS from {self.jwks_url}: {e}")
+            return
+        JWKS_REFRESHES.inc(outcome="ok")
+        if set(keys) != set(self.keys):
+            logger.info(f"JWKS now has keys {sorted(keys)}")
+        self.keys = keys
+
+    async def start(self) -> None:
+        if not self.jwks_url:
+            return
+        await self.refresh()
+        self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+    async def close(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+
+    def metrics(self) -> list:
+        return [
+            "# HELP auth_token_cache_entries Verified tokens currently cached",
+            "# TYPE auth_token_cache_entries gauge",
+            f"auth_token_cache_entries {len(self.cache)}",
+            "# TYPE auth_jwks_keys gauge",
+            f"auth_jwks_keys {len(self.keys)}",
+        ]
+
+token_verifier = TokenVerifier()
+registry.collectors.append(token_verifier.metrics)
@@ -0,0 +1,288 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+from app.services.admission import admission
+from app.services.analysis import AnalysisService
+from app.services.analysis_cache import analysis_cache
+from app.services.analysis_flow import get_shared_analysis, get_videos, record_batch, upsert_videos
+from app.services.jobs import JobQueue, job_queue
+from app.services.llm import llm_cost
+from app.services.supabase_client import supabase, execute
+from app.services.users import CreditsExhaustedError, get_user
+from app.services.video_metadata import fetch_playlist_entries
+from app.utils.cache import LRUCache
+from app.utils.executors import run_blocking, STAGE_TIMEOUTS
+from app.utils.logger import logger
+from app.utils.youtube import canonical_url
+
+BATCH_MAX_VIDEOS = int(os.getenv("BATCH_MAX_VIDEOS", "200"))
+# Process-wide limits shared by every running batch
+BATCH_FETCH_CONCURRENCY = int(os.getenv("BATCH_FETCH_CONCURRENCY", "4"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+# Batch videos in the shared pipeline at once, per process; defaults to both stages' slots
+BATCH_MAX_RUNNING = int(os.getenv("BATCH_MAX_RUNNING", str(BATCH_FETCH_CONCURRENCY + BATCH_LLM_CONCURRENCY)))
+BATCH_RETENTION_SECONDS = float(os.getenv("BATCH_RETENTION_SECONDS", "86400"))
+# Progress is written to the job backend this often; a running batch not saved for
+# BATCH_STALE_SECONDS is reported as interrupted (its worker went away)
+BATCH_SAVE_SECONDS = float(os.getenv("BATCH_SAVE_SECONDS", "2"))
+BATCH_STALE_SECONDS = float(os.getenv("BATCH_STALE_SECONDS", "60"))
+
+@dataclass
+class BatchItem:
+    youtube_video_id: str
+    title: Optional[str] = None
+    # pending -> fetching -> waiting_llm -> generating -> generated -> done; or failed / skipped
+    status: str = "pending"
+    cached: bool = False
+    analysis_id: Optional[str] = None
+    error: Optional[str] = None
+    tokens_used: int = 0
+    cost: float = 0.0
+
+@dataclass
+class Batch:
+    id: str
+    user_id: str
+    items: Dict[str, BatchItem]
+    status: str = "running"
+    credits_charged: int = 0
+    credits_remaining: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    saved_at: Optional[float] = None
+
+    def counts(self) -> Dict[str, int]:
+        return dict(Counter(item.status for item in self.items.values()))
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "Batch":
+        items = {video_id: BatchItem(**item) for video_id, item in state["items"].items()}
+        return cls(**{**state, "items": items})
+
+def list_batch_videos(url: Optional[str], video_ids: List[str], limit: int = BATCH_MAX_VIDEOS) -> List[dict]:
+    """Resolve a playlist/channel URL and/or a list of video IDs into unique video entries."""
+    entries: Dict[str, dict] = {}
+    if url:
+        for entry in fetch_playlist_entries(url, limit):
+            entries.setdefault(entry["youtube_video_id"], entry)
+    for video_id in video_ids:
+        entries.setdefault(video_id, {"youtube_video_id": video_id})
+    return list(entries.values())[:limit]
+
+class BatchScheduler:
+    """Throughput-oriented runner for playlist and channel batches.
+
+    Each video goes through the same per-video lease and admission pipeline
+    slot as /analyze, so a video being analyzed elsewhere is waited for
+    rather than run twice. Inside, it moves through two stages with separate,
+    process-wide slot pools: YouTube fetches (the transcript, plus comments
+    and metadata from one extraction) and LLM generation. A video releases
+    its fetch slot before queuing for an LLM slot, so downloads for later
+    videos overlap generation for earlier ones. At most `max_running` batch
+    videos hold or wait for a pipeline slot at once, leaving the rest for
+    interactive requests. Videos with a shared analysis skip all of this, and
+    all of the user's references and credits are recorded in one
+    transaction at the end.
+
+    The running process keeps its batches in memory and saves them to the
+    job backend every `save_interval` seconds and when they finish, so other
+    workers can report on them and outlive a restart.
+    """
+
+    def __init__(
+        self,
+        queue: Optional[JobQueue] = None,
+        fetch_concurrency: int = BATCH_FETCH_CONCURRENCY,
+        llm_concurrency: int = BATCH_LLM_CONCURRENCY,
+        max_running: int = BATCH_MAX_RUNNING,
+        save_interval: float = BATCH_SAVE_SECONDS,
+    ):
+        self.queue = queue or job_queue
+        self.fetch_slots = asyncio.Semaphore(fetch_concurrency)
+        self.llm_slots = asyncio.Semaphore(llm_concurrency)
+        self.run_slots = asyncio.Semaphore(max_running)
+        self.save_interval = save_interval
+        self.batches = LRUCache(maxsize=1024, ttl=BATCH_RETENTION_SECONDS)
+        self._tasks = set()
+
+    async def enumerate(self, url: Optional[str], video_ids: List[str], limit: int = BATCH_MAX_VIDEOS) -> List[dict]:
+        return await run_blocking("ytdlp", list_batch_videos, url, video_ids, limit, timeout=STAGE_TIMEOUTS["playlist"])
+
+    async def submit(self, user: dict, entries: List[dict], clerk_id: str) -> Batch:
+        """Start a batch; raises RateLimitedError if the videos it has to analyze exceed the user's rate."""
+        batch = Batch(
+            id=str(uuid.uuid4()),
+            user_id=user["id"],
+            items={entry["youtube_video_id"]: BatchItem(entry["youtube_video_id"], title=entry.get("title")) for entry in entries},
+        )
+        chargeable, shared = await self._plan(batch, user)
+        # Owned and already-analyzed videos are cheap; only pipeline runs count against the rate
+        to_run = sum(1 for video_id in chargeable if video_id not in shared)
+        if to_run:
+            await admission.admit(clerk_id, amount=to_run)
+        self.batches.set(batch.id, batch)
+        await self._save(batch)
+        task = asyncio.create_task(self._run(batch, user, {entry["youtube_video_id"]: entry for entry in entries}, chargeable, shared))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        logger.info(f"Started batch {batch.id} of {len(entries)} videos for user {user['id']}")
+        return batch
+
+    async def get(self, batch_id: str) -> Optional[Batch]:
+        batch = self.batches.get(batch_id)
+        if batch is not None:
+            return batch
+        state = await self.queue.get_batch(batch_id)
+        if state is None:
+            return None
+        batch = Batch.from_dict(state)
+        if batch.status == "running" and time.time() - (batch.saved_at or batch.created_at) > BATCH_STALE_SECONDS:
+            batch.status, batch.error = "failed", "The batch was interrupted; submit it again to finish the remaining videos."
+        return batch
+
+    async def _save(self, batch: Batch) -> None:
+        batch.saved_at = time.time()
+        try:
+            await self.queue.save_batch(asdict(batch))
+        except Exception as e:
+            logger.error(f"Failed to save batch {batch.id}: {e}")
+
+    async def _save_periodically(self, batch: Batch) -> None:
+        while True:
+            await asyncio.sleep(self.save_interval)
+            await self._save(batch)
+
+    async def _run(self, batch: Batch, user: dict, entries: Dict[str, dict], chargeable: List[str], shared: Dict[str, dict]) -> None:
+        saver = asyncio.create_task(self._save_periodically(batch))
+        try:
+            await self._process(batch, user, entries, chargeable, shared)
+            batch.status = "completed"
+        except Exception as e:
+            logger.error(f"Batch {batch.id} failed: {e}")
+            batch.status = "failed"
+            batch.error = str(e)
+        finally:
+            saver.cancel()
+            batch.finished_at = time.time()
+            await self._save(batch)
+            logger.info(f"Batch {batch.id} {batch.status}: {batch.counts()}")
+
+    async def _plan(self, batch: Batch, user: dict) -> Tuple[List[str], Dict[str, dict]]:
+        """Settle owned and over-allowance videos; return the ones to charge for and those already analyzed."""
+        video_ids = list(batch.items)
+        owned = await self._owned_analyses(user["id"], video_ids)
+        shared = await analysis_cache.get_many([video_id for video_id in video_ids if video_id not in owned])
+
+        # Free users can only add as many new analyses as they have credits
+        allowance = user["credits_remaining"] if user["tier"] == "free" else None
+        chargeable: List[str] = []
+        for video_id in video_ids:
+            item = batch.items[video_id]
+            if video_id in owned:
+                item.status, item.cached, item.analysis_id = "done", True, owned[video_id]
+            elif allowance is not None and allowance <= 0:
+                item.status, item.error = "skipped", "No credits remaining."
+            else:
+                chargeable.append(video_id)
+                if allowance is not None:
+                    allowance -= 1
+                if video_id in shared:
+                    item.status, item.cached = "generated", True
+        return chargeable, shared
+
+    async def _process(self, batch: Batch, user: dict, entries: Dict[str, dict], chargeable: List[str], shared: Dict[str, dict]) -> None:
+        await asyncio.gather(*(
+            self._analyze(batch.items[video_id], entries[video_id], user["tier"], shared)
+            for video_id in chargeable if video_id not in shared
+        ))
+
+        ready = [video_id for video_id in chargeable if video_id in shared and batch.items[video_id].status == "generated"]
+        if ready:
+            await self._record(batch, user, [entries[video_id] for video_id in ready], shared)
+
+    async def _analyze(self, item: BatchItem, entry: dict, tier: str, shared: Dict[str, dict]) -> None:
+        youtube_url = canonical_url(item.youtube_video_id)
+        ran = False
+
+        async def run() -> dict:
+            nonlocal ran
+            ran = True
+            async with self.fetch_slots:
+                item.status = "fetching"
+                transcript, details = await asyncio.gather(
+                    AnalysisService.fetch_transcript(youtube_url),
+                    AnalysisService.fetch_details(youtube_url, tier),
+                )
+            metadata = details["metadata"]
+            if not entry.get("title"):
+                entry.update(metadata)
+                item.title = entry.get("title")
+
+            item.status = "waiting_llm"
+            async with self.llm_slots:
+                item.status = "generating"
+                generated = await AnalysisService.generate(transcript, tier=tier)
+            usage = generated["generation"]
+            item.tokens_used = usage["prompt_tokens"] + usage["completion_tokens"]
+            item.cost = llm_cost(usage["prompt_tokens"], usage["completion_tokens"])
+            return {**generated, "transcript": transcript, "top_comments": details["top_comments"], "metadata": entry if metadata.get("fallback") else metadata}
+
+        try:
+            async with self.run_slots:
+                shared[item.youtube_video_id] = await get_shared_analysis(item.youtube_video_id, tier=tier, run=run, block=True)
+            # Otherwise another request's run finished first and the batch waited for it
+            item.cached = not ran
+            item.status = "generated"
+        except Exception as e:
+            logger.warning(f"Batch video {item.youtube_video_id} failed: {e}")
+            item.status, item.error = "failed", str(e)
+
+    @staticmethod
+    async def _owned_analyses(user_id: str, video_ids: List[str]) -> Dict[str, str]:
+        """Map video ID to the user's existing analysis ID for videos they already have."""
+        videos = await get_videos(video_ids)
+        if not videos:
+            return {}
+        by_row_id = {video["id"]: video_id for video_id, video in videos.items()}
+        resp = await execute(supabase.table("video_analysis").select("id, video_id").eq("user_id", user_id).in_("video_id", list(by_row_id)))
+        return {by_row_id[ref["video_id"]]: ref["id"] for ref in resp.data}
+
+    @staticmethod
+    async def _record(batch: Batch, user: dict, entries: List[dict], shared: Dict[str, dict]) -> None:
+        videos = await upsert_videos(entries)
+        items = [
+            {
+                "video_id": videos[entry["youtube_video_id"]]["id"],
+                "shared_analysis_id": shared[entry["youtube_video_id"]]["id"],
+                "tokens_used": batch.items[entry["youtube_video_id"]].tokens_used,
+                "cost": batch.items[entry["youtube_video_id"]].cost,
+            }
+            for entry in entries
+        ]
+        by_row_id = {video["id"]: video_id for video_id, video in videos.items()}
+        # The allowance came from the user row at submit time; other requests may have spent credits since
+        while True:
+            try:
+                recorded = await record_batch(user["id"], items)
+                break
+            except CreditsExhaustedError:
+                credits = (await get_user(user["id"]))["credits_remaining"]
+                keep = max(0, min(credits, len(items) - 1))
+                for overflow in items[keep:]:
+                    item = batch.items[by_row_id[overflow["video_id"]]]
+                    item.status, item.error = "skipped", "No credits remaining."
+                items = items[:keep]
+                if not items:
+                    return
+        for analysis in recorded["analyses"]:
+            item = batch.items[by_row_id[analysis["video_id"]]]
+            item.status, item.analysis_id = "done", analysis["id"]
+        batch.credits_charged = recorded["charged"]
+        batch.credits_remaining = recorded["credits_remaining"]
+
+batch_scheduler = BatchScheduler()
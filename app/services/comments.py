@@ -1,35 +1,159 @@
-import yt_dlp
+import functools
+import heapq
+import itertools
+import os
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable, List, Optional
 from app.utils.logger import logger
 
-class CommentsService:
-    @staticmethod
-    def fetch_top_comments(youtube_url: str, num_comments: int = 5) -> list:
-        ydl_opts = {
-            'extract_flat': True,  # Only extract info, don't download
-            'skip_download': True,
-            'getcomments': True, # This option is crucial for comments
-            'noplaylist': True, # Don't extract comments from playlists
-            'max_comments': 5000, # Try to fetch up to 5000 comments
-        }
-
-        comments_data = []
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info_dict = ydl.extract_info(youtube_url, download=False)
-                if 'comments' in info_dict:
-                    # Sort comments by like_count in descending order
-                    sorted_comments = sorted(info_dict['comments'], key=lambda x: x.get('like_count', 0), reverse=True)
-                    # Take the top N comments
-                    for comment in sorted_comments[:num_comments]:
-                        comments_data.append({
-                            "text": comment.get('text'),
-                            "author": comment.get('author'),
-                            "like_count": comment.get('like_count', 0),
-                            "timestamp": comment.get('timestamp'),
-                        })
-                else:
-                    logger.warning(f"No comments found for {youtube_url}")
-        except Exception as e:
-            logger.error(f"Error fetching comments for {youtube_url}: {e}")
-        
-        return comments_data
\ No newline at end of file
+if TYPE_CHECKING:
+    import yt_dlp
+
+NUM_TOP_COMMENTS = 5
+# YouTube serves top-level comments in pages of about 20
+COMMENT_PAGE_SIZE = 20
+# Stop once this many consecutive pages add nothing to the top-k
+COMMENT_STALE_PAGES = int(os.getenv("COMMENT_STALE_PAGES", "2"))
+
+# (max pages, seconds) per subscription tier; COMMENT_MAX_PAGES_<TIER> and
+# COMMENT_TIME_BUDGET_SECONDS_<TIER> override them
+DEFAULT_COMMENT_BUDGETS = {
+    "free": (3, 5.0),
+    "basic": (5, 8.0),
+    "pro": (10, 15.0),
+}
+
+@dataclass
+class CommentBudget:
+    max_pages: int
+    seconds: float
+
+    @property
+    def max_comments(self) -> int:
+        return self.max_pages * COMMENT_PAGE_SIZE
+
+def comment_budget_for_tier(tier: Optional[str] = None) -> CommentBudget:
+    tier = tier or "free"
+    pages, seconds = DEFAULT_COMMENT_BUDGETS.get(tier, DEFAULT_COMMENT_BUDGETS["free"])
+    return CommentBudget(
+        max_pages=int(os.getenv(f"COMMENT_MAX_PAGES_{tier.upper()}", pages)),
+        seconds=float(os.getenv(f"COMMENT_TIME_BUDGET_SECONDS_{tier.upper()}", seconds)),
+    )
+
+def format_comment(comment: dict) -> dict:
+    return {
+        "text": comment.get('text'),
+        "author": comment.get('author'),
+        "like_count": comment.get('like_count') or 0,
+        "timestamp": comment.get('timestamp'),
+    }
+
+class TopComments:
+    """Bounded min-heap of the k most-liked comments seen so far.
+
+    Ties keep the earlier comment, which in top-sorted order is the one
+    YouTube ranks higher.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap: List[tuple] = []
+        self._order = itertools.count()
+
+    def push(self, comment: dict) -> bool:
+        """Offer a comment; returns True if it entered the top-k."""
+        entry = (comment.get('like_count') or 0, -next(self._order), comment)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def items(self) -> List[dict]:
+        return [entry[2] for entry in sorted(self._heap, reverse=True)]
+
+def collect_top_comments(top: TopComments, comments: Iterable[dict], budget: CommentBudget, stale_pages: int = COMMENT_STALE_PAGES) -> None:
+    """Feed streamed comments into `top` until a budget runs out.
+
+    Stops after `budget.max_pages` pages, after `budget.seconds`, or once
+    `stale_pages` full pages in a row failed to improve a full top-k.
+    Since `comments` is consumed lazily, stopping also stops page fetches.
+    """
+    deadline = time.monotonic() + budget.seconds
+    seen = stale = 0
+    improved = False
+    for comment in comments:
+        improved = top.push(comment) or improved
+        seen += 1
+        if seen % COMMENT_PAGE_SIZE == 0:
+            stale = 0 if improved or len(top) < top.k else stale + 1
+            improved = False
+            if stale >= stale_pages or seen >= budget.max_comments:
+                break
+        if time.monotonic() >= deadline:
+            logger.info(f"Comment time budget of {budget.seconds}s spent after {seen} comments")
+            break
+
+@functools.lru_cache(maxsize=None)
+def top_comments_extractor() -> type:
+    """The TopCommentsYoutubeIE class, defined on first use so that yt-dlp is
+    only imported by requests that extract something."""
+    from yt_dlp.extractor.youtube import YoutubeIE
+
+    class TopCommentsYoutubeIE(YoutubeIE):
+        """YouTube extractor whose comment hook keeps only the top-k comments.
+
+        yt-dlp's own hook collects every comment into a list before returning.
+        This one consumes the comment generator page by page into a TopComments
+        heap and stops as soon as the budget allows, so the other video fields
+        still come from the same extraction.
+        """
+
+        def __init__(self, k: int, budget: CommentBudget):
+            super().__init__()
+            self.k = k
+            self.budget = budget
+
+        @classmethod
+        def ie_key(cls):
+            # Replace the stock extractor and keep reading `extractor_args["youtube"]`
+            return YoutubeIE.ie_key()
+
+        def extract_comments(self, *args, **kwargs):
+            if not self.get_param('getcomments'):
+                return None
+
+            def extractor():
+                top = TopComments(self.k)
+                try:
+                    collect_top_comments(top, self._get_comments(*args, **kwargs), self.budget)
+                except self.CommentsDisabled:
+                    return {'comments': None, 'comment_count': None}
+                except Exception as e:
+                    logger.warning(f"Comment extraction stopped early: {e}")
+                return {'comments': top.items(), 'comment_count': None}
+            return extractor
+
+    return TopCommentsYoutubeIE
+
+def top_comments_ydl(ydl_opts: dict, k: int, budget: CommentBudget) -> "yt_dlp.YoutubeDL":
+    """A YoutubeDL that fetches the top `k` top-level comments within `budget`."""
+    import yt_dlp
+    ydl = yt_dlp.YoutubeDL({
+        **ydl_opts,
+        'getcomments': True,
+        'extractor_args': {'youtube': {
+            'comment_sort': ['top'],
+            # max-comments, max-parents, max-replies, max-replies-per-thread, max-depth:
+            # top-level comments only, so no reply threads are fetched
+            'max_comments': [str(budget.max_comments), str(budget.max_comments), '0', '0', '1'],
+        }},
+    })
+    ydl.add_info_extractor(top_comments_extractor()(k, budget))
+    return ydl
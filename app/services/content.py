@@ -1,29 +1,54 @@
-from typing import Tuple, List
+from typing import Tuple, List, Union
 import re
 
+# One prompt per AnalyzeResponse section, used by the fan-out strategy and to
+# regenerate individual sections the combined prompt failed to produce
+SECTION_PROMPTS = {
+    "summary": "Summarize the following transcript in 2-3 sentences: {transcript}",
+    "key_takeaways": "List 5 key takeaways from the following transcript: {transcript}",
+    "hashtags": "Generate 5 relevant hashtags for the following transcript: {transcript}",
+    "twitter_thread": "Write a 3-tweet Twitter thread summarizing the following transcript: {transcript}",
+}
+
+def clean_section(text: str) -> str:
+    text = re.sub(r"^(here (is|are)\b[^:]*:|summary:|tweet:?|key takeaway:?|takeaway:?|hashtags?:?)", "", text, flags=re.IGNORECASE).strip()
+    return text.strip('"\' \n')
+
 class ContentService:
     @staticmethod
     def build_prompt(transcript: str) -> str:
         return (
-            "Given the following YouTube video transcript, generate the following sections in plain text. "
-            "Use these exact section headers, in this order, and nothing else:\n"
-            "Short Summary:\n"
-            "Detailed Takeaways:\n"
-            "Hashtags:\n"
-            "Twitter Thread:\n"
-            "- Short Summary: 2-3 sentences summarizing the video.\n"
-            "- Detailed Takeaways: For each main topic or section, provide a bolded section header and a detailed paragraph.\n"
-            "- Hashtags: List exactly 5 relevant hashtags.\n"
-            "- Twitter Thread: Write exactly 3 tweets, each on a new line, as if for Twitter.\n"
+            "Given the following YouTube video transcript, respond with a single JSON object and nothing else. "
+            "Use exactly these keys:\n"
+            "- \"short_summary\": 2-3 sentences summarizing the video.\n"
+            "- \"detailed_takeaways\": a list of exactly 5 key takeaways, one sentence each.\n"
+            "- \"hashtags\": a list of exactly 5 relevant hashtags, each starting with #.\n"
+            "- \"twitter_thread\": a list of exactly 3 tweets, as if for Twitter.\n"
             f"Transcript: {transcript}"
         )
 
+    @staticmethod
+    def build_section_prompt(section: str, transcript: str) -> str:
+        return SECTION_PROMPTS[section].format(transcript=transcript)
+
+    @staticmethod
+    def parse_section(section: str, response: str) -> Union[str, List[str]]:
+        if section == "summary":
+            return clean_section(response)
+        if section == "key_takeaways":
+            return [clean_section(t) for t in re.split(r'^(?:\d+\.\s*|[-•*]\s*)', response, flags=re.MULTILINE) if clean_section(t)][:5]
+        if section == "hashtags":
+            return [h for h in response.replace(',', ' ').split() if h.startswith('#')][:5]
+        if section == "twitter_thread":
+            return [clean_section(t) for t in response.split('\n') if clean_section(t)][:3]
+        raise ValueError(f"Unknown section: {section}")
+
     @staticmethod
     def parse_llm_response(response: str) -> Tuple[str, List[str], List[str], List[str]]:
         import json
-        # Try JSON first
+        # Try JSON first, tolerating a fenced ```json block
         try:
-            data = json.loads(response)
+            data = json.loads(re.sub(r"^```(?:json)?\s*|\s*```$", "", response.strip()))
             return (
                 data.get("short_summary", ""),
                 data.get("detailed_takeaways", []),
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional
+from pydantic import ValidationError
+from app.schemas.models import GeneratedSections
+from app.services.content import ContentService, clean_section
+from app.services.llm import LLMResult, llm_service
+from app.utils.logger import logger
+
+SECTIONS = ("summary", "key_takeaways", "hashtags", "twitter_thread")
+
+# "fanout" (one prompt per section) or "structured" (one JSON call);
+# GENERATION_STRATEGY_<TIER> overrides the default for a subscription tier
+GENERATION_STRATEGY = os.getenv("GENERATION_STRATEGY", "fanout")
+
+# Progress callback: emit(event, data) as each section becomes available
+Emit = Callable[[str, Any], None]
+
+@dataclass
+class GenerationStats:
+    strategy: str
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retries: int = 0
+    latency: float = 0.0
+    chunks: int = 1
+    regenerated: List[str] = field(default_factory=list)
+
+    def record(self, result: LLMResult) -> None:
+        self.calls += 1
+        self.prompt_tokens += result.prompt_tokens
+        self.completion_tokens += result.completion_tokens
+        self.retries += result.retries
+
+    def merge(self, other: "GenerationStats") -> None:
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.retries += other.retries
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+@dataclass
+class GenerationResult:
+    sections: Dict[str, object]
+    stats: GenerationStats
+
+class GenerationStrategy:
+    name = ""
+
+    async def generate(self, transcript: str, emit: Optional[Emit] = None) -> GenerationResult:
+        started = time.monotonic()
+        stats = GenerationStats(strategy=self.name)
+        sections = await self._generate(transcript, stats, emit)
+        stats.latency = time.monotonic() - started
+        logger.info(f"Generation stats: {stats.as_dict()}")
+        return GenerationResult(sections=sections, stats=stats)
+
+    async def _generate(self, transcript: str, stats: GenerationStats, emit: Optional[Emit]) -> Dict[str, object]:
+        raise NotImplementedError
+
+    @staticmethod
+    async def generate_section(section: str, transcript: str, stats: GenerationStats, emit: Optional[Emit] = None) -> object:
+        on_delta = None
+        if emit is not None and section == "summary":
+            # Pass summary tokens through as they arrive
+            on_delta = lambda delta: emit("summary_delta", {"delta": delta})
+        result = await llm_service.generate(ContentService.build_section_prompt(section, transcript), on_delta=on_delta)
+        stats.record(result)
+        value = ContentService.parse_section(section, result.content)
+        if emit is not None:
+            emit(section, {section: value})
+        return value
+
+class FanoutStrategy(GenerationStrategy):
+    """One prompt per section, sent concurrently."""
+
+    name = "fanout"
+
+    async def _generate(self, transcript: str, stats: GenerationStats, emit: Optional[Emit]) -> Dict[str, object]:
+        values = await asyncio.gather(*(self.generate_section(section, transcript, stats, emit) for section in SECTIONS))
+        return dict(zip(SECTIONS, values))
+
+class StructuredStrategy(GenerationStrategy):
+    """One JSON-mode call for all sections.
+
+    The response is validated against GeneratedSections; any section that is
+    missing or invalid is regenerated on its own with the fan-out prompt.
+    """
+
+    name = "structured"
+
+    async def _generate(self, transcript: str, stats: GenerationStats, emit: Optional[Emit]) -> Dict[str, object]:
+        result = await llm_service.generate(
+            ContentService.build_prompt(transcript),
+            max_tokens=1500,
+            response_format={"type": "json_object"},
+        )
+        stats.record(result)
+        sections, invalid = self.validate(result.content)
+        if emit is not None:
+            for section, value in sections.items():
+                emit(section, {section: value})
+        if invalid:
+            logger.warning(f"Structured response had invalid sections {invalid}; regenerating them")
+            stats.regenerated = invalid
+            values = await asyncio.gather(*(self.generate_section(section, transcript, stats, emit) for section in invalid))
+            sections.update(zip(invalid, values))
+        return sections
+
+    @staticmethod
+    def validate(response: str):
+        short_summary, takeaways, hashtags, thread = ContentService.parse_llm_response(response)
+        candidate = {
+            "summary": clean_section(short_summary) if isinstance(short_summary, str) else short_summary,
+            "key_takeaways": [clean_section(t) for t in takeaways if isinstance(t, str) and clean_section(t)][:5] if isinstance(takeaways, list) else takeaways,
+            "hashtags": ["#" + h.strip().lstrip("#") for h in hashtags if isinstance(h, str) and h.strip().lstrip("#")][:5] if isinstance(hashtags, list) else hashtags,
+            "twitter_thread": [clean_section(t) for t in thread if isinstance(t, str) and clean_section(t)][:3] if isinstance(thread, list) else thread,
+        }
+        try:
+            return GeneratedSections(**candidate).model_dump(), []
+        except ValidationError as e:
+            invalid = sorted({error["loc"][0] for error in e.errors()}, key=SECTIONS.index)
+            return {section: candidate[section] for section in SECTIONS if section not in invalid}, invalid
+
+STRATEGIES = {
+    FanoutStrategy.name: FanoutStrategy(),
+    StructuredStrategy.name: StructuredStrategy(),
+}
+
+def strategy_for_tier(tier: Optional[str] = None) -> GenerationStrategy:
+    name = GENERATION_STRATEGY
+    if tier:
+        name = os.getenv(f"GENERATION_STRATEGY_{tier.upper()}", name)
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown generation strategy: {name}")
+    return STRATEGIES[name]
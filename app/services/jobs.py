@@ -0,0 +1,445 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from app.utils.executors import run_blocking
+from app.utils.logger import logger
+
+JOB_BACKEND = os.getenv("JOB_BACKEND", "local")
+JOB_VISIBILITY_SECONDS = float(os.getenv("JOB_VISIBILITY_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+# Backpressure: enqueueing is refused once this many jobs are waiting
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "1000"))
+JOB_MAX_PENDING_PER_USER = int(os.getenv("JOB_MAX_PENDING_PER_USER", "10"))
+JOB_FULL_RETRY_AFTER_SECONDS = int(os.getenv("JOB_FULL_RETRY_AFTER_SECONDS", "30"))
+
+# Lower runs first
+TIER_PRIORITY = {"pro": 0, "basic": 1, "free": 2}
+
+ACTIVE_STATUSES = ("queued", "running")
+# Set on jobs whose worker died (lease expired) on their last allowed attempt
+LEASE_EXPIRED_ERROR = "lease expired"
+
+class QueueFullError(Exception):
+    def __init__(self, message: str, retry_after: int = JOB_FULL_RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def idempotency_key(user_id: str, youtube_video_id: str) -> str:
+    return f"{user_id}:{youtube_video_id}"
+
+def retry_delay(attempts: int) -> float:
+    return JOB_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1)
+
+class JobBackend:
+    """Durable queue of analysis jobs shared by the API and the worker pool.
+
+    `enqueue` is idempotent per user and video while a job is still active.
+    `claim` hands the best queued job (by tier priority, then age) to one
+    worker and hides it for the visibility timeout; a worker that dies without
+    completing or failing the job lets it become claimable again. Each claim
+    counts as an attempt. The backend also keeps playlist batch progress, so
+    any worker can answer for a batch another one is running.
+    """
+
+    def enqueue(self, user_id: str, youtube_video_id: str, tier: str, max_pending: int, max_pending_per_user: int) -> Tuple[dict, bool]:
+        raise NotImplementedError
+
+    def claim(self, worker: str, visibility: float) -> Optional[dict]:
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: str, worker: str, visibility: float) -> None:
+        raise NotImplementedError
+
+    def complete(self, job_id: str, worker: str, result: dict) -> None:
+        raise NotImplementedError
+
+    def fail(self, job_id: str, worker: str, error: str, retry_in: Optional[float]) -> None:
+        """Requeue the job after `retry_in` seconds, or mark it failed when None."""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def save_batch(self, batch: dict) -> None:
+        """Store a batch's state (see app/services/batch.py), replacing any earlier copy."""
+        raise NotImplementedError
+
+    def get_batch(self, batch_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+class LocalJobBackend(JobBackend):
+    """In-memory queue for a single process (development and tests)."""
+
+    def __init__(self, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._jobs: Dict[str, dict] = {}
+        self._batches: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, user_id: str, youtube_video_id: str, tier: str, max_pending: int, max_pending_per_user: int) -> Tuple[dict, bool]:
+        key = idempotency_key(user_id, youtube_video_id)
+        now = time.time()
+        with self._lock:
+            for job in self._jobs.values():
+                if job["idempotency_key"] == key and job["status"] in ACTIVE_STATUSES:
+                    return dict(job), False
+            queued = [job for job in self._jobs.values() if job["status"] == "queued"]
+            if len(queued) >= max_pending:
+                raise QueueFullError("The analysis queue is full; try again shortly.")
+            if sum(1 for job in queued if job["user_id"] == user_id) >= max_pending_per_user:
+                raise QueueFullError("You have too many analyses queued; wait for some to finish.")
+            job = {
+                "id": str(uuid.uuid4()),
+                "idempotency_key": key,
+                "user_id": user_id,
+                "youtube_video_id": youtube_video_id,
+                "tier": tier,
+                "priority": TIER_PRIORITY.get(tier, max(TIER_PRIORITY.values())),
+                "status": "queued",
+                "attempts": 0,
+                "max_attempts": self.max_attempts,
+                "available_at": now,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            self._jobs[job["id"]] = job
+            return dict(job), True
+
+    def claim(self, worker: str, visibility: float) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] == "running" and job["lease_expires_at"] <= now and job["attempts"] >= job["max_attempts"]:
+                    job.update(status="failed", error=LEASE_EXPIRED_ERROR, lease_owner=None, lease_expires_at=None, updated_at=now)
+            ready = [
+                job for job in self._jobs.values()
+                if (job["status"] == "queued" and job["available_at"] <= now)
+                or (job["status"] == "running" and job["lease_expires_at"] <= now)
+            ]
+            if not ready:
+                return None
+            job = min(ready, key=lambda j: (j["priority"], j["created_at"]))
+            job.update(status="running", attempts=job["attempts"] + 1, lease_owner=worker, lease_expires_at=now + visibility, updated_at=now)
+            return dict(job)
+
+    def heartbeat(self, job_id: str, worker: str, visibility: float) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job["status"] == "running" and job["lease_owner"] == worker:
+                job["lease_expires_at"] = time.time() + visibility
+
+    def complete(self, job_id: str, worker: str, result: dict) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job["lease_owner"] == worker:
+                job.update(status="succeeded", result=result, error=None, lease_owner=None, lease_expires_at=None, updated_at=time.time())
+
+    def fail(self, job_id: str, worker: str, error: str, retry_in: Optional[float]) -> None:
+        now = time.time()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["lease_owner"] != worker:
+                return
+            if retry_in is None:
+                job.update(status="failed", error=error, lease_owner=None, lease_expires_at=None, updated_at=now)
+            else:
+                job.update(status="queued", error=error, available_at=now + retry_in, lease_owner=None, lease_expires_at=None, updated_at=now)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def save_batch(self, batch: dict) -> None:
+        # Serialized, so callers can keep mutating their copy
+        with self._lock:
+            self._batches[batch["id"]] = json.dumps(batch)
+
+    def get_batch(self, batch_id: str) -> Optional[dict]:
+        with self._lock:
+            state = self._batches.get(batch_id)
+        return json.loads(state) if state else None
+
+class SQLiteJobBackend(JobBackend):
+    """File-backed queue shared by the API and worker processes on one host (and by tests)."""
+
+    COLUMNS = ("id", "idempotency_key", "user_id", "youtube_video_id", "tier", "priority", "status", "attempts", "max_attempts",
+               "available_at", "lease_owner", "lease_expires_at", "result", "error", "created_at", "updated_at")
+
+    def __init__(self, path: str, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_jobs (
+                    id TEXT PRIMARY KEY,
+                    idempotency_key TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    youtube_video_id TEXT NOT NULL,
+                    tier TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    available_at REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS analysis_jobs_active_key ON analysis_jobs (idempotency_key) WHERE status IN ('queued', 'running')")
+            conn.execute("CREATE INDEX IF NOT EXISTS analysis_jobs_ready ON analysis_jobs (status, priority, created_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS analysis_batches (id TEXT PRIMARY KEY, user_id TEXT NOT NULL, status TEXT NOT NULL, state TEXT NOT NULL, updated_at REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def _row(self, row) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _select(self, conn: sqlite3.Connection, where: str, params: tuple):
+        return conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM analysis_jobs WHERE {where}", params).fetchone()
+
+    def enqueue(self, user_id: str, youtube_video_id: str, tier: str, max_pending: int, max_pending_per_user: int) -> Tuple[dict, bool]:
+        key = idempotency_key(user_id, youtube_video_id)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._select(conn, "idempotency_key = ? AND status IN ('queued', 'running')", (key,))
+                if existing is not None:
+                    return self._row(existing), False
+                queued, queued_for_user = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(user_id = ?), 0) FROM analysis_jobs WHERE status = 'queued'", (user_id,)
+                ).fetchone()
+                if queued >= max_pending:
+                    raise QueueFullError("The analysis queue is full; try again shortly.")
+                if queued_for_user >= max_pending_per_user:
+                    raise QueueFullError("You have too many analyses queued; wait for some to finish.")
+                job_id = str(uuid.uuid4())
+                conn.execute(
+                    "INSERT INTO analysis_jobs (id, idempotency_key, user_id, youtube_video_id, tier, priority, status, max_attempts, available_at, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                    (job_id, key, user_id, youtube_video_id, tier, TIER_PRIORITY.get(tier, max(TIER_PRIORITY.values())), self.max_attempts, now, now, now),
+                )
+                job = self._row(self._select(conn, "id = ?", (job_id,)))
+                conn.execute("COMMIT")
+                return job, True
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def claim(self, worker: str, visibility: float) -> Optional[dict]:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE analysis_jobs SET status = 'failed', error = ?, lease_owner = NULL, lease_expires_at = NULL, updated_at = ?"
+                " WHERE status = 'running' AND lease_expires_at <= ? AND attempts >= max_attempts",
+                (LEASE_EXPIRED_ERROR, now, now),
+            )
+            row = conn.execute(
+                "SELECT id FROM analysis_jobs"
+                " WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires_at <= ?)"
+                " ORDER BY priority, created_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE analysis_jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                (worker, now + visibility, now, row[0]),
+            )
+            job = self._row(self._select(conn, "id = ?", (row[0],)))
+            conn.execute("COMMIT")
+            return job
+
+    def heartbeat(self, job_id: str, worker: str, visibility: float) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE analysis_jobs SET lease_expires_at = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (time.time() + visibility, job_id, worker),
+            )
+
+    def complete(self, job_id: str, worker: str, result: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE analysis_jobs SET status = 'succeeded', result = ?, error = NULL, lease_owner = NULL, lease_expires_at = NULL, updated_at = ?"
+                " WHERE id = ? AND lease_owner = ?",
+                (json.dumps(result), time.time(), job_id, worker),
+            )
+
+    def fail(self, job_id: str, worker: str, error: str, retry_in: Optional[float]) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            if retry_in is None:
+                conn.execute(
+                    "UPDATE analysis_jobs SET status = 'failed', error = ?, lease_owner = NULL, lease_expires_at = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?",
+                    (error, now, job_id, worker),
+                )
+            else:
+                conn.execute(
+                    "UPDATE analysis_jobs SET status = 'queued', error = ?, available_at = ?, lease_owner = NULL, lease_expires_at = NULL, updated_at = ?"
+                    " WHERE id = ? AND lease_owner = ?",
+                    (error, now + retry_in, now, job_id, worker),
+                )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            return self._row(self._select(conn, "id = ?", (job_id,)))
+
+    def save_batch(self, batch: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO analysis_batches (id, user_id, status, state, updated_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET status = excluded.status, state = excluded.state, updated_at = excluded.updated_at",
+                (batch["id"], batch["user_id"], batch["status"], json.dumps(batch), time.time()),
+            )
+
+    def get_batch(self, batch_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT state FROM analysis_batches WHERE id = ?", (batch_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+class SupabaseJobBackend(JobBackend):
+    """Jobs in the `analysis_jobs` table, for API and workers spread across hosts.
+
+    Enqueue and claim need row locks, so they go through the
+    `enqueue_analysis_job` and `claim_analysis_job` SQL functions.
+    """
+
+    def __init__(self, client, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.client = client
+        self.max_attempts = max_attempts
+
+    def enqueue(self, user_id: str, youtube_video_id: str, tier: str, max_pending: int, max_pending_per_user: int) -> Tuple[dict, bool]:
+        resp = self.client.rpc("enqueue_analysis_job", {
+            "p_idempotency_key": idempotency_key(user_id, youtube_video_id),
+            "p_user_id": user_id,
+            "p_youtube_video_id": youtube_video_id,
+            "p_tier": tier,
+            "p_priority": TIER_PRIORITY.get(tier, max(TIER_PRIORITY.values())),
+            "p_max_attempts": self.max_attempts,
+            "p_max_pending": max_pending,
+            "p_max_pending_per_user": max_pending_per_user,
+        }).execute()
+        row = resp.data[0] if isinstance(resp.data, list) else resp.data
+        if row["outcome"] == "full":
+            raise QueueFullError("The analysis queue is full; try again shortly.")
+        if row["outcome"] == "user_full":
+            raise QueueFullError("You have too many analyses queued; wait for some to finish.")
+        return self.get(row["job_id"]), row["outcome"] == "created"
+
+    def claim(self, worker: str, visibility: float) -> Optional[dict]:
+        resp = self.client.rpc("claim_analysis_job", {"p_worker": worker, "p_visibility_seconds": visibility}).execute()
+        rows = resp.data if isinstance(resp.data, list) else [resp.data] if resp.data else []
+        return rows[0] if rows else None
+
+    @staticmethod
+    def _at(seconds: float) -> str:
+        return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+    def heartbeat(self, job_id: str, worker: str, visibility: float) -> None:
+        self.client.table("analysis_jobs").update({"lease_expires_at": self._at(visibility)}).eq("id", job_id).eq("lease_owner", worker).eq("status", "running").execute()
+
+    def complete(self, job_id: str, worker: str, result: dict) -> None:
+        self.client.table("analysis_jobs").update({
+            "status": "succeeded",
+            "result": result,
+            "error": None,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "updated_at": self._at(0),
+        }).eq("id", job_id).eq("lease_owner", worker).execute()
+
+    def fail(self, job_id: str, worker: str, error: str, retry_in: Optional[float]) -> None:
+        update = {"error": error, "lease_owner": None, "lease_expires_at": None, "updated_at": self._at(0)}
+        if retry_in is None:
+            update["status"] = "failed"
+        else:
+            update.update(status="queued", available_at=self._at(retry_in))
+        self.client.table("analysis_jobs").update(update).eq("id", job_id).eq("lease_owner", worker).execute()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        resp = self.client.table("analysis_jobs").select("*").eq("id", job_id).limit(1).execute()
+        return resp.data[0] if resp.data else None
+
+    def save_batch(self, batch: dict) -> None:
+        self.client.table("analysis_batches").upsert({
+            "id": batch["id"],
+            "user_id": batch["user_id"],
+            "status": batch["status"],
+            "state": batch,
+            "updated_at": self._at(0),
+        }, on_conflict="id").execute()
+
+    def get_batch(self, batch_id: str) -> Optional[dict]:
+        resp = self.client.table("analysis_batches").select("state").eq("id", batch_id).limit(1).execute()
+        return resp.data[0]["state"] if resp.data else None
+
+def create_job_backend(spec: str = JOB_BACKEND) -> JobBackend:
+    if spec == "local":
+        return LocalJobBackend()
+    if spec.startswith("sqlite:///"):
+        return SQLiteJobBackend(spec[len("sqlite:///"):])
+    if spec == "supabase":
+        from app.services.supabase_client import supabase
+        return SupabaseJobBackend(supabase)
+    raise ValueError(f"Unknown JOB_BACKEND: {spec}")
+
+class JobQueue:
+    """Async facade over a JobBackend with the configured backpressure limits."""
+
+    def __init__(self, backend: Optional[JobBackend] = None, max_pending: int = JOB_MAX_PENDING, max_pending_per_user: int = JOB_MAX_PENDING_PER_USER, visibility: float = JOB_VISIBILITY_SECONDS):
+        self.backend = backend or LocalJobBackend()
+        self.max_pending = max_pending
+        self.max_pending_per_user = max_pending_per_user
+        self.visibility = visibility
+
+    async def enqueue(self, user_id: str, youtube_video_id: str, tier: str) -> Tuple[dict, bool]:
+        job, created = await run_blocking("db", self.backend.enqueue, user_id, youtube_video_id, tier, self.max_pending, self.max_pending_per_user)
+        if created:
+            logger.info(f"Queued analysis job {job['id']} for video {youtube_video_id} (tier {tier})")
+        return job, created
+
+    async def claim(self, worker: str) -> Optional[dict]:
+        return await run_blocking("db", self.backend.claim, worker, self.visibility)
+
+    async def heartbeat(self, job_id: str, worker: str) -> None:
+        await run_blocking("db", self.backend.heartbeat, job_id, worker, self.visibility)
+
+    async def complete(self, job_id: str, worker: str, result: dict) -> None:
+        await run_blocking("db", self.backend.complete, job_id, worker, result)
+
+    async def fail(self, job: dict, worker: str, error: str, retryable: bool = True) -> None:
+        retry_in = retry_delay(job["attempts"]) if retryable and job["attempts"] < job["max_attempts"] else None
+        await run_blocking("db", self.backend.fail, job["id"], worker, error, retry_in)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await run_blocking("db", self.backend.get, job_id)
+
+    async def save_batch(self, batch: dict) -> None:
+        await run_blocking("db", self.backend.save_batch, batch)
+
+    async def get_batch(self, batch_id: str) -> Optional[dict]:
+        return await run_blocking("db", self.backend.get_batch, batch_id)
+
+job_queue = JobQueue(create_job_backend())
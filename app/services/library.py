@@ -0,0 +1,31 @@
+import asyncio
+import os
+from typing import List
+from app.services.supabase_client import supabase, execute
+from app.services.transcripts import transcript_store
+
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "50"))
+# Top library results that also get their best transcript lines attached
+LIBRARY_SEARCH_HIT_VIDEOS = int(os.getenv("LIBRARY_SEARCH_HIT_VIDEOS", "3"))
+LIBRARY_SEARCH_HITS_PER_VIDEO = int(os.getenv("LIBRARY_SEARCH_HITS_PER_VIDEO", "3"))
+
+async def search_library(clerk_user: dict, query: str, limit: int) -> List[dict]:
+    """The user's analyses matching `query`, best first.
+
+    Postgres ranks the user's rows in one search_library call, using the
+    full-text indexes on video titles, analyses and transcript terms. The top
+    few transcript matches then get their best lines from the per-video index.
+    """
+    resp = await execute(supabase.rpc("search_library", {
+        "p_clerk_id": clerk_user["sub"],
+        "p_query": query,
+        "p_limit": limit,
+    }))
+    results = resp.data or []
+    top = [result for result in results if result["transcript_match"]][:LIBRARY_SEARCH_HIT_VIDEOS]
+    hits = await asyncio.gather(*(
+        transcript_store.search(result["youtube_video_id"], query, LIBRARY_SEARCH_HITS_PER_VIDEO) for result in top
+    ))
+    for result, video_hits in zip(top, hits):
+        result["hits"] = video_hits or []
+    return results
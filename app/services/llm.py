@@ -1,23 +1,266 @@
+import asyncio
 import os
-import openai
-from typing import Optional
+import random
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, List, Optional
+from app.utils.logger import logger
+from app.utils.metrics import current_request, registry, span
+from app.utils.rate_limit import AIMDLimiter, TokenBucket
+from app.utils.tokens import count_tokens
+
+if TYPE_CHECKING:
+    import openai
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+# Point at any OpenAI-compatible server, e.g. a local fake for load tests
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 
-class LLMService:
-    @staticmethod
-    async def generate_content(prompt: str) -> str:
-        if not OPENAI_API_KEY:
-            raise RuntimeError("OPENAI_API_KEY not set in environment.")
-        client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
-        response = await client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1024,
-            temperature=0.7,
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_TARGET_LATENCY_SECONDS = float(os.getenv("LLM_TARGET_LATENCY_SECONDS", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "45"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "90"))
+# USD per 1K tokens, for user_usage.cost; defaults are gpt-3.5-turbo's list prices
+LLM_PROMPT_PRICE_PER_1K = float(os.getenv("LLM_PROMPT_PRICE_PER_1K", "0.0005"))
+LLM_COMPLETION_PRICE_PER_1K = float(os.getenv("LLM_COMPLETION_PRICE_PER_1K", "0.0015"))
+
+LLM_TOKENS = registry.counter("llm_tokens_total", "LLM tokens used", ["direction"])
+LLM_RETRIES = registry.counter("llm_retries_total", "LLM attempts that were retried", ["reason"])
+
+def llm_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    return (prompt_tokens * LLM_PROMPT_PRICE_PER_1K + completion_tokens * LLM_COMPLETION_PRICE_PER_1K) / 1000
+
+@dataclass
+class LLMResult:
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0
+    retries: int = 0
+
+class LLMError(RuntimeError):
+    pass
+
+class RateLimitedError(LLMError):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TransientLLMError(LLMError):
+    pass
+
+class LLMTransport:
+    """Sends one chat completion. Swappable so the gateway can run against fakes.
+
+    When `on_delta` is given the completion is streamed and each content delta
+    is passed to it as it arrives; the full result is still returned.
+    """
+
+    async def complete(self, messages: List[dict], *, model: str, max_tokens: int, temperature: float, timeout: float, response_format: Optional[dict] = None, on_delta: Optional[Callable[[str], None]] = None) -> LLMResult:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+class OpenAITransport(LLMTransport):
+    """One pooled AsyncOpenAI client shared by every call in the process."""
+
+    def __init__(self, api_key: Optional[str] = OPENAI_API_KEY, base_url: Optional[str] = OPENAI_BASE_URL, max_connections: int = LLM_MAX_CONNECTIONS):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self._client: Optional["openai.AsyncOpenAI"] = None
+
+    @property
+    def client(self) -> "openai.AsyncOpenAI":
+        if self._client is None:
+            # openai is the heaviest import in the app; only pay for it on first use
+            import httpx
+            import openai
+            if not self.api_key:
+                raise RuntimeError("OPENAI_API_KEY not set in environment.")
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                # Retries are handled by the gateway so they respect the limiters
+                max_retries=0,
+                http_client=openai.DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                ),
+            )
+        return self._client
+
+    async def complete(self, messages: List[dict], *, model: str, max_tokens: int, temperature: float, timeout: float, response_format: Optional[dict] = None, on_delta: Optional[Callable[[str], None]] = None) -> LLMResult:
+        import openai
+        request = dict(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=timeout,
+            response_format=response_format if response_format is not None else openai.NOT_GIVEN,
         )
+        try:
+            if on_delta is not None:
+                return await self._stream(request, on_delta)
+            response = await self.client.chat.completions.create(**request)
+        except openai.RateLimitError as e:
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            raise RateLimitedError(str(e), float(retry_after) if retry_after else None) from e
+        except (openai.APITimeoutError, openai.APIConnectionError) as e:
+            raise TransientLLMError(str(e)) from e
+        except openai.APIStatusError as e:
+            if e.status_code >= 500:
+                raise TransientLLMError(str(e)) from e
+            raise
         content = getattr(response.choices[0].message, "content", None)
         if not content:
             raise RuntimeError("No content returned from OpenAI API.")
-        return content.strip() 
\ No newline at end of file
+        usage = response.usage
+        return LLMResult(
+            content=content.strip(),
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+        )
+
+    async def _stream(self, request: dict, on_delta: Callable[[str], None]) -> LLMResult:
+        stream = await self.client.chat.completions.create(**request, stream=True, stream_options={"include_usage": True})
+        parts: List[str] = []
+        usage = None
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                on_delta(chunk.choices[0].delta.content)
+        content = "".join(parts)
+        if not content:
+            raise RuntimeError("No content returned from OpenAI API.")
+        return LLMResult(
+            content=content.strip(),
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+class LLMService:
+    """Process-wide LLM gateway.
+
+    Every call shares one transport (and so one connection pool), waits on
+    request- and token-per-minute buckets, runs under an AIMD concurrency
+    limit, and is retried with jittered backoff inside a per-call deadline.
+    """
+
+    def __init__(
+        self,
+        transport: Optional[LLMTransport] = None,
+        model: str = OPENAI_MODEL,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        initial_concurrency: int = LLM_INITIAL_CONCURRENCY,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        target_latency: float = LLM_TARGET_LATENCY_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        attempt_timeout: float = LLM_ATTEMPT_TIMEOUT_SECONDS,
+        deadline: float = LLM_DEADLINE_SECONDS,
+    ):
+        self.transport = transport or OpenAITransport()
+        self.model = model
+        self.request_bucket = TokenBucket(rate=requests_per_minute / 60, capacity=max(1.0, requests_per_minute / 60))
+        self.token_bucket = TokenBucket(rate=tokens_per_minute / 60, capacity=tokens_per_minute / 6)
+        self.concurrency = AIMDLimiter(initial=initial_concurrency, maximum=max_concurrency)
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+
+    async def generate(self, prompt: str, max_tokens: int = 1024, temperature: float = 0.7, deadline: Optional[float] = None, response_format: Optional[dict] = None, on_delta: Optional[Callable[[str], None]] = None) -> LLMResult:
+        """Run one completion through the limiters, retrying transient failures.
+
+        With `on_delta` the completion is streamed. Deltas from a failed attempt
+        may already have been delivered before a retry, so only the returned
+        result is authoritative.
+        """
+        with span("llm"):
+            result = await self._generate(prompt, max_tokens, temperature, deadline, response_format, on_delta)
+        LLM_TOKENS.inc(result.prompt_tokens, direction="prompt")
+        LLM_TOKENS.inc(result.completion_tokens, direction="completion")
+        request = current_request()
+        if request is not None:
+            request.prompt_tokens += result.prompt_tokens
+            request.completion_tokens += result.completion_tokens
+        return result
+
+    async def _generate(self, prompt: str, max_tokens: int, temperature: float, deadline: Optional[float], response_format: Optional[dict], on_delta: Optional[Callable[[str], None]]) -> LLMResult:
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        messages = [{"role": "user", "content": prompt}]
+        # Pre-flight estimate for the TPM bucket; reconciled with real usage after the call
+        estimated_tokens = count_tokens(prompt, self.model) + max_tokens
+        attempt = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise LLMError("LLM call exceeded its deadline.")
+            try:
+                return await asyncio.wait_for(
+                    self._attempt(messages, max_tokens, temperature, response_format, on_delta, estimated_tokens, attempt, remaining),
+                    remaining,
+                )
+            except (RateLimitedError, TransientLLMError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise LLMError(f"LLM call failed after {attempt + 1} attempts: {e}") from e
+                # Full jitter, but never sooner than the provider's Retry-After
+                delay = random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+                if isinstance(e, RateLimitedError) and e.retry_after:
+                    delay = max(delay, e.retry_after)
+                if time.monotonic() + delay >= deadline_at:
+                    raise LLMError(f"LLM call exceeded its deadline after {attempt + 1} attempts: {e}") from e
+                logger.warning(f"LLM call failed ({e.__class__.__name__}); retrying in {delay:.2f}s")
+                LLM_RETRIES.inc(reason=e.__class__.__name__)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, messages: List[dict], max_tokens: int, temperature: float, response_format: Optional[dict], on_delta: Optional[Callable[[str], None]], estimated_tokens: int, attempt: int, remaining: float) -> LLMResult:
+        await self.request_bucket.acquire()
+        await self.token_bucket.acquire(estimated_tokens)
+        await self.concurrency.acquire()
+        started = time.monotonic()
+        overloaded = True
+        try:
+            result = await self.transport.complete(
+                messages,
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                timeout=min(self.attempt_timeout, remaining),
+                response_format=response_format,
+                on_delta=on_delta,
+            )
+            result.latency = time.monotonic() - started
+            result.retries = attempt
+            overloaded = result.latency > self.target_latency
+            if result.prompt_tokens or result.completion_tokens:
+                self.token_bucket.adjust(result.prompt_tokens + result.completion_tokens - estimated_tokens)
+            return result
+        except RateLimitedError:
+            raise
+        except Exception:
+            overloaded = False
+            raise
+        finally:
+            await self.concurrency.release(overloaded=overloaded)
+
+    async def close(self) -> None:
+        await self.transport.close()
+
+llm_service = LLMService()
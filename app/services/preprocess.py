@@ -0,0 +1,103 @@
+import html
+import os
+import re
+from dataclasses import dataclass
+from typing import List
+from app.utils.tokens import count_tokens
+
+# Sentence-level segments are closed at punctuation, or at these caps for
+# unpunctuated auto-captions
+SEGMENT_MAX_WORDS = int(os.getenv("SEGMENT_MAX_WORDS", "60"))
+SEGMENT_MAX_SECONDS = float(os.getenv("SEGMENT_MAX_SECONDS", "30"))
+
+# [Music], [Applause], (laughter), ♪ ... ♪ and similar non-speech cues
+SOUND_CUE_PATTERN = re.compile(r"\[[^\]]{0,30}\]|\((?:music|applause|laughter|laughs|inaudible|silence|cheering)\)|♪+", re.IGNORECASE)
+FILLER_PATTERN = re.compile(r"\b(?:u+m+|u+h+|e+r+m+|h+m+|mm-hmm|uh-huh)\b[,.]?\s*", re.IGNORECASE)
+SENTENCE_END_PATTERN = re.compile(r"[.!?…][\"')\]]?$")
+MAX_OVERLAP_WORDS = 20
+# Shorter repeats are as likely to be real speech ("...told you no" / "no way")
+MIN_OVERLAP_WORDS = 3
+
+def normalize(text: str) -> str:
+    text = html.unescape(text).replace("\n", " ")
+    text = SOUND_CUE_PATTERN.sub(" ", text)
+    text = FILLER_PATTERN.sub("", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def strip_overlap(previous: str, current: str) -> str:
+    """Drop the prefix of `current` that repeats the tail of `previous`.
+
+    Rolling auto-captions often re-emit the last few words of the previous
+    line at the start of the next one. Only repeats of at least
+    MIN_OVERLAP_WORDS words count, so a line that happens to start with the
+    word the previous one ended on is kept whole.
+    """
+    prev_words = previous.lower().split()[-MAX_OVERLAP_WORDS:]
+    words = current.split()
+    lowered = [w.lower() for w in words]
+    for size in range(min(len(prev_words), len(words)), MIN_OVERLAP_WORDS - 1, -1):
+        if prev_words[-size:] == lowered[:size]:
+            return " ".join(words[size:])
+    return current
+
+@dataclass
+class PreprocessedTranscript:
+    segments: List[dict]
+    raw_tokens: int
+    tokens: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.raw_tokens - self.tokens
+
+    def report(self) -> dict:
+        return {
+            "segments": len(self.segments),
+            "raw_tokens": self.raw_tokens,
+            "tokens": self.tokens,
+            "saved_tokens": self.saved_tokens,
+        }
+
+class TranscriptPreprocessor:
+    """Turns raw caption fragments into compact, sentence-level segments for prompting.
+
+    Fragments are normalized (sound cues, fillers, HTML entities), de-duplicated
+    against their predecessor, and merged into sentences that keep the `start`
+    timestamp of their first fragment. Each segment carries its token count so
+    later stages can pack against a token budget without re-tokenizing.
+    """
+
+    def process(self, transcript: List[dict]) -> PreprocessedTranscript:
+        raw_tokens = count_tokens(" ".join(entry["text"] for entry in transcript))
+        segments: List[dict] = []
+        words: List[str] = []
+        start = 0.0
+        previous = ""
+        for entry in transcript:
+            text = normalize(entry["text"])
+            if not text or text.lower() == previous.lower():
+                continue
+            deduped = strip_overlap(previous, text)
+            previous = text
+            if not deduped:
+                continue
+            if not words:
+                start = entry["start"]
+            words.extend(deduped.split())
+            if SENTENCE_END_PATTERN.search(deduped) or len(words) >= SEGMENT_MAX_WORDS or entry["start"] - start >= SEGMENT_MAX_SECONDS:
+                segments.append(self._segment(start, words))
+                words = []
+        if words:
+            segments.append(self._segment(start, words))
+        return PreprocessedTranscript(
+            segments=segments,
+            raw_tokens=raw_tokens,
+            tokens=count_tokens(" ".join(segment["text"] for segment in segments)),
+        )
+
+    @staticmethod
+    def _segment(start: float, words: List[str]) -> dict:
+        text = " ".join(words)
+        return {"start": start, "text": text, "tokens": count_tokens(text) + 1}
+
+transcript_preprocessor = TranscriptPreprocessor()
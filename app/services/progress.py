@@ -0,0 +1,46 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+class ProgressChannel:
+    """Fan-out of pipeline events for one video to every subscribed stream."""
+
+    def __init__(self):
+        self.subscribers: List[asyncio.Queue] = []
+
+    def publish(self, event: str, data: Any) -> None:
+        for queue in self.subscribers:
+            queue.put_nowait((event, data))
+
+class ProgressRegistry:
+    """Per-video progress channels for /analyze/stream.
+
+    Subscribers register before the pipeline starts so they see every event.
+    Publishing to a video nobody is watching is a no-op, and a channel goes
+    away once its last subscriber leaves. Only same-process subscribers are
+    reached; a stream that joins a run owned by another worker gets the
+    sections when the shared result lands.
+    """
+
+    def __init__(self):
+        self._channels: Dict[str, ProgressChannel] = {}
+
+    def subscribe(self, key: str) -> asyncio.Queue:
+        channel = self._channels.setdefault(key, ProgressChannel())
+        queue: asyncio.Queue = asyncio.Queue()
+        channel.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, key: str, queue: asyncio.Queue) -> None:
+        channel = self._channels.get(key)
+        if channel is None:
+            return
+        channel.subscribers.remove(queue)
+        if not channel.subscribers:
+            del self._channels[key]
+
+    def publish(self, key: str, event: str, data: Any) -> None:
+        channel: Optional[ProgressChannel] = self._channels.get(key)
+        if channel is not None:
+            channel.publish(event, data)
+
+progress = ProgressRegistry()
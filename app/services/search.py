@@ -0,0 +1,125 @@
+import base64
+import heapq
+import math
+import re
+import struct
+import zlib
+from itertools import accumulate
+from typing import Dict, List, Tuple
+
+WORD_RE = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by do for from has have he her his i if in is it its me my no not of on or our "
+    "she so that the their them they this to us was we were what when which who will with you your".split()
+)
+# BM25 parameters; segments are short caption lines, so length normalization is mild
+K1 = 1.2
+B = 0.5
+
+def normalize(word: str) -> str:
+    """Fold simple plurals so "videos" finds "video"."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def words(text: str) -> List[str]:
+    # Single letters are mostly split contractions ("it's")
+    return [word for word in WORD_RE.findall(text.casefold()) if word not in STOPWORDS and (len(word) > 1 or word.isdigit())]
+
+def tokenize(text: str) -> List[str]:
+    return [normalize(word) for word in words(text)]
+
+def library_terms(texts: List[str]) -> str:
+    """Distinct words of a transcript, for the Postgres full-text index."""
+    return " ".join(sorted({word for text in texts for word in words(text)}))
+
+class SearchIndex:
+    """An inverted index over one video's transcript lines, ranked with BM25.
+
+    Each term maps to the ascending line numbers it occurs on and its count
+    on each. Per-line length normalization is precomputed, so a query is a
+    few dict lookups and a pass over the matching postings.
+    """
+
+    def __init__(self, postings: Dict[str, Tuple[List[int], bytes]], lengths: List[int]):
+        self.postings = postings
+        self.lengths = lengths
+        average = sum(lengths) / len(lengths) if lengths else 0
+        self.norms = [K1 * (1 - B + B * length / average) if average else K1 for length in lengths]
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """(line, score) for the best `limit` lines matching any query term."""
+        scores: Dict[int, float] = {}
+        total = len(self.lengths)
+        norms = self.norms
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            lines, counts = posting
+            idf = math.log(1 + (total - len(lines) + 0.5) / (len(lines) + 0.5))
+            for line, count in zip(lines, counts):
+                scores[line] = scores.get(line, 0.0) + idf * count * (K1 + 1) / (count + norms[line])
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+def build_index(texts: List[str]) -> SearchIndex:
+    counts: Dict[str, Dict[int, int]] = {}
+    lengths = []
+    for line, text in enumerate(texts):
+        tokens = tokenize(text)
+        lengths.append(len(tokens))
+        for token in tokens:
+            per_line = counts.setdefault(token, {})
+            per_line[line] = per_line.get(line, 0) + 1
+    postings = {
+        term: (list(per_line), bytes(min(count, 255) for count in per_line.values()))
+        for term, per_line in counts.items()
+    }
+    return SearchIndex(postings, lengths)
+
+def encode_index(index: SearchIndex) -> str:
+    """Compact form for `video_transcripts.search_index`.
+
+    The sorted vocabulary, each term's posting count, the line numbers as
+    per-term deltas, the per-line term counts and the line lengths, as one
+    zlib-compressed little-endian blob in base64.
+    """
+    terms = sorted(index.postings)
+    sizes, deltas, counts = [], [], bytearray()
+    for term in terms:
+        lines, line_counts = index.postings[term]
+        sizes.append(len(lines))
+        deltas.extend(b - a for a, b in zip([0] + lines, lines))
+        counts += line_counts
+    sections = [
+        "\n".join(terms).encode(),
+        struct.pack(f"<{len(sizes)}I", *sizes),
+        struct.pack(f"<{len(deltas)}I", *deltas),
+        bytes(counts),
+        struct.pack(f"<{len(index.lengths)}H", *(min(length, 65535) for length in index.lengths)),
+    ]
+    header = struct.pack(f"<{len(sections)}I", *(len(section) for section in sections))
+    return base64.b64encode(zlib.compress(header + b"".join(sections), 9)).decode()
+
+def decode_index(encoded: str) -> SearchIndex:
+    blob = zlib.decompress(base64.b64decode(encoded))
+    header = struct.calcsize("<5I")
+    sections, position = [], header
+    for size in struct.unpack_from("<5I", blob):
+        sections.append(blob[position:position + size])
+        position += size
+    vocabulary, sizes, deltas, counts, lengths = sections
+    terms = vocabulary.decode().split("\n") if vocabulary else []
+    sizes = struct.unpack(f"<{len(sizes) // 4}I", sizes)
+    deltas = struct.unpack(f"<{len(deltas) // 4}I", deltas)
+    postings = {}
+    position = 0
+    for term, size in zip(terms, sizes):
+        postings[term] = (list(accumulate(deltas[position:position + size])), counts[position:position + size])
+        position += size
+    return SearchIndex(postings, list(struct.unpack(f"<{len(lengths) // 2}H", lengths)))
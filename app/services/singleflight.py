@@ -0,0 +1,198 @@
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.utils.executors import run_blocking
+from app.utils.logger import logger
+
+INFLIGHT_BACKEND = os.getenv("INFLIGHT_BACKEND", "local")
+INFLIGHT_LEASE_SECONDS = float(os.getenv("INFLIGHT_LEASE_SECONDS", "300"))
+INFLIGHT_POLL_SECONDS = float(os.getenv("INFLIGHT_POLL_SECONDS", "0.5"))
+
+class InFlightBackend:
+    """Cross-worker lease registry used by SingleFlight.
+
+    A worker that wins `try_acquire` runs the pipeline for the key; every
+    other worker waits until the lease is released or expires.
+    """
+
+    def try_acquire(self, key: str, owner: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def refresh(self, key: str, owner: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    def release(self, key: str, owner: str) -> None:
+        raise NotImplementedError
+
+    def is_held(self, key: str) -> bool:
+        raise NotImplementedError
+
+class LocalInFlightBackend(InFlightBackend):
+    """Single-process backend; coalescing then only happens within the worker."""
+
+    def __init__(self):
+        self._leases: Dict[str, tuple] = {}
+
+    def try_acquire(self, key: str, owner: str, ttl: float) -> bool:
+        lease = self._leases.get(key)
+        if lease and lease[1] > time.time():
+            return False
+        self._leases[key] = (owner, time.time() + ttl)
+        return True
+
+    def refresh(self, key: str, owner: str, ttl: float) -> None:
+        lease = self._leases.get(key)
+        if lease and lease[0] == owner:
+            self._leases[key] = (owner, time.time() + ttl)
+
+    def release(self, key: str, owner: str) -> None:
+        lease = self._leases.get(key)
+        if lease and lease[0] == owner:
+            del self._leases[key]
+
+    def is_held(self, key: str) -> bool:
+        lease = self._leases.get(key)
+        return bool(lease and lease[1] > time.time())
+
+class SQLiteInFlightBackend(InFlightBackend):
+    """File-backed leases shared by every worker on the same host (and by tests)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS inflight (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def try_acquire(self, key: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM inflight WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute("INSERT OR IGNORE INTO inflight (key, owner, expires_at) VALUES (?, ?, ?)", (key, owner, now + ttl))
+            conn.execute("COMMIT")
+            return cursor.rowcount == 1
+
+    def refresh(self, key: str, owner: str, ttl: float) -> None:
+        with self._connect() as conn:
+            conn.execute("UPDATE inflight SET expires_at = ? WHERE key = ? AND owner = ?", (time.time() + ttl, key, owner))
+
+    def release(self, key: str, owner: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, owner))
+
+    def is_held(self, key: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM inflight WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+            return row is not None
+
+class SupabaseInFlightBackend(InFlightBackend):
+    """Leases in the `inflight_analysis` table, for workers spread across hosts."""
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def _expiry(ttl: float) -> str:
+        return (datetime.now(timezone.utc) + timedelta(seconds=ttl)).isoformat()
+
+    def try_acquire(self, key: str, owner: str, ttl: float) -> bool:
+        now = datetime.now(timezone.utc).isoformat()
+        self.client.table("inflight_analysis").delete().eq("key", key).lt("expires_at", now).execute()
+        resp = self.client.table("inflight_analysis").upsert(
+            {"key": key, "owner": owner, "expires_at": self._expiry(ttl)},
+            on_conflict="key",
+            ignore_duplicates=True,
+        ).execute()
+        return bool(resp.data)
+
+    def refresh(self, key: str, owner: str, ttl: float) -> None:
+        self.client.table("inflight_analysis").update({"expires_at": self._expiry(ttl)}).eq("key", key).eq("owner", owner).execute()
+
+    def release(self, key: str, owner: str) -> None:
+        self.client.table("inflight_analysis").delete().eq("key", key).eq("owner", owner).execute()
+
+    def is_held(self, key: str) -> bool:
+        now = datetime.now(timezone.utc).isoformat()
+        resp = self.client.table("inflight_analysis").select("key").eq("key", key).gt("expires_at", now).execute()
+        return bool(resp.data)
+
+def create_inflight_backend(spec: str = INFLIGHT_BACKEND) -> InFlightBackend:
+    if spec == "local":
+        return LocalInFlightBackend()
+    if spec.startswith("sqlite:///"):
+        return SQLiteInFlightBackend(spec[len("sqlite:///"):])
+    if spec == "supabase":
+        from app.services.supabase_client import supabase
+        return SupabaseInFlightBackend(supabase)
+    raise ValueError(f"Unknown INFLIGHT_BACKEND: {spec}")
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution.
+
+    Callers in the same process await a shared future. Across processes, the
+    backend lease elects one leader; followers wait for the lease to clear and
+    then read the leader's result through `lookup`.
+    """
+
+    def __init__(self, backend: Optional[InFlightBackend] = None, lease_seconds: float = INFLIGHT_LEASE_SECONDS, poll_seconds: float = INFLIGHT_POLL_SECONDS):
+        self.backend = backend or LocalInFlightBackend()
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.owner = uuid.uuid4().hex
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], lookup: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run_once(key, fn, lookup))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            logger.info(f"Joining in-flight analysis for {key}")
+        # Shielded so one caller disconnecting doesn't cancel the run for everyone else
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: str) -> bool:
+        """Whether a call for `key` is already running in this process."""
+        return key in self._calls
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._calls.pop(key, None)
+        if not task.cancelled():
+            # Retrieve the exception even if every caller has gone away
+            task.exception()
+
+    async def _run_once(self, key: str, fn: Callable[[], Awaitable[Any]], lookup: Optional[Callable[[], Awaitable[Any]]]) -> Any:
+        while True:
+            if await run_blocking("db", self.backend.try_acquire, key, self.owner, self.lease_seconds):
+                heartbeat = asyncio.create_task(self._heartbeat(key))
+                try:
+                    return await fn()
+                finally:
+                    heartbeat.cancel()
+                    await run_blocking("db", self.backend.release, key, self.owner)
+
+            logger.info(f"Analysis for {key} is running in another worker; waiting")
+            while await run_blocking("db", self.backend.is_held, key):
+                await asyncio.sleep(self.poll_seconds)
+            if lookup is not None:
+                result = await lookup()
+                if result is not None:
+                    return result
+            # The other worker failed without producing a result; try to take over
+
+    async def _heartbeat(self, key: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await run_blocking("db", self.backend.refresh, key, self.owner, self.lease_seconds)
+            except Exception as e:
+                logger.warning(f"Failed to refresh in-flight lease for {key}: {e}")
+
+analysis_flight = SingleFlight(create_inflight_backend())
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.utils.cache import LRUCache
+from app.utils.executors import run_blocking
+from app.utils.logger import logger
+from app.utils.metrics import registry, span
+
+SOURCE_CACHE_DIR = os.getenv("SOURCE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "youtube-analyzer-source-cache"))
+SOURCE_CACHE_MAX_BYTES = int(os.getenv("SOURCE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+SOURCE_CACHE_MEMORY_ITEMS = int(os.getenv("SOURCE_CACHE_MEMORY_ITEMS", "512"))
+
+@dataclass
+class SourcePolicy:
+    # Served as-is while younger than `ttl`; served and refreshed in the
+    # background until `ttl + stale`; refetched inline after that
+    ttl: float
+    stale: float
+
+def source_policy(kind: str, ttl: float, stale: float) -> SourcePolicy:
+    return SourcePolicy(
+        ttl=float(os.getenv(f"SOURCE_TTL_{kind.upper()}_SECONDS", ttl)),
+        stale=float(os.getenv(f"SOURCE_STALE_{kind.upper()}_SECONDS", stale)),
+    )
+
+DAY = 86400.0
+SOURCE_POLICIES = {
+    # Captions practically never change once published
+    "transcript": source_policy("transcript", 30 * DAY, 335 * DAY),
+    "metadata": source_policy("metadata", DAY, 7 * DAY),
+    # Like counts and new top comments move within hours
+    "details": source_policy("details", 6 * 3600, 2 * DAY),
+}
+
+def _encode(value: Any) -> bytes:
+    def default(obj):
+        if isinstance(obj, datetime):
+            return {"__datetime__": obj.isoformat()}
+        raise TypeError(f"Cannot cache {type(obj).__name__}")
+    return zlib.compress(json.dumps(value, default=default, separators=(",", ":")).encode(), 6)
+
+def _decode(data: bytes) -> Any:
+    def object_hook(obj):
+        if "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+        return obj
+    return json.loads(zlib.decompress(data), object_hook=object_hook)
+
+class SourceCache:
+    """Two-tier cache for YouTube source data, keyed by kind and canonical video ID (with the comment budget, for details).
+
+    The memory tier is an LRU of decoded values; the disk tier keeps one
+    zlib-compressed JSON file per entry, bounded by `max_bytes` with the
+    least recently used files evicted first. Freshness is per kind (see
+    SOURCE_POLICIES): stale entries are returned immediately while a single
+    background refresh replaces them, and concurrent misses for the same
+    entry share one fetch.
+    """
+
+    def __init__(self, directory: str = SOURCE_CACHE_DIR, max_bytes: int = SOURCE_CACHE_MAX_BYTES, memory_items: int = SOURCE_CACHE_MEMORY_ITEMS, policies: Dict[str, SourcePolicy] = SOURCE_POLICIES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.policies = policies
+        self.memory = LRUCache(maxsize=memory_items)
+        self.counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.evictions = 0
+        self._disk_bytes: Optional[int] = None
+        self._disk_lock = threading.Lock()
+        self._fetches: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    async def get_or_fetch(self, kind: str, video_id: str, fetch: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool] = bool) -> Any:
+        """Return the cached value, fetching (and storing it if `cacheable`) when needed."""
+        policy = self.policies[kind]
+        entry = await self._lookup(kind, video_id)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age < policy.ttl:
+                return value
+            if age < policy.ttl + policy.stale:
+                self.counters[kind]["stale"] += 1
+                self._fetch(kind, video_id, fetch, cacheable)
+                return value
+        self.counters[kind]["misses"] += 1
+        return await asyncio.shield(self._fetch(kind, video_id, fetch, cacheable))
+
+    async def put(self, kind: str, video_id: str, value: Any) -> None:
+        stored_at = time.time()
+        self.memory.set((kind, video_id), (stored_at, value))
+        try:
+            await run_blocking("cache", self._write_disk, kind, video_id, stored_at, value)
+        except Exception as e:
+            logger.warning(f"Failed to write {kind} cache for {video_id}: {e}")
+
+    def metrics(self) -> list:
+        lines = ["# HELP source_cache_events_total Source cache lookups by kind and outcome", "# TYPE source_cache_events_total counter"]
+        for kind, counters in self.counters.items():
+            lines.extend(f'source_cache_events_total{{kind="{kind}",event="{event}"}} {count}' for event, count in counters.items())
+        lines += [
+            "# TYPE source_cache_disk_bytes gauge",
+            f"source_cache_disk_bytes {self._disk_bytes or 0}",
+            "# TYPE source_cache_evictions_total counter",
+            f"source_cache_evictions_total {self.evictions}",
+        ]
+        return lines
+
+    def stats(self) -> dict:
+        return {
+            "kinds": {kind: dict(counters) for kind, counters in self.counters.items()},
+            "memory": self.memory.stats(),
+            "disk_bytes": self._disk_bytes,
+            "evictions": self.evictions,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _fetch(self, kind: str, video_id: str, fetch: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool]) -> asyncio.Task:
+        key = (kind, video_id)
+        task = self._fetches.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh(kind, video_id, fetch, cacheable))
+            self._fetches[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return task
+
+    def _finish(self, key: Tuple[str, str], task: asyncio.Task) -> None:
+        self._fetches.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Fetching {key[0]} for {key[1]} failed: {task.exception()}")
+
+    async def _refresh(self, kind: str, video_id: str, fetch: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool]) -> Any:
+        self.counters[kind]["fetches"] += 1
+        with span(f"fetch_{kind}"):
+            value = await fetch()
+        if cacheable(value):
+            await self.put(kind, video_id, value)
+        return value
+
+    async def _lookup(self, kind: str, video_id: str) -> Optional[tuple]:
+        entry = self.memory.get((kind, video_id))
+        if entry is not None:
+            self.counters[kind]["memory_hits"] += 1
+            return entry
+        try:
+            entry = await run_blocking("cache", self._read_disk, kind, video_id)
+        except Exception as e:
+            logger.warning(f"Failed to read {kind} cache for {video_id}: {e}")
+            entry = None
+        if entry is not None:
+            self.counters[kind]["disk_hits"] += 1
+            self.memory.set((kind, video_id), entry)
+        return entry
+
+    def _path(self, kind: str, video_id: str) -> str:
+        return os.path.join(self.directory, kind, f"{video_id}.json.z")
+
+    def _read_disk(self, kind: str, video_id: str) -> Optional[tuple]:
+        path = self._path(kind, video_id)
+        try:
+            with open(path, "rb") as f:
+                entry = _decode(f.read())
+        except FileNotFoundError:
+            return None
+        # Bump the mtime so eviction drops the least recently used entries
+        os.utime(path)
+        return entry["stored_at"], entry["value"]
+
+    def _write_disk(self, kind: str, video_id: str, stored_at: float, value: Any) -> None:
+        data = _encode({"stored_at": stored_at, "value": value})
+        path = self._path(kind, video_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._scan())
+            try:
+                self._disk_bytes -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _evict(self) -> None:
+        # Down to 90% so every write near the limit doesn't rescan the directory
+        target = self.max_bytes * 0.9
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        self._disk_bytes = sum(size for _, size, _ in entries)
+        evicted = 0
+        for path, size, _ in entries:
+            if self._disk_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._disk_bytes -= size
+            evicted += 1
+        self.evictions += evicted
+        logger.info(f"Evicted {evicted} source cache files; {self._disk_bytes} bytes on disk")
+
+source_cache = SourceCache()
+registry.collectors.append(source_cache.metrics)
@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+from app.services.generation import GenerationStats
+from app.services.llm import llm_service
+from app.services.supabase_client import supabase, execute
+from app.utils.cache import LRUCache
+from app.utils.executors import run_blocking
+from app.utils.logger import logger
+from app.utils.tokens import count_tokens
+
+# Transcripts up to this size go to the generation strategy as-is (roughly the old 12,000-character cut)
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "3000"))
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "3000"))
+CHUNK_SUMMARY_MAX_TOKENS = int(os.getenv("CHUNK_SUMMARY_MAX_TOKENS", "300"))
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", "8"))
+# Reduce passes over the chunk summaries before the rest is cut to the budget
+MAX_REDUCE_DEPTH = int(os.getenv("MAX_REDUCE_DEPTH", "3"))
+CHUNK_SUMMARY_CACHE_SIZE = int(os.getenv("CHUNK_SUMMARY_CACHE_SIZE", "4096"))
+
+# Each reduce chunk has to hold at least two summaries, or a pass can't shrink anything
+if CHUNK_TOKEN_BUDGET < 2 * CHUNK_SUMMARY_MAX_TOKENS:
+    raise ValueError(f"CHUNK_TOKEN_BUDGET ({CHUNK_TOKEN_BUDGET}) must be at least twice CHUNK_SUMMARY_MAX_TOKENS ({CHUNK_SUMMARY_MAX_TOKENS})")
+if MAX_REDUCE_DEPTH < 1:
+    raise ValueError("MAX_REDUCE_DEPTH must be at least 1")
+
+# Bump when the map prompt changes so stale cached summaries aren't reused
+MAP_PROMPT_VERSION = "1"
+MAP_PROMPT = (
+    "Summarize this part ({start}-{end}) of a YouTube video transcript in one short paragraph. "
+    "Keep concrete facts, names, numbers and conclusions: {text}"
+)
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def segment_tokens(entry: dict) -> int:
+    # Preprocessed segments carry their token count; raw caption lines are counted here
+    return entry.get("tokens") or count_tokens(entry["text"]) + 1
+
+@dataclass
+class Chunk:
+    start: float
+    end: float
+    text: str
+    tokens: int
+
+    @property
+    def content_hash(self) -> str:
+        return hashlib.sha256(f"{MAP_PROMPT_VERSION}:{llm_service.model}:{self.text}".encode()).hexdigest()
+
+@dataclass
+class CondensedTranscript:
+    text: str
+    chunks: int
+    stats: GenerationStats
+
+def total_tokens(transcript: List[dict]) -> int:
+    return sum(segment_tokens(entry) for entry in transcript)
+
+def truncate_segments(transcript: List[dict], budget: int) -> str:
+    """The leading segments' text, up to `budget` tokens."""
+    texts: List[str] = []
+    tokens = 0
+    for entry in transcript:
+        tokens += segment_tokens(entry)
+        if texts and tokens > budget:
+            break
+        texts.append(entry["text"])
+    return " ".join(texts)
+
+def chunk_transcript(transcript: List[dict], budget: int = CHUNK_TOKEN_BUDGET) -> List[Chunk]:
+    """Split timestamped segments into chunks of at most `budget` tokens.
+
+    Chunk boundaries always fall between segments, so every chunk starts at a
+    real caption timestamp.
+    """
+    chunks: List[Chunk] = []
+    texts: List[str] = []
+    start = end = 0.0
+    tokens = 0
+    for entry in transcript:
+        entry_tokens = segment_tokens(entry)
+        if texts and tokens + entry_tokens > budget:
+            chunks.append(Chunk(start=start, end=entry["start"], text=" ".join(texts), tokens=tokens))
+            texts, tokens = [], 0
+        if not texts:
+            start = entry["start"]
+        texts.append(entry["text"])
+        tokens += entry_tokens
+        end = entry["start"]
+    if texts:
+        chunks.append(Chunk(start=start, end=end, text=" ".join(texts), tokens=tokens))
+    return chunks
+
+class TranscriptSummarizer:
+    """Map-reduce condensation for transcripts over the single-pass token budget.
+
+    Chunks are summarized in parallel under a concurrency cap (map); the
+    timestamped chunk summaries then stand in for the transcript when the
+    generation strategy produces the final sections (reduce). Chunk summaries
+    are cached by content hash in memory and in the `chunk_summaries` table.
+    """
+
+    def __init__(self, budget: int = TRANSCRIPT_TOKEN_BUDGET, chunk_budget: int = CHUNK_TOKEN_BUDGET, concurrency: int = MAP_CONCURRENCY):
+        self.budget = budget
+        self.chunk_budget = chunk_budget
+        self.concurrency = concurrency
+        self.cache = LRUCache(maxsize=CHUNK_SUMMARY_CACHE_SIZE)
+
+    async def condense(self, transcript: List[dict], depth: int = 0) -> CondensedTranscript:
+        stats = GenerationStats(strategy="map")
+        # Raw caption lines are counted with tiktoken, which is too slow for the event loop
+        total = await run_blocking("cpu", total_tokens, transcript)
+        if total <= self.budget:
+            text = " ".join(entry["text"] for entry in transcript)
+            return CondensedTranscript(text=text, chunks=1, stats=stats)
+        if depth >= MAX_REDUCE_DEPTH:
+            logger.warning(f"Transcript still has {total} tokens after {depth} reduce passes; cutting it to {self.budget}")
+            return CondensedTranscript(text=await run_blocking("cpu", truncate_segments, transcript, self.budget), chunks=1, stats=stats)
+
+        chunks = await run_blocking("cpu", chunk_transcript, transcript, self.chunk_budget)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        summaries = await asyncio.gather(*(self._summarize_chunk(chunk, semaphore, stats) for chunk in chunks))
+        condensed = [
+            {"start": chunk.start, "text": f"[{format_timestamp(chunk.start)}-{format_timestamp(chunk.end)}] {summary}"}
+            for chunk, summary in zip(chunks, summaries)
+        ]
+        logger.info(f"Condensed transcript of {len(chunks)} chunks; map stats: {stats.as_dict()}")
+        condensed_tokens = await run_blocking("cpu", total_tokens, condensed)
+        if condensed_tokens >= total:
+            # Summaries as long as their input; another pass would only spend more calls
+            logger.warning(f"Map pass did not shrink the transcript ({total} -> {condensed_tokens} tokens); cutting it to {self.budget}")
+            result = CondensedTranscript(text=await run_blocking("cpu", truncate_segments, condensed, self.budget), chunks=1, stats=GenerationStats(strategy="map"))
+        else:
+            # Very long videos can still exceed the budget after one pass; reduce again
+            result = await self.condense(condensed, depth + 1)
+        stats.merge(result.stats)
+        return CondensedTranscript(
+            text="The transcript is condensed into timestamped section summaries: " + result.text if result.chunks == 1 else result.text,
+            chunks=len(chunks),
+            stats=stats,
+        )
+
+    async def _summarize_chunk(self, chunk: Chunk, semaphore: asyncio.Semaphore, stats: GenerationStats) -> str:
+        key = chunk.content_hash
+        summary = await self._cached_summary(key)
+        if summary is not None:
+            return summary
+        async with semaphore:
+            result = await llm_service.generate(
+                MAP_PROMPT.format(start=format_timestamp(chunk.start), end=format_timestamp(chunk.end), text=chunk.text),
+                max_tokens=CHUNK_SUMMARY_MAX_TOKENS,
+                temperature=0.3,
+            )
+        stats.record(result)
+        self.cache.set(key, result.content)
+        try:
+            await execute(supabase.table("chunk_summaries").upsert({"content_hash": key, "summary": result.content}, on_conflict="content_hash"))
+        except Exception as e:
+            logger.warning(f"Failed to persist chunk summary {key[:12]}: {e}")
+        return result.content
+
+    async def _cached_summary(self, key: str) -> Optional[str]:
+        summary = self.cache.get(key)
+        if summary is not None:
+            return summary
+        try:
+            resp = await execute(supabase.table("chunk_summaries").select("summary").eq("content_hash", key).limit(1))
+        except Exception as e:
+            logger.warning(f"Failed to read chunk summary {key[:12]}: {e}")
+            return None
+        if not resp.data:
+            return None
+        summary = resp.data[0]["summary"]
+        self.cache.set(key, summary)
+        return summary
+
+transcript_summarizer = TranscriptSummarizer()
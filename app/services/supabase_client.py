@@ -1,10 +1,42 @@
 import os
-from supabase import create_client, Client
+import threading
+from typing import TYPE_CHECKING, Optional
+from app.utils.executors import run_blocking, STAGE_TIMEOUTS
+from app.utils.metrics import span
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_KEY must be set in environment variables.")
+class LazyClient:
+    """Stands in for the Supabase client, which is imported and created on first use.
+
+    Importing supabase (and postgrest, httpx and friends) is a large part of
+    a cold start, and routes like /health never touch the database.
+    """
+
+    def __init__(self):
+        self._client: Optional["Client"] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> "Client":
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if not SUPABASE_URL or not SUPABASE_KEY:
+                        raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_KEY must be set in environment variables.")
+                    from supabase import create_client
+                    self._client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        return self._client
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
+supabase = LazyClient()
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY) 
\ No newline at end of file
+async def execute(query):
+    """Execute a PostgREST query builder on the DB executor instead of the event loop."""
+    with span("db"):
+        return await run_blocking("db", query.execute, timeout=STAGE_TIMEOUTS["db"])
@@ -1,15 +1,13 @@
-from youtube_transcript_api._api import YouTubeTranscriptApi
-from youtube_transcript_api._errors import TranscriptsDisabled, NoTranscriptFound
+from app.utils.youtube import extract_video_id
 
 class TranscriptService:
     @staticmethod
     def fetch_transcript(youtube_url: str) -> list:
-        # Extract video ID from URL
-        import re
-        match = re.search(r"(?:v=|youtu.be/)([\w-]{11})", youtube_url)
-        if not match:
+        from youtube_transcript_api._api import YouTubeTranscriptApi
+        from youtube_transcript_api._errors import TranscriptsDisabled, NoTranscriptFound
+        video_id = extract_video_id(youtube_url)
+        if not video_id:
             raise ValueError("Invalid YouTube URL")
-        video_id = match.group(1)
         try:
             transcript = YouTubeTranscriptApi.get_transcript(video_id)
             return [
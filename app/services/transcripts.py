@@ -0,0 +1,184 @@
+import base64
+import bisect
+import json
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+from app.services.search import SearchIndex, build_index, decode_index, encode_index, library_terms
+from app.services.supabase_client import supabase, execute
+from app.utils.cache import LRUCache
+from app.utils.executors import run_blocking
+from app.utils.logger import logger
+
+# Lines returned with an analysis and by default per /videos/{id}/transcript page
+TRANSCRIPT_PAGE_SIZE = int(os.getenv("TRANSCRIPT_PAGE_SIZE", "100"))
+TRANSCRIPT_MAX_PAGE_SIZE = int(os.getenv("TRANSCRIPT_MAX_PAGE_SIZE", "1000"))
+TRANSCRIPT_CACHE_ITEMS = int(os.getenv("TRANSCRIPT_CACHE_ITEMS", "64"))
+SEARCH_INDEX_CACHE_ITEMS = int(os.getenv("SEARCH_INDEX_CACHE_ITEMS", "256"))
+
+@dataclass
+class Transcript:
+    """A decoded transcript held as parallel start-time and text columns."""
+    starts: List[float]
+    texts: List[str]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.starts[-1] if self.starts else None
+
+    def lines(self, offset: int, limit: int) -> List[dict]:
+        return [{"start": start, "text": text} for start, text in zip(self.starts[offset:offset + limit], self.texts[offset:offset + limit])]
+
+    def index_at(self, seconds: float) -> int:
+        """Index of the first line starting at or after `seconds`."""
+        return bisect.bisect_left(self.starts, seconds)
+
+def first_page(transcript: Optional[list]) -> List[dict]:
+    return (transcript or [])[:TRANSCRIPT_PAGE_SIZE]
+
+def encode_transcript(transcript: List[dict]) -> dict:
+    """Columnar row for `video_transcripts`.
+
+    Start times are stored as zlib-compressed little-endian int32 deltas in
+    milliseconds, which are small and repetitive; texts as a zlib-compressed
+    JSON array. Both are base64 text so they pass through PostgREST as-is.
+    """
+    millis = [round(entry["start"] * 1000) for entry in transcript]
+    deltas = [b - a for a, b in zip([0] + millis, millis)]
+    texts = [entry["text"] for entry in transcript]
+    return {
+        "line_count": len(transcript),
+        "duration_seconds": transcript[-1]["start"] if transcript else None,
+        "starts": base64.b64encode(zlib.compress(struct.pack(f"<{len(deltas)}i", *deltas), 9)).decode(),
+        "texts": base64.b64encode(zlib.compress(json.dumps(texts, ensure_ascii=False, separators=(",", ":")).encode(), 9)).decode(),
+    }
+
+def index_row(texts: List[str], index: Optional[SearchIndex] = None) -> dict:
+    """The `video_transcripts` search columns for a transcript."""
+    return {
+        "search_index": encode_index(index or build_index(texts)),
+        "search_terms": library_terms(texts),
+    }
+
+def encode_transcript_row(transcript: List[dict]) -> dict:
+    return {**encode_transcript(transcript), **index_row([entry["text"] for entry in transcript])}
+
+def decode_transcript(row: dict) -> Transcript:
+    deltas = zlib.decompress(base64.b64decode(row["starts"]))
+    starts = [ms / 1000 for ms in accumulate(struct.unpack(f"<{len(deltas) // 4}i", deltas))]
+    texts = json.loads(zlib.decompress(base64.b64decode(row["texts"])))
+    return Transcript(starts=starts, texts=texts)
+
+class TranscriptStore:
+    """Full transcripts, stored once per video in `video_transcripts`.
+
+    Analyses only carry the first page; this serves the rest. Decoded
+    transcripts are kept in a small LRU so paging through one is cheap.
+    Videos analyzed before the table existed still have the full transcript
+    on their shared analysis row; the first read moves it here and trims the
+    row down to the first page.
+
+    Each row also carries a search index of its lines, written with the
+    transcript (or on the first search, for older rows) and decoded into a
+    separate LRU on demand.
+    """
+
+    def __init__(self, memory_items: int = TRANSCRIPT_CACHE_ITEMS, index_items: int = SEARCH_INDEX_CACHE_ITEMS):
+        self.memory = LRUCache(maxsize=memory_items)
+        self.indexes = LRUCache(maxsize=index_items)
+
+    async def put_many(self, transcripts: Dict[str, List[dict]]) -> None:
+        rows = [
+            {"youtube_video_id": video_id, **await run_blocking("cache", encode_transcript_row, transcript)}
+            for video_id, transcript in transcripts.items() if transcript
+        ]
+        if not rows:
+            return
+        await execute(supabase.table("video_transcripts").upsert(rows, on_conflict="youtube_video_id"))
+        for video_id in transcripts:
+            self.memory.pop(video_id)
+            self.indexes.pop(video_id)
+
+    async def get(self, video_id: str) -> Optional[Transcript]:
+        transcript = self.memory.get(video_id)
+        if transcript is not None:
+            return transcript
+        resp = await execute(supabase.table("video_transcripts").select("starts, texts").eq("youtube_video_id", video_id).limit(1))
+        if resp.data:
+            transcript = await run_blocking("cache", decode_transcript, resp.data[0])
+        else:
+            transcript = await self._migrate(video_id)
+            if transcript is None:
+                return None
+        self.memory.set(video_id, transcript)
+        return transcript
+
+    async def search(self, video_id: str, query: str, limit: int) -> Optional[List[dict]]:
+        """The transcript lines that best match `query`, best first; None without a transcript."""
+        index = self.indexes.get(video_id)
+        transcript = self.memory.get(video_id)
+        if index is None or transcript is None:
+            loaded = await self._load_searchable(video_id, transcript)
+            if loaded is None:
+                return None
+            transcript, index = loaded
+        hits = []
+        for line, score in index.search(query, limit):
+            hits.append({
+                "line": line,
+                "start": transcript.starts[line],
+                "end": transcript.starts[line + 1] if line + 1 < len(transcript) else None,
+                "text": transcript.texts[line],
+                "score": round(score, 4),
+            })
+        return hits
+
+    async def _load_searchable(self, video_id: str, transcript: Optional[Transcript]) -> Optional[Tuple[Transcript, SearchIndex]]:
+        columns = "search_index" if transcript is not None else "starts, texts, search_index"
+        resp = await execute(supabase.table("video_transcripts").select(columns).eq("youtube_video_id", video_id).limit(1))
+        row = resp.data[0] if resp.data else None
+        if row is None:
+            transcript = await self._migrate(video_id)
+            if transcript is None:
+                return None
+        elif transcript is None:
+            transcript = await run_blocking("cache", decode_transcript, row)
+        self.memory.set(video_id, transcript)
+
+        if row is not None and row.get("search_index"):
+            index = await run_blocking("cache", decode_index, row["search_index"])
+        else:
+            index = await run_blocking("cache", build_index, transcript.texts)
+            if row is not None:
+                # Stored before search existed; _migrate's put_many already wrote it otherwise
+                await execute(supabase.table("video_transcripts").update(
+                    await run_blocking("cache", index_row, transcript.texts, index)
+                ).eq("youtube_video_id", video_id))
+                logger.info(f"Built the search index of video {video_id}")
+        self.indexes.set(video_id, index)
+        return transcript, index
+
+    async def _migrate(self, video_id: str) -> Optional[Transcript]:
+        resp = await execute(supabase.table("shared_analysis").select("id, transcript, transcript_lines").eq("youtube_video_id", video_id).limit(1))
+        shared = resp.data[0] if resp.data else None
+        # transcript_lines is only set once the row holds just the first page
+        if shared is None or shared["transcript_lines"] is not None or not shared["transcript"]:
+            return None
+        full = shared["transcript"]
+        await self.put_many({video_id: full})
+        await execute(supabase.table("shared_analysis").update({
+            "transcript": first_page(full),
+            "transcript_lines": len(full),
+            # AnalysisCache.content_hash hashes the trimmed row instead
+            "content_hash": None,
+        }).eq("id", shared["id"]))
+        logger.info(f"Moved the {len(full)}-line transcript of video {video_id} to video_transcripts")
+        return Transcript(starts=[entry["start"] for entry in full], texts=[entry["text"] for entry in full])
+
+transcript_store = TranscriptStore()
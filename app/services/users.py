@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from typing import Optional
+from app.services.supabase_client import supabase, execute
+from app.utils.logger import logger
+
+FREE_MONTHLY_CREDITS = 5
+
+class CreditsExhaustedError(Exception):
+    pass
+
+@dataclass
+class AnalysisContext:
+    user: dict
+    video: Optional[dict] = None
+    analysis_ref: Optional[dict] = None
+
+async def get_or_create_user(clerk_user: dict) -> dict:
+    clerk_id = clerk_user["sub"]
+    user_resp = await execute(supabase.table("users").select("*").eq("clerk_id", clerk_id))
+    if not user_resp.data:
+        logger.info(f"User with clerk_id {clerk_id} not found. Creating new user.")
+        user_insert = await execute(supabase.table("users").insert({
+            "clerk_id": clerk_id,
+            "email": clerk_user.get("email"),
+        }))
+        return user_insert.data[0]
+    else:
+        logger.info(f"User with clerk_id {clerk_id} found. Retrieving existing user.")
+        return user_resp.data[0]
+
+async def get_user(user_id: str) -> dict:
+    user_resp = await execute(supabase.table("users").select("*").eq("id", user_id))
+    if not user_resp.data:
+        raise LookupError(f"User {user_id} not found.")
+    return user_resp.data[0]
+
+async def begin_analysis(clerk_user: dict, youtube_video_id: Optional[str] = None) -> AnalysisContext:
+    """Fetch or create the user with the monthly credit reset applied, plus the
+    video and the user's analysis reference, in one begin_analysis call."""
+    resp = await execute(supabase.rpc("begin_analysis", {
+        "p_clerk_id": clerk_user["sub"],
+        "p_email": clerk_user.get("email"),
+        "p_youtube_video_id": youtube_video_id,
+        "p_monthly_credits": FREE_MONTHLY_CREDITS,
+    }))
+    return AnalysisContext(user=resp.data["user"], video=resp.data["video"], analysis_ref=resp.data["analysis"])
+
+async def begin_job_analysis(user_id: str, youtube_video_id: str) -> AnalysisContext:
+    """begin_analysis for a user known by ID, as queued jobs are, via begin_job_analysis."""
+    resp = await execute(supabase.rpc("begin_job_analysis", {
+        "p_user_id": user_id,
+        "p_youtube_video_id": youtube_video_id,
+        "p_monthly_credits": FREE_MONTHLY_CREDITS,
+    }))
+    if not resp.data:
+        raise LookupError(f"User {user_id} not found.")
+    return AnalysisContext(user=resp.data["user"], video=resp.data["video"], analysis_ref=resp.data["analysis"])
+
+async def load_analysis_context(clerk_user: dict, youtube_video_id: Optional[str] = None) -> AnalysisContext:
+    """begin_analysis, then check the user can analyze."""
+    context = await begin_analysis(clerk_user, youtube_video_id)
+    ensure_credits(context.user)
+    return context
+
+async def load_user_for_analysis(clerk_user: dict) -> dict:
+    """Fetch the user, apply the monthly credit reset and check they can analyze."""
+    return (await load_analysis_context(clerk_user)).user
+
+def ensure_credits(user: dict) -> dict:
+    if user['tier'] == 'free' and user['credits_remaining'] <= 0:
+        raise CreditsExhaustedError("You have exhausted your free credits for the month.")
+    return user
@@ -1,52 +1,103 @@
-import yt_dlp
-from ..utils.logger import logger
 import re
+from typing import List, Optional
+from .comments import NUM_TOP_COMMENTS, comment_budget_for_tier, format_comment, top_comments_extractor, top_comments_ydl
+from ..utils.logger import logger
+from ..utils.youtube import extract_video_id
 from datetime import datetime
 
-def fetch_video_metadata(url: str) -> dict:
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-        'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
-        'extract_flat': True, # Only extract info, don't download
+FLAT_EXTRACT_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+    'extract_flat': True, # Only extract info, don't download
+}
+
+# Channel pages list tabs (videos, shorts, live) rather than videos
+CHANNEL_URL_PATTERN = re.compile(r"^(https?://(?:www\.|m\.)?youtube\.com/(?:@[^/?#]+|channel/[^/?#]+|c/[^/?#]+|user/[^/?#]+))/?(?:featured)?(?:[?#].*)?$")
+
+def metadata_from_info(info_dict: dict) -> dict:
+    # Extract relevant fields
+    published_date_str = info_dict.get('upload_date') # YYYYMMDD format
+    published_date = None
+    if published_date_str:
+        try:
+            published_date = datetime.strptime(published_date_str, '%Y%m%d')
+        except ValueError:
+            pass # Keep published_date as None if parsing fails
+    thumbnail_url = info_dict.get('thumbnail')
+    if not thumbnail_url and info_dict.get('thumbnails'):
+        # Flat playlist entries only carry the thumbnail list
+        thumbnail_url = info_dict['thumbnails'][-1].get('url')
+
+    return {
+        "title": info_dict.get('title'),
+        "channel_name": info_dict.get('uploader') or info_dict.get('channel'),
+        "channel_url": info_dict.get('uploader_url') or info_dict.get('channel_url'),
+        "thumbnail_url": thumbnail_url,
+        "duration_seconds": int(info_dict['duration']) if info_dict.get('duration') else None,
+        "published_date": published_date,
+    }
+
+def fetch_playlist_entries(url: str, limit: int) -> List[dict]:
+    """List the videos of a playlist or channel with one flat extraction.
+
+    Returns up to `limit` entries of video metadata, each with its
+    `youtube_video_id`, without visiting the individual video pages.
+    """
+    match = CHANNEL_URL_PATTERN.match(url)
+    if match:
+        url = f"{match.group(1)}/videos"
+    import yt_dlp
+    ydl_opts = {**FLAT_EXTRACT_OPTS, 'extract_flat': 'in_playlist', 'playlistend': limit}
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info_dict = ydl.extract_info(url, download=False)
+
+    entries = []
+    pending = list(info_dict.get('entries') or [])
+    while pending and len(entries) < limit:
+        entry = pending.pop(0)
+        if not entry:
+            continue
+        if entry.get('entries'):
+            pending[:0] = entry['entries']
+            continue
+        video_id = extract_video_id(entry.get('id') or '') or extract_video_id(entry.get('url') or '')
+        if video_id:
+            entries.append({"youtube_video_id": video_id, **metadata_from_info(entry)})
+    return entries
+
+def extract_video_details(url: str, tier: Optional[str] = None, num_comments: int = NUM_TOP_COMMENTS) -> dict:
+    """Metadata and top comments from a single extraction.
+
+    Comments are top-sorted and streamed into a top-k heap under the tier's
+    page and time budget (see app.services.comments).
+    """
+    ydl_opts = {**FLAT_EXTRACT_OPTS, 'skip_download': True, 'noplaylist': True}
+    with top_comments_ydl(ydl_opts, num_comments, comment_budget_for_tier(tier)) as ydl:
+        info_dict = ydl.extract_info(url, download=False, ie_key=top_comments_extractor().ie_key())
+    return {
+        "metadata": metadata_from_info(info_dict),
+        "top_comments": [format_comment(comment) for comment in info_dict.get('comments') or []],
+    }
+
+def extract_video_metadata(url: str) -> dict:
+    import yt_dlp
+    with yt_dlp.YoutubeDL(FLAT_EXTRACT_OPTS) as ydl:
+        info_dict = ydl.extract_info(url, download=False)
+        return metadata_from_info(info_dict)
+
+def fallback_metadata(url: str) -> dict:
+    # Fallback: Try to extract video ID and provide basic info
+    video_id = extract_video_id(url) or "unknown"
+    fallback_metadata = {
+        "title": f"YouTube Video (ID: {video_id})",
+        "channel_name": "Unknown Channel",
+        "channel_url": None,
+        "thumbnail_url": f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg",
+        "duration_seconds": None,
+        "published_date": None,
+        # Placeholders only; never written over a stored video row
+        "fallback": True,
     }
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
-            # Extract relevant fields
-            title = info_dict.get('title')
-            channel_name = info_dict.get('uploader')
-            channel_url = info_dict.get('uploader_url')
-            thumbnail_url = info_dict.get('thumbnail')
-            duration_seconds = info_dict.get('duration')
-            published_date_str = info_dict.get('upload_date') # YYYYMMDD format
-            published_date = None
-            if published_date_str:
-                try:
-                    published_date = datetime.strptime(published_date_str, '%Y%m%d')
-                except ValueError:
-                    pass # Keep published_date as None if parsing fails
-
-            return {
-                "title": title,
-                "channel_name": channel_name,
-                "channel_url": channel_url,
-                "thumbnail_url": thumbnail_url,
-                "duration_seconds": duration_seconds,
-                "published_date": published_date,
-            }
-    except Exception as e:
-        logger.error(f"Error fetching video metadata for {url} using yt-dlp: {e}")
-        # Fallback: Try to extract video ID and provide basic info
-        video_id_match = re.search(r"(?:v=|youtu\.be/)([\w-]+)", url)
-        video_id = video_id_match.group(1) if video_id_match else "unknown"
-        fallback_metadata = {
-            "title": f"YouTube Video (ID: {video_id})",
-            "channel_name": "Unknown Channel",
-            "channel_url": None,
-            "thumbnail_url": f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg",
-            "duration_seconds": None,
-            "published_date": None,
-        }
-        logger.warning(f"Returning fallback metadata for {url}: {fallback_metadata}")
-        return fallback_metadata
+    logger.warning(f"Returning fallback metadata for {url}: {fallback_metadata}")
+    return fallback_metadata
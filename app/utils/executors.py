@@ -0,0 +1,44 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# Separately sized pools so a slow yt-dlp crawl can't starve DB or payment calls,
+# and none of them block the event loop.
+EXECUTORS = {
+    "ytdlp": ThreadPoolExecutor(max_workers=int(os.getenv("YTDLP_WORKERS", "4")), thread_name_prefix="ytdlp"),
+    "transcript": ThreadPoolExecutor(max_workers=int(os.getenv("TRANSCRIPT_WORKERS", "8")), thread_name_prefix="transcript"),
+    "db": ThreadPoolExecutor(max_workers=int(os.getenv("DB_WORKERS", "16")), thread_name_prefix="db"),
+    "payment": ThreadPoolExecutor(max_workers=int(os.getenv("PAYMENT_WORKERS", "4")), thread_name_prefix="payment"),
+    "cache": ThreadPoolExecutor(max_workers=int(os.getenv("CACHE_WORKERS", "4")), thread_name_prefix="cache"),
+    # Transcript cleanup and token counting over whole transcripts
+    "cpu": ThreadPoolExecutor(max_workers=int(os.getenv("CPU_WORKERS", "2")), thread_name_prefix="cpu"),
+    "warmup": ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup"),
+}
+
+# Per-stage timeouts in seconds
+STAGE_TIMEOUTS = {
+    "metadata": float(os.getenv("METADATA_TIMEOUT_SECONDS", "20")),
+    "playlist": float(os.getenv("PLAYLIST_TIMEOUT_SECONDS", "60")),
+    "transcript": float(os.getenv("TRANSCRIPT_TIMEOUT_SECONDS", "30")),
+    "comments": float(os.getenv("COMMENTS_TIMEOUT_SECONDS", "45")),
+    "db": float(os.getenv("DB_TIMEOUT_SECONDS", "10")),
+    "payment": float(os.getenv("PAYMENT_TIMEOUT_SECONDS", "15")),
+}
+
+async def run_blocking(pool: str, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+    """Run a blocking call on the named executor, optionally bounded by a timeout.
+
+    On timeout the caller is released immediately; the worker thread finishes
+    in the background since Python threads can't be interrupted.
+    """
+    loop = asyncio.get_running_loop()
+    call = loop.run_in_executor(EXECUTORS[pool], functools.partial(fn, *args, **kwargs))
+    if timeout is None:
+        return await call
+    return await asyncio.wait_for(call, timeout)
+
+def shutdown_executors() -> None:
+    for executor in EXECUTORS.values():
+        executor.shutdown(wait=False, cancel_futures=True)
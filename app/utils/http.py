@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import json
+import os
+from typing import Any, Optional
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this go out uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+def dumps(content: Any, sort_keys: bool = False) -> bytes:
+    """JSON-encode plain data or a Pydantic model, with orjson when it is installed."""
+    if isinstance(content, BaseModel):
+        if orjson is None and not sort_keys:
+            return content.model_dump_json().encode()
+        content = content.model_dump(mode="python" if orjson else "json")
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return json.dumps(content, default=str, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False).encode()
+
+def make_etag(*parts: str) -> str:
+    return '"' + hashlib.sha256("\0".join(parts).encode()).hexdigest()[:32] + '"'
+
+def matching_etag(request: Request, etag: str) -> Optional[str]:
+    """The If-None-Match entry that matches `etag` or one of its per-encoding variants.
+
+    Weak comparison; the entry comes back as the client sent it, so a 304
+    carries the same variant the 200 did.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    if header.strip() == "*":
+        return etag
+    opaque = etag.strip('"')
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        tag = candidate.removeprefix("W/").strip('"')
+        if tag == opaque or tag.rsplit("-", 1)[0] == opaque:
+            return candidate
+    return None
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+def not_modified(request: Request, etag: str, cache_control: Optional[str] = None) -> Optional[Response]:
+    """A 304 for a matching If-None-Match, checked before the body is built."""
+    matched = matching_etag(request, etag)
+    if matched is None:
+        return None
+    headers = {"ETag": matched, "Vary": "Accept-Encoding"}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return Response(status_code=304, headers=headers)
+
+def json_response(request: Request, content: Any, etag: Optional[str] = None, cache_control: Optional[str] = None, status_code: int = 200) -> Response:
+    """Encode `content` and negotiate compression, bypassing FastAPI's jsonable_encoder.
+
+    GET responses get an ETag, from the body's hash unless one is given, and
+    a 304 when the client already has it.
+    """
+    body = dumps(content)
+    if etag is None and request.method == "GET" and status_code == 200:
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    if etag is not None and request.method == "GET":
+        cached = not_modified(request, etag, cache_control)
+        if cached is not None:
+            return cached
+
+    headers = {"Vary": "Accept-Encoding"}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    encoding = choose_encoding(request.headers.get("accept-encoding", "")) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding == "br":
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if etag is not None:
+        # A strong validator has to differ between encodings of the same content
+        headers["ETag"] = f'"{etag.strip(chr(34))}-{encoding}"' if encoding else etag
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
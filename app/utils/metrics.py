@@ -0,0 +1,200 @@
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 45.0, 90.0)
+QUANTILES = (0.5, 0.95, 0.99)
+# Observations per series kept for the p50/p95/p99 summaries
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1024"))
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"'.replace("\n", " ") for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in sorted(values.items())]
+
+@dataclass
+class _HistogramSeries:
+    counts: List[int]
+    sum: float = 0.0
+    count: int = 0
+    recent: deque = field(default_factory=lambda: deque(maxlen=METRICS_WINDOW))
+
+class Histogram:
+    """Prometheus histogram, plus p50/p95/p99 over each series' recent window
+    exported as `<name>_recent` summaries."""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(counts=[0] * (len(self.buckets) + 1))
+            series.counts[bisect.bisect_left(self.buckets, value)] += 1
+            series.sum += value
+            series.count += 1
+            series.recent.append(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        summary = [f"# HELP {self.name}_recent {self.help} (last {METRICS_WINDOW} observations)", f"# TYPE {self.name}_recent summary"]
+        with self._lock:
+            series_items = sorted((key, series.counts[:], series.sum, series.count, sorted(series.recent)) for key, series in self._series.items())
+        for key, counts, total, count, ordered in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+            for q in QUANTILES:
+                value = ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+                quantile = f'quantile="{q}"'
+                summary.append(f"{self.name}_recent{_format_labels(self.labels, key, quantile)} {value}")
+        return lines + summary
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+        # Callables returning extra exposition lines, for stats kept elsewhere
+        self.collectors: List[Callable[[], List[str]]] = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram("stage_duration_seconds", "Duration of pipeline stages and external calls", ["stage"])
+STAGE_ERRORS = registry.counter("stage_errors_total", "Pipeline stages that raised", ["stage", "error"])
+HTTP_SECONDS = registry.histogram("http_request_duration_seconds", "HTTP request latency until response headers", ["method", "route", "status"])
+
+@dataclass
+class RequestMetrics:
+    """Per-request (or per-job) accumulator for Server-Timing and usage accounting."""
+    timings: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        entries = []
+        for stage, durations in self.timings.items():
+            entry = f"{stage};dur={sum(durations) * 1000:.1f}"
+            if len(durations) > 1:
+                entry += f';desc="{len(durations)} calls"'
+            entries.append(entry)
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+_current: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar("request_metrics", default=None)
+
+def current_request() -> Optional[RequestMetrics]:
+    return _current.get()
+
+@contextlib.contextmanager
+def request_scope() -> Iterator[RequestMetrics]:
+    """Collect spans and token usage from everything started inside the block,
+    including tasks it creates."""
+    request = RequestMetrics()
+    token = _current.set(request)
+    try:
+        yield request
+    finally:
+        _current.reset(token)
+
+@contextlib.contextmanager
+def span(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if not isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+            STAGE_ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        request = _current.get()
+        if request is not None:
+            request.timings[stage].append(elapsed)
+
+class MetricsMiddleware:
+    """Times every HTTP request and adds a Server-Timing header with its spans.
+
+    The header goes out with the response start, so streamed responses only
+    report the spans finished before their first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+
+        with request_scope() as request:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    elapsed = time.perf_counter() - started
+                    route = scope.get("route")
+                    HTTP_SECONDS.observe(elapsed, method=scope["method"], route=getattr(route, "path", "unmatched"), status=message["status"])
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", request.server_timing(elapsed).encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens if available; otherwise return the seconds to wait."""
+        amount = min(amount, self.capacity)
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        while True:
+            wait = self.try_acquire(amount)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def adjust(self, delta: float) -> None:
+        """Charge (or refund) tokens after the fact, e.g. once real usage is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+class AIMDLimiter:
+    """Concurrency limit with additive increase and multiplicative decrease.
+
+    Callers report each outcome: successes under the latency target grow the
+    limit by `increase`, while overload signals (429s, slow responses) scale it
+    down by `backoff`.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64, increase: float = 1.0, backoff: float = 0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.backoff = backoff
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, overloaded: bool = False) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+            else:
+                # Additive increase spread over a full window of successful calls
+                self.limit = min(self.maximum, self.limit + self.increase / max(self.limit, 1.0))
+            self._cond.notify_all()
@@ -0,0 +1,6 @@
+import json
+from typing import Any
+
+def format_event(event: str, data: Any) -> str:
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,41 @@
+import re
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Video IDs are 11 characters of URL-safe base64
+VIDEO_ID = r"[A-Za-z0-9_-]{11}"
+BARE_VIDEO_ID_PATTERN = re.compile(VIDEO_ID)
+# /shorts/, /embed/, /live/ and /v/ style paths on a youtube.com host
+VIDEO_PATH_PATTERN = re.compile(rf"^/(?:shorts|embed|live|v)/({VIDEO_ID})(?:/|$)")
+YOUTUBE_HOSTS = {"youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com"}
+SHORT_LINK_HOST = "youtu.be"
+
+def extract_video_id(youtube_url: str) -> Optional[str]:
+    """The video ID from a bare ID, a youtu.be link or a youtube.com watch/shorts/embed/live/v URL.
+
+    The host is checked before the path, so look-alike URLs on other sites are rejected.
+    """
+    youtube_url = youtube_url.strip()
+    if BARE_VIDEO_ID_PATTERN.fullmatch(youtube_url):
+        return youtube_url
+    try:
+        parts = urlsplit(youtube_url if "://" in youtube_url else f"https://{youtube_url}")
+    except ValueError:
+        return None
+    if parts.scheme not in ("http", "https"):
+        return None
+    host = parts.hostname or ""
+    if host == SHORT_LINK_HOST:
+        candidate = parts.path[1:].split("/", 1)[0]
+    elif host in YOUTUBE_HOSTS:
+        if parts.path.rstrip("/") == "/watch":
+            candidate = parse_qs(parts.query).get("v", [""])[0]
+        else:
+            match = VIDEO_PATH_PATTERN.match(parts.path)
+            candidate = match.group(1) if match else ""
+    else:
+        return None
+    return candidate if BARE_VIDEO_ID_PATTERN.fullmatch(candidate) else None
+
+def canonical_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
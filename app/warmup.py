@@ -0,0 +1,55 @@
+import hmac
+import importlib
+import os
+import time
+from typing import Callable, Dict, Optional
+from app.utils.executors import run_blocking
+from app.utils.logger import logger
+
+# Load heavy dependencies and build clients in the background at startup.
+# Off on Vercel, where a cold start should only pay for the route it serves;
+# GET /warmup runs the same steps on demand.
+APP_WARMUP = os.getenv("APP_WARMUP", "false" if os.getenv("VERCEL") else "true").lower() == "true"
+# Shared secret for GET /warmup, sent as "Authorization: Bearer <token>" (e.g. by
+# a cron job); the route is disabled while this is unset
+WARMUP_TOKEN = os.getenv("WARMUP_TOKEN", "")
+
+def warmup_authorized(authorization: Optional[str]) -> bool:
+    scheme, _, token = (authorization or "").partition(" ")
+    return bool(WARMUP_TOKEN) and scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), WARMUP_TOKEN.encode())
+
+def warmup_steps() -> Dict[str, Callable[[], object]]:
+    from app.api.routes import get_razorpay_client
+    from app.services.auth import token_verifier
+    from app.services.comments import top_comments_extractor
+    from app.services.llm import OpenAITransport, llm_service
+    from app.services.supabase_client import supabase
+    from app.utils.tokens import count_tokens
+
+    return {
+        "supabase": lambda: supabase.table,
+        "openai": lambda: llm_service.transport.client if isinstance(llm_service.transport, OpenAITransport) else None,
+        "auth": lambda: token_verifier.static_key,
+        "yt_dlp": top_comments_extractor,
+        "youtube_transcript_api": lambda: importlib.import_module("youtube_transcript_api._api"),
+        "razorpay": get_razorpay_client,
+        "tiktoken": lambda: count_tokens("warmup"),
+    }
+
+async def warmup() -> Dict[str, Optional[float]]:
+    """Run every step on the warmup thread, so the event loop keeps serving.
+
+    Returns the seconds each step took; None for a step that failed. Steps
+    that already ran are close to free, so this is safe to call repeatedly.
+    """
+    timings: Dict[str, Optional[float]] = {}
+    for name, step in warmup_steps().items():
+        started = time.perf_counter()
+        try:
+            await run_blocking("warmup", step)
+            timings[name] = round(time.perf_counter() - started, 4)
+        except Exception as e:
+            logger.warning(f"Warmup step {name} failed: {e}")
+            timings[name] = None
+    logger.info(f"Warmup done: {timings}")
+    return timings
@@ -0,0 +1,124 @@
+"""Analysis job worker pool.
+
+Run with `python -m app.worker`. Starts JOB_WORKER_PROCESSES processes, each
+running up to JOB_WORKER_CONCURRENCY jobs at a time from the configured
+JOB_BACKEND (which must be shared with the API, i.e. not "local").
+"""
+import os
+from dotenv import load_dotenv
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.env'))
+import asyncio
+import multiprocessing
+import signal
+import socket
+import uuid
+from typing import Optional
+from app.services.analysis_flow import analyze_for_user
+from app.services.jobs import JOB_BACKEND, JobQueue, job_queue
+from app.services.users import CreditsExhaustedError, begin_job_analysis, ensure_credits
+from app.utils.logger import logger
+from app.utils.metrics import registry, request_scope
+
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", "2"))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+JOBS = registry.counter("analysis_jobs_total", "Finished job attempts by outcome", ["outcome"])
+
+class JobWorker:
+    """Claims jobs from the queue and runs the analysis flow for each one.
+
+    Jobs that can never succeed (no transcript, no credits left) fail right
+    away; anything else is retried with backoff until the job's attempts run
+    out. While a job runs its visibility lease is refreshed, so only a dead
+    worker lets the job be claimed again.
+    """
+
+    def __init__(self, queue: JobQueue = job_queue, concurrency: int = JOB_WORKER_CONCURRENCY, poll_seconds: float = JOB_POLL_SECONDS):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        stop = stop or asyncio.Event()
+        slots = asyncio.Semaphore(self.concurrency)
+        running = set()
+        logger.info(f"Job worker {self.id} started with concurrency {self.concurrency}")
+        while not stop.is_set():
+            await slots.acquire()
+            try:
+                job = await self.queue.claim(self.id)
+            except Exception as e:
+                logger.error(f"Job worker {self.id} failed to claim a job: {e}")
+                job = None
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(stop.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self.process(job))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+        # Let claimed jobs finish; unfinished ones reappear after the visibility timeout
+        await asyncio.gather(*running, return_exceptions=True)
+
+    async def process(self, job: dict) -> None:
+        logger.info(f"Running job {job['id']} for video {job['youtube_video_id']} (attempt {job['attempts']})")
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        # Its own scope so the job's LLM usage is what gets recorded in user_usage
+        with request_scope():
+            try:
+                context = await begin_job_analysis(job["user_id"], job["youtube_video_id"])
+                if context.analysis_ref is None:
+                    # Credits may have been spent elsewhere since the job was queued
+                    ensure_credits(context.user)
+                response = await analyze_for_user(context, job["youtube_video_id"])
+                await self.queue.complete(job["id"], self.id, response.model_dump(mode="json"))
+                JOBS.inc(outcome="succeeded")
+            except (LookupError, CreditsExhaustedError) as e:
+                logger.warning(f"Job {job['id']} failed permanently: {e}")
+                JOBS.inc(outcome="failed")
+                await self.queue.fail(job, self.id, str(e), retryable=False)
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {e}")
+                JOBS.inc(outcome="error")
+                await self.queue.fail(job, self.id, str(e))
+            finally:
+                heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.queue.visibility / 3)
+            try:
+                await self.queue.heartbeat(job_id, self.id)
+            except Exception as e:
+                logger.warning(f"Failed to refresh lease for job {job_id}: {e}")
+
+def run_worker_process() -> None:
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await JobWorker().run(stop)
+
+    asyncio.run(main())
+
+def main() -> None:
+    if JOB_BACKEND == "local":
+        logger.warning("JOB_BACKEND is 'local'; this pool cannot see jobs queued by the API process")
+    processes = [multiprocessing.Process(target=run_worker_process, name=f"job-worker-{i}") for i in range(JOB_WORKER_PROCESSES)]
+    for process in processes:
+        process.start()
+    # Children stop gracefully on SIGTERM; Ctrl-C already reaches the whole process group
+    signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes])
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()
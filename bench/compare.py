@@ -0,0 +1,66 @@
+"""Compare two bench.run result files, level by level.
+
+    python -m bench.compare bench/results/abc1234-....json bench/results/def5678-....json
+
+With `--fail-over PCT` it exits non-zero when throughput drops, or p99
+latency rises, by more than PCT percent at any level both runs measured.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Optional, Tuple
+
+def load(path: str) -> Tuple[dict, Dict[Tuple[str, int], dict]]:
+    with open(path) as f:
+        report = json.load(f)
+    return report["meta"], {(result["scenario"], result["concurrency"]): result for result in report["results"]}
+
+def change(base: float, head: float) -> Optional[float]:
+    return (head - base) / base * 100 if base else None
+
+def cell(base: float, head: float) -> str:
+    delta = change(base, head)
+    return f"{base:>9.1f} -> {head:<9.1f}" + (f"{delta:>+7.1f}%" if delta is not None else f"{'n/a':>8}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two bench.run result files.")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--fail-over", type=float, default=None, metavar="PCT", help="exit 1 on a regression larger than PCT percent")
+    args = parser.parse_args(argv)
+
+    base_meta, base = load(args.base)
+    head_meta, head = load(args.head)
+    print(f"base {base_meta['commit']}{' (dirty)' if base_meta['dirty'] else ''}  head {head_meta['commit']}{' (dirty)' if head_meta['dirty'] else ''}")
+    if base_meta["config"] != head_meta["config"]:
+        changed = sorted(key for key in base_meta["config"].keys() | head_meta["config"].keys() if base_meta["config"].get(key) != head_meta["config"].get(key))
+        print(f"warning: runs used different settings: {', '.join(changed)}")
+    print(f"{'scenario':<16}{'conc':>6}  {'throughput rps':<28}{'p50 ms':<28}{'p99 ms':<28}{'loop lag p99 ms':<28}")
+
+    regressions = []
+    for key in sorted(base.keys() & head.keys()):
+        b, h = base[key], head[key]
+        print(
+            f"{key[0]:<16}{key[1]:>6}  "
+            f"{cell(b['throughput_rps'], h['throughput_rps']):<28}"
+            f"{cell(b['latency_ms']['p50'], h['latency_ms']['p50']):<28}"
+            f"{cell(b['latency_ms']['p99'], h['latency_ms']['p99']):<28}"
+            f"{cell(b['loop_lag_ms']['p99'], h['loop_lag_ms']['p99']):<28}"
+        )
+        if args.fail_over is not None:
+            throughput = change(b["throughput_rps"], h["throughput_rps"])
+            p99 = change(b["latency_ms"]["p99"], h["latency_ms"]["p99"])
+            if throughput is not None and throughput < -args.fail_over:
+                regressions.append(f"{key[0]}@{key[1]}: throughput {throughput:+.1f}%")
+            if p99 is not None and p99 > args.fail_over:
+                regressions.append(f"{key[0]}@{key[1]}: p99 {p99:+.1f}%")
+    for key in sorted(base.keys() ^ head.keys()):
+        print(f"{key[0]:<16}{key[1]:>6}  only in {'base' if key in base else 'head'}")
+
+    if regressions:
+        print("\nRegressions over {:.0f}%:\n  ".format(args.fail_over) + "\n  ".join(regressions))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""A local OpenAI-compatible chat completions server for load tests.
+
+Answers every prompt the app sends with a canned but well-formed response,
+after a configurable delay, and rejects a configurable share of requests
+with a 429 and Retry-After so the gateway's backoff and limiters are
+exercised. Point the app at it with OPENAI_BASE_URL=http://host:port/v1.
+"""
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+@dataclass
+class FakeOpenAIConfig:
+    # Time to first token, then per generated token
+    latency: float = 0.8
+    jitter: float = 0.4
+    token_latency: float = 0.002
+    rate_limit_ratio: float = 0.0
+    retry_after: float = 1.0
+    stats: Dict[str, int] = field(default_factory=lambda: {"requests": 0, "rate_limited": 0, "streamed": 0})
+
+JSON_RESPONSE = {
+    "short_summary": "The speaker explains why the service spends most of its time waiting on the network. Caching and batching are presented as the main levers.",
+    "detailed_takeaways": [
+        "Most request time is spent waiting on external services.",
+        "Caching shared results avoids repeated work across users.",
+        "Batching reduces per-request overhead.",
+        "Tail latency matters more than the average under load.",
+        "Micro optimizations rarely move the needle for I/O bound services.",
+    ],
+    "hashtags": ["#performance", "#caching", "#latency", "#backend", "#scaling"],
+    "twitter_thread": [
+        "Most of a request's time is spent waiting on the network.",
+        "Cache shared results and batch what you can.",
+        "Watch the tail, not the average.",
+    ],
+}
+
+def completion_text(prompt: str, json_mode: bool) -> str:
+    if json_mode:
+        return json.dumps(JSON_RESPONSE)
+    if prompt.startswith("List 5 key takeaways"):
+        return "\n".join(f"{i}. {takeaway}" for i, takeaway in enumerate(JSON_RESPONSE["detailed_takeaways"], 1))
+    if prompt.startswith("Generate 5 relevant hashtags"):
+        return " ".join(JSON_RESPONSE["hashtags"])
+    if prompt.startswith("Write a 3-tweet"):
+        return "\n".join(JSON_RESPONSE["twitter_thread"])
+    return JSON_RESPONSE["short_summary"]
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def create_app(config: FakeOpenAIConfig) -> Starlette:
+    async def chat_completions(request: Request):
+        body = await request.json()
+        config.stats["requests"] += 1
+        if config.rate_limit_ratio and random.random() < config.rate_limit_ratio:
+            config.stats["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (injected)", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": str(config.retry_after)},
+            )
+        prompt = body["messages"][-1]["content"]
+        text = completion_text(prompt, (body.get("response_format") or {}).get("type") == "json_object")
+        usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(text)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        await asyncio.sleep(config.latency + random.uniform(0, config.jitter))
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.token_latency * usage["completion_tokens"])
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        config.stats["streamed"] += 1
+        async def events():
+            def chunk(delta: dict, finish_reason=None, usage=None) -> str:
+                data = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body["model"],
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+                    "usage": usage,
+                }
+                return f"data: {json.dumps(data)}\n\n"
+            yield chunk({"role": "assistant", "content": ""})
+            for word in text.split(" "):
+                await asyncio.sleep(config.token_latency)
+                yield chunk({"content": word + " "})
+            yield chunk({}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk({}, usage=usage)
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def stats(request: Request):
+        return JSONResponse(config.stats)
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/stats", stats),
+    ])
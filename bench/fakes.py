@@ -0,0 +1,333 @@
+"""In-process stand-ins for Supabase and YouTube used by the benchmarks.
+
+FakeSupabase implements the slice of the PostgREST query builder and the
+RPCs the app uses, against in-memory tables. Each `execute()` sleeps for the
+configured latency on the calling thread, which is the DB executor in the
+app, so round trips cost what they would against a remote database.
+Results go through a JSON round trip like real responses do.
+
+The YouTube fakes replace the two network calls at the bottom of the stack
+(youtube-transcript-api and yt-dlp's `extract_info`), so everything above
+them, including the executors and the source cache, runs as in production.
+"""
+import datetime
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+TABLE_DEFAULTS = {
+    "users": lambda now: {"tier": "free", "credits_remaining": 5, "credits_last_reset": now},
+    "shared_analysis": lambda now: {"transcript_lines": None, "content_hash": None},
+}
+
+class FakeResponse:
+    def __init__(self, data, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+class FakeAPIError(Exception):
+    pass
+
+def _api_error(message: str) -> Exception:
+    try:
+        from postgrest.exceptions import APIError
+    except ImportError:
+        return FakeAPIError(message)
+    return APIError({"message": message, "code": "P0001", "hint": None, "details": None})
+
+def _copy(data):
+    return json.loads(json.dumps(data, default=str))
+
+class FakeQuery:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.payload = None
+        self.filters: List[Callable[[dict], bool]] = []
+        self.options: dict = {}
+        self._limit: Optional[int] = None
+        self._order: Optional[tuple] = None
+
+    def select(self, *columns, **kwargs):
+        # Columns are ignored; callers only read the keys they asked for
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict: str = "", ignore_duplicates: bool = False, **kwargs):
+        self.op, self.payload = "upsert", payload
+        self.options = {"on_conflict": [key for key in on_conflict.split(",") if key], "ignore_duplicates": ignore_duplicates}
+        return self
+
+    def update(self, payload, **kwargs):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self, **kwargs):
+        self.op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] < value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] <= value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def order(self, column, desc: bool = False, **kwargs):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def single(self):
+        return self
+
+    def execute(self) -> FakeResponse:
+        self.db.round_trip(f"{self.table}.{self.op}")
+        with self.db.lock:
+            return FakeResponse(_copy(getattr(self, f"_{self.op}")()))
+
+    def _rows(self) -> List[dict]:
+        return self.db.tables.setdefault(self.table, [])
+
+    def _matching(self) -> List[dict]:
+        return [row for row in self._rows() if all(match(row) for match in self.filters)]
+
+    def _select(self) -> List[dict]:
+        rows = self._matching()
+        if self._order:
+            column, desc = self._order
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        return rows[:self._limit] if self._limit is not None else rows
+
+    def _insert(self) -> List[dict]:
+        payloads = self.payload if isinstance(self.payload, list) else [self.payload]
+        rows = [self.db.new_row(self.table, payload) for payload in payloads]
+        self._rows().extend(rows)
+        return rows
+
+    def _upsert(self) -> List[dict]:
+        payloads = self.payload if isinstance(self.payload, list) else [self.payload]
+        keys = self.options["on_conflict"] or ["id"]
+        index = {tuple(row.get(key) for key in keys): row for row in self._rows()}
+        result = []
+        for payload in payloads:
+            existing = index.get(tuple(payload.get(key) for key in keys))
+            if existing is not None:
+                if not self.options["ignore_duplicates"]:
+                    existing.update(payload)
+                    result.append(existing)
+                continue
+            row = self.db.new_row(self.table, payload)
+            self._rows().append(row)
+            index[tuple(row.get(key) for key in keys)] = row
+            result.append(row)
+        return result
+
+    def _update(self) -> List[dict]:
+        rows = self._matching()
+        for row in rows:
+            row.update(self.payload)
+        return rows
+
+    def _delete(self) -> List[dict]:
+        rows = self._matching()
+        self.db.tables[self.table] = [row for row in self._rows() if row not in rows]
+        return rows
+
+class FakeRPC:
+    def __init__(self, db: "FakeSupabase", name: str, params: dict):
+        self.db = db
+        self.name = name
+        self.params = params
+
+    def execute(self) -> FakeResponse:
+        self.db.round_trip(f"rpc.{self.name}")
+        with self.db.lock:
+            return FakeResponse(_copy(getattr(self.db, f"_rpc_{self.name}")(self.params)))
+
+class FakeSupabase:
+    """In-memory Supabase client. `tier` is given to users it creates."""
+
+    def __init__(self, latency: float = 0.002, jitter: float = 0.0, tier: str = "pro", credits: int = 1_000_000):
+        self.latency = latency
+        self.jitter = jitter
+        self.tier = tier
+        self.credits = credits
+        self.tables: Dict[str, List[dict]] = {}
+        self.calls: Dict[str, int] = {}
+        self.lock = threading.RLock()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Optional[dict] = None) -> FakeRPC:
+        return FakeRPC(self, name, params or {})
+
+    def round_trip(self, call: str) -> None:
+        with self.lock:
+            self.calls[call] = self.calls.get(call, 0) + 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def new_row(self, table: str, payload: dict) -> dict:
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        row = {"id": str(uuid.uuid4()), "created_at": now}
+        if table in TABLE_DEFAULTS:
+            row.update(TABLE_DEFAULTS[table](now))
+        if table == "users":
+            row.update(tier=self.tier, credits_remaining=self.credits)
+        row.update(payload)
+        return row
+
+    def _find(self, table: str, **values) -> Optional[dict]:
+        for row in self.tables.get(table, []):
+            if all(row.get(key) == value for key, value in values.items()):
+                return row
+        return None
+
+    def _rpc_begin_analysis(self, params: dict) -> dict:
+        user = self._find("users", clerk_id=params["p_clerk_id"])
+        if user is None:
+            user = self.new_row("users", {"clerk_id": params["p_clerk_id"], "email": params.get("p_email")})
+            self.tables.setdefault("users", []).append(user)
+        video = self._find("videos", youtube_video_id=params.get("p_youtube_video_id")) if params.get("p_youtube_video_id") else None
+        analysis = self._find("video_analysis", video_id=video["id"], user_id=user["id"]) if video else None
+        return {"user": user, "video": video, "analysis": analysis}
+
+    def _rpc_begin_job_analysis(self, params: dict) -> Optional[dict]:
+        user = self._find("users", id=params["p_user_id"])
+        if user is None:
+            return None
+        return self._rpc_begin_analysis({"p_clerk_id": user["clerk_id"], "p_youtube_video_id": params["p_youtube_video_id"]})
+
+    def _rpc_record_analysis(self, params: dict) -> dict:
+        video = self._find("videos", youtube_video_id=params["p_youtube_video_id"])
+        if video is None:
+            if params.get("p_video") is None:
+                raise _api_error("video_not_found")
+            video = self.new_row("videos", params["p_video"])
+            self.tables.setdefault("videos", []).append(video)
+        analysis = self._find("video_analysis", video_id=video["id"], user_id=params["p_user_id"])
+        charged, credits = analysis is None, None
+        if analysis is not None:
+            analysis["shared_analysis_id"] = params["p_shared_analysis_id"]
+        else:
+            user = self._find("users", id=params["p_user_id"])
+            if user["tier"] == "free" and user["credits_remaining"] <= 0:
+                raise _api_error("credits_exhausted")
+            analysis = self.new_row("video_analysis", {"video_id": video["id"], "user_id": user["id"], "shared_analysis_id": params["p_shared_analysis_id"]})
+            self.tables.setdefault("video_analysis", []).append(analysis)
+            user["credits_remaining"] -= 1
+            credits = user["credits_remaining"]
+            self.tables.setdefault("user_usage", []).append(self.new_row("user_usage", {
+                "user_id": user["id"], "analysis_id": analysis["id"], "tokens_used": params.get("p_tokens_used"), "cost": params.get("p_cost"),
+            }))
+        return {
+            "analysis": {"id": analysis["id"], "video_id": video["id"], "shared_analysis_id": params["p_shared_analysis_id"]},
+            "video": video,
+            "charged": charged,
+            "credits_remaining": credits,
+        }
+
+    def _rpc_record_batch_analyses(self, params: dict) -> dict:
+        user = self._find("users", id=params["p_user_id"])
+        new_items = sum(1 for item in params["p_items"] if self._find("video_analysis", video_id=item["video_id"], user_id=params["p_user_id"]) is None)
+        if user["tier"] == "free" and user["credits_remaining"] < new_items:
+            raise _api_error("credits_exhausted")
+        analyses, charged = [], 0
+        for item in params["p_items"]:
+            analysis = self._find("video_analysis", video_id=item["video_id"], user_id=params["p_user_id"])
+            if analysis is None:
+                analysis = self.new_row("video_analysis", {"video_id": item["video_id"], "user_id": params["p_user_id"], "shared_analysis_id": item["shared_analysis_id"]})
+                self.tables.setdefault("video_analysis", []).append(analysis)
+                self.tables.setdefault("user_usage", []).append(self.new_row("user_usage", {
+                    "user_id": params["p_user_id"], "analysis_id": analysis["id"], "tokens_used": item.get("tokens_used"), "cost": item.get("cost"),
+                }))
+                charged += 1
+            else:
+                analysis["shared_analysis_id"] = item["shared_analysis_id"]
+            analyses.append({"id": analysis["id"], "video_id": item["video_id"]})
+        user["credits_remaining"] -= charged
+        return {"analyses": analyses, "charged": charged, "credits_remaining": user["credits_remaining"]}
+
+WORDS = (
+    "so today we are going to look at how the system handles requests under load and what that means for latency "
+    "the first thing to notice is that most of the time goes into waiting on the network rather than computing "
+    "anything locally which is why caching and batching matter more than micro optimizations in this kind of service"
+).split()
+
+def synthetic_transcript(video_id: str, lines: int) -> List[dict]:
+    """Deterministic per video, so repeated runs produce identical analyses."""
+    rng = random.Random(hashlib.sha256(video_id.encode()).digest())
+    transcript, start = [], 0.0
+    for _ in range(lines):
+        transcript.append({"start": round(start, 2), "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14)))})
+        start += rng.uniform(1.5, 5.0)
+    return transcript
+
+def synthetic_info(video_id: str, comments: int = 20) -> dict:
+    rng = random.Random(video_id)
+    return {
+        "id": video_id,
+        "title": f"Benchmark video {video_id}",
+        "uploader": "Benchmark Channel",
+        "uploader_url": "https://www.youtube.com/@benchmark",
+        "thumbnail": f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg",
+        "duration": rng.randint(120, 3600),
+        "upload_date": "20240101",
+        "comments": [
+            {"text": " ".join(rng.choice(WORDS) for _ in range(12)), "author": f"@viewer{i}", "like_count": rng.randint(0, 5000), "timestamp": 1704067200 + i}
+            for i in range(comments)
+        ],
+    }
+
+def install_fake_youtube(transcript_latency: float = 0.3, ytdlp_latency: float = 1.0, transcript_lines: int = 400) -> None:
+    """Patch youtube-transcript-api and yt-dlp so no request leaves the process."""
+    import yt_dlp
+    from youtube_transcript_api._api import YouTubeTranscriptApi
+    from app.utils.youtube import extract_video_id
+
+    def get_transcript(video_id, *args, **kwargs):
+        time.sleep(transcript_latency)
+        return synthetic_transcript(video_id, transcript_lines)
+
+    def extract_info(self, url, *args, **kwargs):
+        time.sleep(ytdlp_latency)
+        return synthetic_info(extract_video_id(url) or url)
+
+    YouTubeTranscriptApi.get_transcript = staticmethod(get_transcript)
+    yt_dlp.YoutubeDL.extract_info = extract_info
@@ -0,0 +1,130 @@
+"""Cold-start profile: how long `import app.main` and the first /health take.
+
+Each repeat runs in a fresh interpreter under `python -X importtime`, with
+dummy credentials so nothing is contacted. Reports the median import and
+first-request times, import time per top-level package, the slowest
+modules, and which heavy dependencies a /health cold start loaded.
+
+    python -m bench.importtime --repeat 5
+    python -m bench.importtime --max-ms 400   # exit 1 above 400 ms, for CI
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List
+from bench.run import ROOT, git_revision
+
+HEAVY_MODULES = ("openai", "yt_dlp", "supabase", "postgrest", "jose", "razorpay", "httpx", "youtube_transcript_api", "tiktoken")
+
+# Runs in the child: import the app, then serve one /health without a server
+PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+async def health():
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": "/health", "raw_path": b"/health", "root_path": "", "query_string": b"", "headers": [],
+             "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80)}
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    await app.main.app(scope, receive, send)
+    return sent[0]["status"]
+
+status = asyncio.run(health())
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_health_ms": (served - started) * 1000,
+    "status": status,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+def parse_importtime(stderr: str) -> List[tuple]:
+    """(self_us, cumulative_us, module) for each `-X importtime` line."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+def probe(env: Dict[str, str]) -> tuple:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Probe failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Profile the API's cold start.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="modules and packages to list")
+    parser.add_argument("--max-ms", type=float, default=None, help="exit 1 when the median import takes longer")
+    parser.add_argument("--out", default=os.path.join(ROOT, "bench", "results"), help="results directory, or - to skip writing")
+    args = parser.parse_args(argv)
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "SUPABASE_URL": "http://127.0.0.1:9",
+        "SUPABASE_SERVICE_KEY": "bench",
+        "OPENAI_API_KEY": "bench",
+        "RAZORPAY_KEY_ID": "bench",
+        "RAZORPAY_KEY_SECRET": "bench",
+    }
+    # The first run also writes any missing bytecode; don't count it
+    probe(env)
+    runs = [probe(env) for _ in range(args.repeat)]
+
+    import_ms = statistics.median(run["import_ms"] for run, _ in runs)
+    first_health_ms = statistics.median(run["first_health_ms"] for run, _ in runs)
+    rows = runs[len(runs) // 2][1]
+    packages: Dict[str, int] = defaultdict(int)
+    for self_us, _, name in rows:
+        packages[name.split(".")[0]] += self_us
+    slowest = sorted(rows, reverse=True)[:args.top]
+
+    print(f"import app.main     {import_ms:8.1f} ms (median of {args.repeat})")
+    print(f"first GET /health   {first_health_ms:8.1f} ms")
+    print(f"heavy modules loaded: {', '.join(runs[0][0]['loaded']) or 'none'}")
+    print("\nself time by package:")
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<32}{self_us / 1000:8.1f} ms")
+    print("\nslowest modules (self):")
+    for self_us, cumulative_us, name in slowest:
+        print(f"  {name:<48}{self_us / 1000:8.1f} ms  (cumulative {cumulative_us / 1000:.1f} ms)")
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {"commit": commit, "dirty": dirty, "started_at": datetime.now(timezone.utc).isoformat(), "python": sys.version.split()[0], "repeat": args.repeat},
+        "import_ms": round(import_ms, 1),
+        "first_health_ms": round(first_health_ms, 1),
+        "loaded": runs[0][0]["loaded"],
+        "packages_ms": {name: round(self_us / 1000, 2) for name, self_us in sorted(packages.items(), key=lambda item: -item[1])},
+        "slowest_ms": [{"module": name, "self": round(self_us / 1000, 2), "cumulative": round(cumulative_us / 1000, 2)} for self_us, cumulative_us, name in slowest],
+    }
+    if args.out != "-":
+        os.makedirs(args.out, exist_ok=True)
+        path = os.path.join(args.out, f"importtime-{commit}{'-dirty' if dirty else ''}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {path}")
+
+    if args.max_ms is not None and import_ms > args.max_ms:
+        print(f"\nimport app.main took {import_ms:.1f} ms, over the {args.max_ms:.0f} ms budget")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
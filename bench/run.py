@@ -0,0 +1,369 @@
+"""Offline load test for the API.
+
+Starts a fake OpenAI-compatible server and the app (with in-memory Supabase
+and YouTube fakes, see bench.server) as separate processes, then drives each
+scenario with a closed loop of `concurrency` clients for `--duration`
+seconds per level:
+
+    analyze_cold     POST /analyze for a video nobody has analyzed
+    analyze_shared   POST /analyze by a new user for an already analyzed video
+    analyze_owned    POST /analyze for a video the user already has
+    analysis_304     GET /videos/{id}/analysis revalidated with If-None-Match
+    search_video     GET /videos/{id}/search for a word in the transcript
+    user_info        GET /user_info
+
+Reports throughput, latency percentiles, event-loop lag in the app process,
+mean time per pipeline stage and DB round trips per request, and writes
+them as JSON to bench/results/ for bench.compare.
+
+    python -m bench.run --scenarios analyze_shared,user_info --concurrency 1,16,64
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import httpx
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from bench.fakes import WORDS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ISSUER = "https://clerk.bench.local/"
+SCENARIOS = ("analyze_cold", "analyze_shared", "analyze_owned", "analysis_304", "search_video", "user_info")
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "mean": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        **{name: round(percentile(ordered, q), 3) for name, q in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99))},
+        "max": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def git_revision() -> Tuple[str, bool]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+class Signer:
+    """Issues Clerk-style RS256 tokens the app verifies with the matching public key.
+
+    Signs with `cryptography` directly: python-jose's pure-Python RSA backend
+    takes tens of milliseconds per token, which would stall the load loop.
+    """
+
+    kid = "bench-1"
+
+    def __init__(self):
+        self.key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.public_pem = self.key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+        self.tokens: Dict[str, str] = {}
+
+    def token(self, user: str) -> str:
+        token = self.tokens.get(user)
+        if token is None:
+            now = int(time.time())
+            claims = {"sub": user, "email": f"{user}@bench.local", "iss": ISSUER, "iat": now, "exp": now + 3600}
+            signing_input = b64url(json.dumps({"alg": "RS256", "typ": "JWT", "kid": self.kid}).encode()) + "." + b64url(json.dumps(claims).encode())
+            signature = self.key.sign(signing_input.encode(), padding.PKCS1v15(), hashes.SHA256())
+            token = self.tokens[user] = f"{signing_input}.{b64url(signature)}"
+        return token
+
+    def jwks(self) -> dict:
+        numbers = self.key.public_key().public_numbers()
+        def encode(value: int) -> str:
+            return b64url(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+        return {"keys": [{"kty": "RSA", "use": "sig", "alg": "RS256", "kid": self.kid, "n": encode(numbers.n), "e": encode(numbers.e)}]}
+
+    def headers(self, user: str, **extra: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token(user)}", **extra}
+
+def video_id(prefix: str, n: int) -> str:
+    return f"{prefix}{n:0{11 - len(prefix)}d}"
+
+def video_url(youtube_video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={youtube_video_id}"
+
+class Workload:
+    """Builds the requests for every scenario and the state they share."""
+
+    def __init__(self, signer: Signer, hot_videos: int, users: int, new_user_tokens: int = 5000):
+        self.signer = signer
+        self.new_user_tokens = new_user_tokens
+        self.hot = [video_id("hot", n) for n in range(hot_videos)]
+        self.users = [f"bench_user_{n}" for n in range(users)]
+        self.cold = 0
+        self.new_users = 0
+        self.etags: Dict[Tuple[str, str], str] = {}
+        self.prepared = False
+
+    async def prepare(self, client: httpx.AsyncClient, concurrency: int) -> None:
+        """Analyze the hot videos, and have every pool user own each of them."""
+        if self.prepared:
+            return
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(method: str, path: str, user: str, **kwargs) -> httpx.Response:
+            async with semaphore:
+                response = await client.request(method, path, headers=self.signer.headers(user), **kwargs)
+                response.raise_for_status()
+                return response
+
+        await asyncio.gather(*(call("POST", "/analyze", self.users[0], json={"youtube_url": video_url(video)}) for video in self.hot))
+        pairs = [(user, video) for user in self.users for video in self.hot]
+        await asyncio.gather(*(call("POST", "/analyze", user, json={"youtube_url": video_url(video)}) for user, video in pairs))
+        responses = await asyncio.gather(*(call("GET", f"/videos/{video}/analysis", user) for user, video in pairs))
+        self.etags = {pair: response.headers["etag"] for pair, response in zip(pairs, responses)}
+        # Tokens for analyze_shared's new users, so signing stays out of the timed loop
+        for n in range(1, self.new_user_tokens + 1):
+            self.signer.token(f"bench_new_{n}")
+        self.prepared = True
+
+    def request(self, scenario: str) -> Tuple[str, str, dict]:
+        if scenario == "analyze_cold":
+            self.cold += 1
+            return "POST", "/analyze", {"json": {"youtube_url": video_url(video_id("cold", self.cold))}, "headers": self.signer.headers(random.choice(self.users))}
+        if scenario == "analyze_shared":
+            self.new_users += 1
+            user = f"bench_new_{self.new_users}"
+            return "POST", "/analyze", {"json": {"youtube_url": video_url(random.choice(self.hot))}, "headers": self.signer.headers(user)}
+        if scenario == "analyze_owned":
+            return "POST", "/analyze", {"json": {"youtube_url": video_url(random.choice(self.hot))}, "headers": self.signer.headers(random.choice(self.users))}
+        if scenario == "analysis_304":
+            user, video = random.choice(list(self.etags))
+            return "GET", f"/videos/{video}/analysis", {"headers": self.signer.headers(user, **{"If-None-Match": self.etags[(user, video)]})}
+        if scenario == "search_video":
+            return "GET", f"/videos/{random.choice(self.hot)}/search", {"params": {"q": random.choice(WORDS)}, "headers": self.signer.headers(random.choice(self.users))}
+        if scenario == "user_info":
+            return "GET", "/user_info", {"headers": self.signer.headers(random.choice(self.users))}
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+async def drive(client: httpx.AsyncClient, workload: Workload, scenario: str, concurrency: int, duration: float) -> Tuple[List[float], Dict[str, int], float]:
+    """Closed loop: each client sends its next request as soon as the last one finishes."""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def client_loop() -> None:
+        while time.perf_counter() < deadline:
+            # Built (and its token signed) before the clock starts
+            method, path, kwargs = workload.request(scenario)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+def stage_means(before: dict, after: dict) -> Dict[str, dict]:
+    stages = {}
+    for stage, (total, count) in after.items():
+        base_total, base_count = before.get(stage, (0.0, 0))
+        if count > base_count:
+            stages[stage] = {"count": count - base_count, "mean_ms": round((total - base_total) / (count - base_count) * 1000, 3)}
+    return stages
+
+async def run_level(client: httpx.AsyncClient, openai: httpx.AsyncClient, workload: Workload, scenario: str, concurrency: int, duration: float, warmup: float) -> dict:
+    if warmup > 0:
+        await drive(client, workload, scenario, concurrency, warmup)
+    before = (await client.get("/__bench/stats")).json()
+    llm_before = (await openai.get("/stats")).json()
+    latencies, statuses, elapsed = await drive(client, workload, scenario, concurrency, duration)
+    after = (await client.get("/__bench/stats")).json()
+    llm_after = (await openai.get("/stats")).json()
+
+    requests = len(latencies)
+    ok = sum(count for status, count in statuses.items() if status in ("200", "202", "304"))
+    db_calls = sum(after["db_calls"].values()) - sum(before["db_calls"].values())
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "requests": requests,
+        "errors": requests - ok,
+        "status": statuses,
+        "throughput_rps": round(ok / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": summarize([latency * 1000 for latency in latencies]),
+        "loop_lag_ms": summarize([lag * 1000 for lag in after["loop_lag"]]),
+        "stages": stage_means(before["stages"], after["stages"]),
+        "db_calls_per_request": round(db_calls / requests, 3) if requests else 0.0,
+        "llm_requests": llm_after["requests"] - llm_before["requests"],
+        "llm_rate_limited": llm_after["rate_limited"] - llm_before["rate_limited"],
+    }
+
+def start_server(role: str, port: int, env: Dict[str, str], log_dir: str) -> subprocess.Popen:
+    # App logs go to a file: they are part of the cost, but not of the report
+    log = open(os.path.join(log_dir, f"{role}.log"), "w")
+    return subprocess.Popen([sys.executable, "-m", "bench.server", role, "--port", str(port)], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server for {url} exited with code {process.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server for {url} did not start within {timeout}s")
+
+def print_table(results: List[dict]) -> None:
+    print(f"{'scenario':<16}{'conc':>6}{'reqs':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'lag p99':>10}{'db/req':>8}")
+    for r in results:
+        print(
+            f"{r['scenario']:<16}{r['concurrency']:>6}{r['requests']:>8}{r['errors']:>6}{r['throughput_rps']:>10.1f}"
+            f"{r['latency_ms']['p50']:>10.1f}{r['latency_ms']['p99']:>10.1f}{r['loop_lag_ms']['p99']:>10.1f}{r['db_calls_per_request']:>8.2f}"
+        )
+
+async def main(args: argparse.Namespace) -> Optional[str]:
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    signer = Signer()
+    app_port, openai_port = free_port(), free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        # Never reach the real services, whatever the shell has set
+        "SUPABASE_URL": "http://127.0.0.1:9",
+        "SUPABASE_SERVICE_KEY": "bench",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "CLERK_JWT_ISSUER": ISSUER,
+        "RAZORPAY_KEY_ID": os.getenv("RAZORPAY_KEY_ID", "bench"),
+        "RAZORPAY_KEY_SECRET": os.getenv("RAZORPAY_KEY_SECRET", "bench"),
+        "JOB_BACKEND": "local",
+        # Measure the app rather than its limiter, unless the shell asks for one
+        "ADMISSION_USER_LIMITS": os.getenv("ADMISSION_USER_LIMITS", ""),
+        "ADMISSION_TIER_LIMITS": os.getenv("ADMISSION_TIER_LIMITS", ""),
+        "ADMISSION_MAX_CONCURRENT": os.getenv("ADMISSION_MAX_CONCURRENT", "0"),
+        "SOURCE_CACHE_DIR": tempfile.mkdtemp(prefix="bench-source-cache-"),
+        "BENCH_LLM_LATENCY": str(args.llm_latency),
+        "BENCH_LLM_JITTER": str(args.llm_jitter),
+        "BENCH_LLM_429_RATIO": str(args.llm_429),
+        "BENCH_LLM_RETRY_AFTER": str(args.llm_retry_after),
+        "BENCH_DB_LATENCY": str(args.db_latency),
+        "BENCH_TRANSCRIPT_LATENCY": str(args.transcript_latency),
+        "BENCH_YTDLP_LATENCY": str(args.ytdlp_latency),
+        "BENCH_TRANSCRIPT_LINES": str(args.transcript_lines),
+    }
+    env.pop("CLERK_JWKS_URL", None)
+    env.pop("CLERK_JWT_PUBLIC_KEY", None)
+    if args.auth == "jwks":
+        # Served by the fake OpenAI process
+        env["CLERK_JWKS_URL"] = f"http://127.0.0.1:{openai_port}/.well-known/jwks.json"
+        env["BENCH_JWKS"] = json.dumps(signer.jwks())
+    else:
+        env["CLERK_JWT_PUBLIC_KEY"] = signer.public_pem
+    log_dir = tempfile.mkdtemp(prefix="bench-logs-")
+    print(f"Server logs in {log_dir}")
+    processes = [start_server("openai", openai_port, env, log_dir)]
+    try:
+        # The app fetches the JWKS on startup
+        await wait_ready(f"http://127.0.0.1:{openai_port}/stats", processes[0])
+        processes.append(start_server("app", app_port, env, log_dir))
+        await wait_ready(f"http://127.0.0.1:{app_port}/health", processes[1])
+
+        limits = httpx.Limits(max_connections=max(levels) + 8, max_keepalive_connections=max(levels) + 8)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", timeout=args.timeout, limits=limits) as client, \
+                httpx.AsyncClient(base_url=f"http://127.0.0.1:{openai_port}") as openai:
+            workload = Workload(signer, args.hot_videos, args.users)
+            results = []
+            for scenario in scenarios:
+                if scenario != "analyze_cold":
+                    await workload.prepare(client, max(levels))
+                for concurrency in levels:
+                    result = await run_level(client, openai, workload, scenario, concurrency, args.duration, args.warmup)
+                    results.append(result)
+                    print_table([result])
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "label": args.label,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items() if key != "out"},
+        },
+        "results": results,
+    }
+    print()
+    print_table(results)
+    if args.out == "-":
+        return None
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{commit}{'-dirty' if dirty else ''}-{datetime.now().strftime('%Y%m%d-%H%M%S')}{'-' + args.label if args.label else ''}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {path}")
+    return path
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline load test for the API against local fakes.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unrecorded seconds before each level")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request client timeout")
+    parser.add_argument("--hot-videos", type=int, default=20, help="videos analyzed up front for the cached scenarios")
+    parser.add_argument("--users", type=int, default=10, help="users that own every hot video")
+    parser.add_argument("--auth", choices=["pem", "jwks"], default="pem", help="give the app a static public key or a JWKS URL")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="fake OpenAI time to first token")
+    parser.add_argument("--llm-jitter", type=float, default=0.4, help="uniform extra LLM latency, up to this")
+    parser.add_argument("--llm-429", type=float, default=0.0, help="share of LLM requests rejected with 429")
+    parser.add_argument("--llm-retry-after", type=float, default=1.0, help="Retry-After sent with injected 429s")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="seconds per Supabase round trip")
+    parser.add_argument("--transcript-latency", type=float, default=0.3, help="seconds per transcript fetch")
+    parser.add_argument("--ytdlp-latency", type=float, default=1.0, help="seconds per yt-dlp extraction")
+    parser.add_argument("--transcript-lines", type=int, default=400)
+    parser.add_argument("--label", default="", help="appended to the result file name")
+    parser.add_argument("--out", default=os.path.join(ROOT, "bench", "results"), help="results directory, or - to skip writing")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,100 @@
+"""Server processes started by bench.run, one per role:
+
+    python -m bench.server openai --port 9101
+    python -m bench.server app --port 9100
+
+Both are configured through BENCH_* environment variables. The app process
+swaps in the Supabase and YouTube fakes before importing the app, and adds
+an event-loop lag monitor plus a `/__bench/stats` route for the load
+generator to read between runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List
+
+def env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+class LoopLagMonitor:
+    """Samples how late a fixed-interval sleep wakes up on the event loop."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def drain(self) -> List[float]:
+        samples, self.samples = self.samples, []
+        return samples
+
+def serve_openai(host: str, port: int) -> None:
+    import uvicorn
+    from bench.fake_openai import FakeOpenAIConfig, create_app
+
+    config = FakeOpenAIConfig(
+        latency=env_float("BENCH_LLM_LATENCY", 0.8),
+        jitter=env_float("BENCH_LLM_JITTER", 0.4),
+        token_latency=env_float("BENCH_LLM_TOKEN_LATENCY", 0.002),
+        rate_limit_ratio=env_float("BENCH_LLM_429_RATIO", 0.0),
+        retry_after=env_float("BENCH_LLM_RETRY_AFTER", 1.0),
+    )
+    application = create_app(config)
+    if os.getenv("BENCH_JWKS"):
+        # Stands in for Clerk's key set when the app runs with CLERK_JWKS_URL
+        from starlette.responses import JSONResponse
+        jwks = json.loads(os.environ["BENCH_JWKS"])
+        application.add_route("/.well-known/jwks.json", lambda request: JSONResponse(jwks))
+    uvicorn.run(application, host=host, port=port, log_level="warning")
+
+def serve_app(host: str, port: int) -> None:
+    import uvicorn
+    from bench.fakes import FakeSupabase, install_fake_youtube
+
+    fake = FakeSupabase(latency=env_float("BENCH_DB_LATENCY", 0.002), jitter=env_float("BENCH_DB_JITTER", 0.0))
+    # Before anything does `from app.services.supabase_client import supabase`
+    import app.services.supabase_client as supabase_client
+    supabase_client.supabase = fake
+    install_fake_youtube(
+        transcript_latency=env_float("BENCH_TRANSCRIPT_LATENCY", 0.3),
+        ytdlp_latency=env_float("BENCH_YTDLP_LATENCY", 1.0),
+        transcript_lines=int(os.getenv("BENCH_TRANSCRIPT_LINES", "400")),
+    )
+
+    from app.main import app as application
+    from app.utils.metrics import STAGE_SECONDS
+
+    monitor = LoopLagMonitor(interval=env_float("BENCH_LAG_INTERVAL", 0.01))
+    application.router.on_startup.append(monitor.start)
+
+    def bench_stats():
+        with STAGE_SECONDS._lock:
+            stages = {key[0]: [series.sum, series.count] for key, series in STAGE_SECONDS._series.items()}
+        with fake.lock:
+            db_calls = dict(fake.calls)
+        return {"loop_lag": monitor.drain(), "stages": stages, "db_calls": db_calls}
+
+    application.add_api_route("/__bench/stats", bench_stats, methods=["GET"], include_in_schema=False)
+    uvicorn.run(application, host=host, port=port, log_level="warning")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("role", choices=["app", "openai"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    args = parser.parse_args()
+    (serve_app if args.role == "app" else serve_openai)(args.host, args.port)
+
+if __name__ == "__main__":
+    main()
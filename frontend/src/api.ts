@@ -3,6 +3,21 @@ export interface TranscriptLine {
   text: string;
 }
 
+export interface TranscriptHandle {
+  youtube_video_id: string;
+  total_lines: number;
+  next_offset?: number | null;
+}
+
+export interface TranscriptPage {
+  youtube_video_id: string;
+  total_lines: number;
+  duration_seconds?: number | null;
+  offset: number;
+  lines: TranscriptLine[];
+  next_offset?: number | null;
+}
+
 export interface Comment {
   text: string;
   author: string;
@@ -16,7 +31,8 @@ export interface AnalyzeResponse {
   key_takeaways: string[];
   hashtags: string[];
   twitter_thread: string[];
-  transcript: TranscriptLine[];
+  transcript: TranscriptLine[]; // First page only
+  transcript_handle?: TranscriptHandle | null;
   title?: string;
   channel_name?: string;
   thumbnail_url?: string;
@@ -49,6 +65,24 @@ export async function analyzeVideo(url: string, token: string): Promise<AnalyzeR
   return response.json();
 }
 
+export async function fetchTranscriptPage(videoId: string, offset: number, token: string, limit?: number): Promise<TranscriptPage> {
+  const params = new URLSearchParams({ offset: String(offset) });
+  if (limit) params.set('limit', String(limit));
+  const response = await fetch(`${BACKEND_URL}/videos/${videoId}/transcript?${params}`, {
+    method: 'GET',
+    headers: {
+      'Authorization': `Bearer ${token}`,
+    },
+  });
+
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || 'Failed to fetch transcript');
+  }
+
+  return response.json();
+}
+
 export async function submitFeedback(analysis_id: string, rating: number, comment: string, token: string): Promise<any> {
     const response = await fetch(`${BACKEND_URL}/feedback`, {
         method: 'POST',
@@ -9,7 +9,7 @@ import TwitterIcon from '@mui/icons-material/Twitter';
 import LightbulbIcon from '@mui/icons-material/Lightbulb';
 import SummarizeIcon from '@mui/icons-material/Summarize';
 import TagIcon from '@mui/icons-material/Tag';
-import { analyzeVideo, submitFeedback, fetchUserInfo, upgradeToPro, createRazorpayOrder, AnalyzeResponse, UserInfoResponse } from "../api";
+import { analyzeVideo, submitFeedback, fetchUserInfo, fetchTranscriptPage, upgradeToPro, createRazorpayOrder, AnalyzeResponse, UserInfoResponse } from "../api";
 import UserInfo from "../components/UserInfo";
 import { useUser, SignInButton, SignOutButton, useAuth } from '@clerk/nextjs';
 import { useRouter, useSearchParams } from 'next/navigation';
@@ -140,6 +140,42 @@ export default function HomePage() {
     }
   };
 
+  const loadMoreTranscript = async () => {
+    const handle = result?.transcript_handle;
+    if (!result || !handle || handle.next_offset == null) return;
+    try {
+      const token = await getToken();
+      if (!token) throw new Error('Authentication failed');
+      const page = await fetchTranscriptPage(handle.youtube_video_id, handle.next_offset, token);
+      setResult({
+        ...result,
+        transcript: [...result.transcript, ...page.lines],
+        transcript_handle: { ...handle, next_offset: page.next_offset },
+      });
+    } catch (err: any) {
+      setError(err.message || 'Failed to load transcript');
+    }
+  };
+
+  const copyTranscript = async () => {
+    if (!result) return;
+    let lines = result.transcript;
+    const handle = result.transcript_handle;
+    try {
+      let offset = handle?.next_offset;
+      while (handle && offset != null) {
+        const token = await getToken();
+        if (!token) throw new Error('Authentication failed');
+        const page = await fetchTranscriptPage(handle.youtube_video_id, offset, token, 1000);
+        lines = [...lines, ...page.lines];
+        offset = page.next_offset;
+      }
+      navigator.clipboard.writeText(lines.map(t => t.text).join(' '));
+    } catch (err: any) {
+      setError(err.message || 'Failed to copy transcript');
+    }
+  };
+
   const handleFeedbackSubmit = async (analysisId: string, rating: number, comment: string) => {
     try {
         const token = await getToken();
@@ -422,7 +458,7 @@ export default function HomePage() {
                   <CardContent>
                     <Stack direction="row" alignItems="center" spacing={1} justifyContent="space-between" mb={1}>
                       <Typography variant="h6" fontWeight={600} color="#8e24aa">Full Transcript</Typography>
-                      <Button size="small" variant="outlined" onClick={() => {navigator.clipboard.writeText(result.transcript.map(t => t.text).join(' '))}} sx={{ color: '#8e24aa', borderColor: '#8e24aa' }}>Copy Transcript</Button>
+                      <Button size="small" variant="outlined" onClick={copyTranscript} sx={{ color: '#8e24aa', borderColor: '#8e24aa' }}>Copy Transcript</Button>
                     </Stack>
                     <Box sx={{ mt: 1, maxHeight: 300, overflowY: 'auto', background: '#fff', p: 2, borderRadius: 1, fontSize: 14, fontFamily: 'monospace', whiteSpace: 'pre-wrap', boxShadow: 1 }}>
                       {result.transcript.map((line, idx) => (
@@ -433,6 +469,11 @@ export default function HomePage() {
                           <Typography variant="body2">{line.text}</Typography>
                         </Box>
                       ))}
+                      {result.transcript_handle?.next_offset != null && (
+                        <Button size="small" onClick={loadMoreTranscript} sx={{ color: '#8e24aa' }}>
+                          Load more ({result.transcript.length} of {result.transcript_handle.total_lines} lines)
+                        </Button>
+                      )}
                     </Box>
                   </CardContent>
                 </Card>
@@ -68,4 +68,568 @@ CREATE INDEX IF NOT EXISTS idx_feedback_analysis_id ON analysis_feedback(analysi
 
 -- Add top_comments column to video_analysis table
 ALTER TABLE video_analysis
-ADD COLUMN top_comments JSONB DEFAULT '[]'::jsonb;
\ No newline at end of file
+ADD COLUMN top_comments JSONB DEFAULT '[]'::jsonb;
+
+-- Canonical 11-character YouTube video ID, so URL variants of the same video
+-- (youtu.be/X, watch?v=X&t=30, m.youtube.com/...) resolve to one row
+ALTER TABLE videos
+ADD COLUMN youtube_video_id TEXT UNIQUE;
+
+-- URL variants of the same video collapse onto its oldest row
+CREATE TEMP TABLE video_ids AS
+SELECT id, youtube_video_id, first_value(id) OVER (PARTITION BY youtube_video_id ORDER BY created_at, id) AS keep_id
+FROM (
+  SELECT id, created_at, substring(youtube_url from '(?:v=|youtu\.be/|/shorts/|/embed/|/live/|/v/)([A-Za-z0-9_-]{11})') AS youtube_video_id
+  FROM videos
+) parsed
+WHERE youtube_video_id IS NOT NULL;
+
+-- Move analyses of duplicate rows onto the kept row. A user who already has one
+-- there (or several among the duplicates) keeps only the newest.
+UPDATE video_analysis va SET video_id = moved.keep_id
+FROM (
+  SELECT DISTINCT ON (ids.keep_id, dup.user_id) dup.id, ids.keep_id
+  FROM video_analysis dup
+  JOIN video_ids ids ON ids.id = dup.video_id
+  WHERE ids.id <> ids.keep_id
+    AND NOT EXISTS (SELECT 1 FROM video_analysis kept WHERE kept.video_id = ids.keep_id AND kept.user_id = dup.user_id)
+  ORDER BY ids.keep_id, dup.user_id, dup.created_at DESC
+) moved
+WHERE va.id = moved.id;
+
+DELETE FROM videos v USING video_ids ids
+WHERE v.id = ids.id AND ids.id <> ids.keep_id;
+
+UPDATE videos v SET youtube_video_id = ids.youtube_video_id
+FROM video_ids ids
+WHERE v.id = ids.id;
+
+DROP TABLE video_ids;
+
+-- shared_analysis table: one LLM analysis per canonical video, shared by all users
+CREATE TABLE IF NOT EXISTS shared_analysis (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  youtube_video_id TEXT UNIQUE NOT NULL,
+  summary TEXT,
+  key_takeaways JSONB,
+  hashtags JSONB,
+  twitter_thread JSONB,
+  transcript JSONB,
+  top_comments JSONB DEFAULT '[]'::jsonb,
+  created_at TIMESTAMPTZ DEFAULT timezone('utc'::text, now())
+);
+
+-- Per-user video_analysis rows become lightweight references to the shared layer
+ALTER TABLE video_analysis
+ADD COLUMN shared_analysis_id UUID REFERENCES shared_analysis(id) ON DELETE CASCADE;
+
+-- Seed the shared layer from existing per-user analyses
+INSERT INTO shared_analysis (youtube_video_id, summary, key_takeaways, hashtags, twitter_thread, transcript, top_comments)
+SELECT DISTINCT ON (v.youtube_video_id) v.youtube_video_id, va.summary, va.key_takeaways, va.hashtags, va.twitter_thread, va.transcript, va.top_comments
+FROM video_analysis va
+JOIN videos v ON v.id = va.video_id
+WHERE v.youtube_video_id IS NOT NULL
+ORDER BY v.youtube_video_id, va.created_at DESC
+ON CONFLICT (youtube_video_id) DO NOTHING;
+
+UPDATE video_analysis va SET shared_analysis_id = sa.id
+FROM videos v, shared_analysis sa
+WHERE v.id = va.video_id AND sa.youtube_video_id = v.youtube_video_id;
+
+-- inflight_analysis table: cross-worker leases for single-flight analysis runs
+-- (used when INFLIGHT_BACKEND=supabase)
+CREATE TABLE IF NOT EXISTS inflight_analysis (
+  key TEXT PRIMARY KEY,
+  owner TEXT NOT NULL,
+  expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- chunk_summaries table: map-step summaries of long transcripts, keyed by content hash
+-- so re-analysis and other output formats reuse them
+CREATE TABLE IF NOT EXISTS chunk_summaries (
+  content_hash TEXT PRIMARY KEY,
+  summary TEXT NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT timezone('utc'::text, now())
+);
+
+-- analysis_jobs table: queued /analyze requests ({"async": true}) for the worker pool
+-- (used when JOB_BACKEND=supabase)
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  idempotency_key TEXT NOT NULL,
+  user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  youtube_video_id TEXT NOT NULL,
+  tier subscription_tier NOT NULL,
+  priority INTEGER NOT NULL,
+  status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+  attempts INTEGER NOT NULL DEFAULT 0,
+  max_attempts INTEGER NOT NULL,
+  available_at TIMESTAMPTZ NOT NULL DEFAULT timezone('utc'::text, now()),
+  lease_owner TEXT,
+  lease_expires_at TIMESTAMPTZ,
+  result JSONB,
+  error TEXT,
+  created_at TIMESTAMPTZ DEFAULT timezone('utc'::text, now()),
+  updated_at TIMESTAMPTZ DEFAULT timezone('utc'::text, now())
+);
+
+-- One active job per user and video
+CREATE UNIQUE INDEX IF NOT EXISTS idx_analysis_jobs_active_key ON analysis_jobs(idempotency_key) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_analysis_jobs_ready ON analysis_jobs(status, priority, created_at);
+
+CREATE OR REPLACE FUNCTION enqueue_analysis_job(
+  p_idempotency_key TEXT,
+  p_user_id UUID,
+  p_youtube_video_id TEXT,
+  p_tier subscription_tier,
+  p_priority INTEGER,
+  p_max_attempts INTEGER,
+  p_max_pending INTEGER,
+  p_max_pending_per_user INTEGER
+) RETURNS TABLE (job_id UUID, outcome TEXT) AS $$
+DECLARE
+  v_job_id UUID;
+BEGIN
+  -- Serialize enqueues so the backpressure counts are exact
+  PERFORM pg_advisory_xact_lock(hashtext('analysis_jobs_enqueue'));
+  SELECT id INTO v_job_id FROM analysis_jobs
+  WHERE idempotency_key = p_idempotency_key AND status IN ('queued', 'running');
+  IF v_job_id IS NOT NULL THEN
+    RETURN QUERY SELECT v_job_id, 'existing'::TEXT;
+    RETURN;
+  END IF;
+  IF (SELECT count(*) FROM analysis_jobs WHERE status = 'queued') >= p_max_pending THEN
+    RETURN QUERY SELECT NULL::UUID, 'full'::TEXT;
+    RETURN;
+  END IF;
+  IF (SELECT count(*) FROM analysis_jobs WHERE status = 'queued' AND user_id = p_user_id) >= p_max_pending_per_user THEN
+    RETURN QUERY SELECT NULL::UUID, 'user_full'::TEXT;
+    RETURN;
+  END IF;
+  INSERT INTO analysis_jobs (idempotency_key, user_id, youtube_video_id, tier, priority, max_attempts)
+  VALUES (p_idempotency_key, p_user_id, p_youtube_video_id, p_tier, p_priority, p_max_attempts)
+  RETURNING id INTO v_job_id;
+  RETURN QUERY SELECT v_job_id, 'created'::TEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION claim_analysis_job(p_worker TEXT, p_visibility_seconds DOUBLE PRECISION)
+RETURNS SETOF analysis_jobs AS $$
+  UPDATE analysis_jobs SET
+    status = 'running',
+    attempts = attempts + 1,
+    lease_owner = p_worker,
+    lease_expires_at = now() + make_interval(secs => p_visibility_seconds),
+    updated_at = now()
+  WHERE id = (
+    SELECT id FROM analysis_jobs
+    WHERE (status = 'queued' AND available_at <= now())
+       OR (status = 'running' AND lease_expires_at <= now())
+    ORDER BY priority, created_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING *;
+$$ LANGUAGE sql;
+
+-- Records a batch's per-user analysis references, usage rows and credit charge
+-- in one transaction. p_items: [{"video_id": ..., "shared_analysis_id": ...}].
+-- Only newly created references are charged.
+CREATE OR REPLACE FUNCTION record_batch_analyses(p_user_id UUID, p_items JSONB)
+RETURNS JSONB AS $$
+DECLARE
+  v_analyses JSONB;
+  v_charged INTEGER;
+  v_credits INTEGER;
+BEGIN
+  WITH items AS (
+    SELECT (item->>'video_id')::UUID AS video_id, (item->>'shared_analysis_id')::UUID AS shared_analysis_id
+    FROM jsonb_array_elements(p_items) AS item
+  ), upserted AS (
+    INSERT INTO video_analysis (video_id, user_id, shared_analysis_id)
+    SELECT video_id, p_user_id, shared_analysis_id FROM items
+    ON CONFLICT (video_id, user_id) DO UPDATE SET shared_analysis_id = EXCLUDED.shared_analysis_id
+    RETURNING id, video_id, (xmax = 0) AS inserted
+  ), usage AS (
+    INSERT INTO user_usage (user_id, analysis_id)
+    SELECT p_user_id, id FROM upserted WHERE inserted
+  )
+  SELECT COALESCE(jsonb_agg(jsonb_build_object('id', id, 'video_id', video_id)), '[]'::jsonb), count(*) FILTER (WHERE inserted)
+  INTO v_analyses, v_charged
+  FROM upserted;
+
+  -- Free users can't go below zero, whatever else charged them since the batch started
+  UPDATE users SET credits_remaining = credits_remaining - v_charged
+  WHERE id = p_user_id AND (tier <> 'free' OR credits_remaining >= v_charged)
+  RETURNING credits_remaining INTO v_credits;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'credits_exhausted';
+  END IF;
+
+  RETURN jsonb_build_object('analyses', v_analyses, 'charged', v_charged, 'credits_remaining', v_credits);
+END;
+$$ LANGUAGE plpgsql;
+
+-- /analyze persistence in two round trips. begin_analysis fetches or creates
+-- the user, applies the monthly credit reset and looks up the video and the
+-- user's reference to its analysis; record_analysis stores the reference and,
+-- for a new one, charges the credit and logs usage in the same transaction.
+CREATE OR REPLACE FUNCTION begin_analysis(p_clerk_id TEXT, p_email TEXT, p_youtube_video_id TEXT DEFAULT NULL, p_monthly_credits INTEGER DEFAULT 5)
+RETURNS JSONB AS $$
+DECLARE
+  v_user users;
+  v_video videos;
+  v_analysis video_analysis;
+BEGIN
+  SELECT * INTO v_user FROM users WHERE clerk_id = p_clerk_id;
+  IF NOT FOUND THEN
+    INSERT INTO users (clerk_id, email) VALUES (p_clerk_id, p_email)
+    ON CONFLICT (clerk_id) DO NOTHING;
+    SELECT * INTO v_user FROM users WHERE clerk_id = p_clerk_id;
+  END IF;
+
+  -- The timestamp condition makes concurrent requests reset the credits only once
+  IF v_user.credits_last_reset < now() - interval '30 days' THEN
+    UPDATE users SET credits_remaining = p_monthly_credits, credits_last_reset = timezone('utc'::text, now())
+    WHERE id = v_user.id AND credits_last_reset < now() - interval '30 days';
+    SELECT * INTO v_user FROM users WHERE id = v_user.id;
+  END IF;
+
+  IF p_youtube_video_id IS NOT NULL THEN
+    SELECT * INTO v_video FROM videos WHERE youtube_video_id = p_youtube_video_id;
+    IF FOUND THEN
+      SELECT * INTO v_analysis FROM video_analysis WHERE video_id = v_video.id AND user_id = v_user.id;
+    END IF;
+  END IF;
+
+  RETURN jsonb_build_object(
+    'user', to_jsonb(v_user),
+    'video', CASE WHEN v_video.id IS NULL THEN NULL ELSE to_jsonb(v_video) END,
+    'analysis', CASE WHEN v_analysis.id IS NULL THEN NULL ELSE to_jsonb(v_analysis) END
+  );
+END;
+$$ LANGUAGE plpgsql;
+
+-- p_video is only needed when the videos row may not exist yet; without it a
+-- missing row raises 'video_not_found'. A new reference for a free user with no
+-- credits left raises 'credits_exhausted' and writes nothing.
+CREATE OR REPLACE FUNCTION record_analysis(p_user_id UUID, p_youtube_video_id TEXT, p_shared_analysis_id UUID, p_video JSONB DEFAULT NULL)
+RETURNS JSONB AS $$
+DECLARE
+  v_video videos;
+  v_analysis_id UUID;
+  v_inserted BOOLEAN;
+  v_credits INTEGER;
+BEGIN
+  SELECT * INTO v_video FROM videos WHERE youtube_video_id = p_youtube_video_id;
+  IF NOT FOUND THEN
+    IF p_video IS NULL THEN
+      RAISE EXCEPTION 'video_not_found';
+    END IF;
+    INSERT INTO videos (youtube_url, youtube_video_id, title, channel_name, channel_url, thumbnail_url, duration_seconds, published_date)
+    SELECT youtube_url, youtube_video_id, title, channel_name, channel_url, thumbnail_url, duration_seconds, published_date
+    FROM jsonb_populate_record(NULL::videos, p_video)
+    ON CONFLICT (youtube_video_id) DO NOTHING;
+    SELECT * INTO v_video FROM videos WHERE youtube_video_id = p_youtube_video_id;
+  END IF;
+
+  INSERT INTO video_analysis (video_id, user_id, shared_analysis_id)
+  VALUES (v_video.id, p_user_id, p_shared_analysis_id)
+  ON CONFLICT (video_id, user_id) DO UPDATE SET shared_analysis_id = EXCLUDED.shared_analysis_id
+  RETURNING id, (xmax = 0) INTO v_analysis_id, v_inserted;
+
+  IF v_inserted THEN
+    -- Checked and decremented in one statement, so concurrent requests can't overspend
+    UPDATE users SET credits_remaining = credits_remaining - 1
+    WHERE id = p_user_id AND (tier <> 'free' OR credits_remaining > 0)
+    RETURNING credits_remaining INTO v_credits;
+    IF NOT FOUND THEN
+      RAISE EXCEPTION 'credits_exhausted';
+    END IF;
+    INSERT INTO user_usage (user_id, analysis_id) VALUES (p_user_id, v_analysis_id);
+  END IF;
+
+  RETURN jsonb_build_object(
+    'analysis', jsonb_build_object('id', v_analysis_id, 'video_id', v_video.id, 'shared_analysis_id', p_shared_analysis_id),
+    'video', to_jsonb(v_video),
+    'charged', v_inserted,
+    'credits_remaining', v_credits
+  );
+END;
+$$ LANGUAGE plpgsql;
+
+-- video_transcripts table: each video's full transcript, stored once in a
+-- compressed columnar form (see app/services/transcripts.py). shared_analysis
+-- rows keep only the first page, plus the total line count.
+CREATE TABLE IF NOT EXISTS video_transcripts (
+  youtube_video_id TEXT PRIMARY KEY,
+  line_count INTEGER NOT NULL,
+  duration_seconds DOUBLE PRECISION,
+  starts TEXT NOT NULL, -- base64 zlib little-endian int32 millisecond deltas
+  texts TEXT NOT NULL, -- base64 zlib JSON array of line texts
+  created_at TIMESTAMPTZ DEFAULT timezone('utc'::text, now())
+);
+
+-- NULL until the row's transcript has been moved to video_transcripts
+ALTER TABLE shared_analysis
+ADD COLUMN IF NOT EXISTS transcript_lines INTEGER;
+
+-- Per-user copies of transcripts that already live on the shared layer
+UPDATE video_analysis SET transcript = NULL
+WHERE shared_analysis_id IS NOT NULL AND transcript IS NOT NULL;
+
+-- Content hash of each shared analysis, used for ETags without loading the row.
+-- New rows get it from the app; existing rows are hashed here (any stable value works).
+ALTER TABLE shared_analysis
+ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+UPDATE shared_analysis SET content_hash = md5(concat_ws('|', summary, key_takeaways::text, hashtags::text, twitter_thread::text, transcript::text, top_comments::text, transcript_lines::text))
+WHERE content_hash IS NULL;
+
+-- Fill user_usage.tokens_used and cost: record_analysis takes the request's LLM
+-- usage (zero when the analysis came from the shared layer), and batch items
+-- carry their own.
+DROP FUNCTION IF EXISTS record_analysis(UUID, TEXT, UUID, JSONB);
+
+CREATE OR REPLACE FUNCTION record_analysis(p_user_id UUID, p_youtube_video_id TEXT, p_shared_analysis_id UUID, p_video JSONB DEFAULT NULL, p_tokens_used INTEGER DEFAULT NULL, p_cost NUMERIC DEFAULT NULL)
+RETURNS JSONB AS $$
+DECLARE
+  v_video videos;
+  v_analysis_id UUID;
+  v_inserted BOOLEAN;
+  v_credits INTEGER;
+BEGIN
+  SELECT * INTO v_video FROM videos WHERE youtube_video_id = p_youtube_video_id;
+  IF NOT FOUND THEN
+    IF p_video IS NULL THEN
+      RAISE EXCEPTION 'video_not_found';
+    END IF;
+    INSERT INTO videos (youtube_url, youtube_video_id, title, channel_name, channel_url, thumbnail_url, duration_seconds, published_date)
+    SELECT youtube_url, youtube_video_id, title, channel_name, channel_url, thumbnail_url, duration_seconds, published_date
+    FROM jsonb_populate_record(NULL::videos, p_video)
+    ON CONFLICT (youtube_video_id) DO NOTHING;
+    SELECT * INTO v_video FROM videos WHERE youtube_video_id = p_youtube_video_id;
+  END IF;
+
+  INSERT INTO video_analysis (video_id, user_id, shared_analysis_id)
+  VALUES (v_video.id, p_user_id, p_shared_analysis_id)
+  ON CONFLICT (video_id, user_id) DO UPDATE SET shared_analysis_id = EXCLUDED.shared_analysis_id
+  RETURNING id, (xmax = 0) INTO v_analysis_id, v_inserted;
+
+  IF v_inserted THEN
+    UPDATE users SET credits_remaining = credits_remaining - 1
+    WHERE id = p_user_id AND (tier <> 'free' OR credits_remaining > 0)
+    RETURNING credits_remaining INTO v_credits;
+    IF NOT FOUND THEN
+      RAISE EXCEPTION 'credits_exhausted';
+    END IF;
+    INSERT INTO user_usage (user_id, analysis_id, tokens_used, cost) VALUES (p_user_id, v_analysis_id, p_tokens_used, p_cost);
+  END IF;
+
+  RETURN jsonb_build_object(
+    'analysis', jsonb_build_object('id', v_analysis_id, 'video_id', v_video.id, 'shared_analysis_id', p_shared_analysis_id),
+    'video', to_jsonb(v_video),
+    'charged', v_inserted,
+    'credits_remaining', v_credits
+  );
+END;
+$$ LANGUAGE plpgsql;
+
+-- p_items: [{"video_id": ..., "shared_analysis_id": ..., "tokens_used": ..., "cost": ...}]
+CREATE OR REPLACE FUNCTION record_batch_analyses(p_user_id UUID, p_items JSONB)
+RETURNS JSONB AS $$
+DECLARE
+  v_analyses JSONB;
+  v_charged INTEGER;
+  v_credits INTEGER;
+BEGIN
+  WITH items AS (
+    SELECT (item->>'video_id')::UUID AS video_id, (item->>'shared_analysis_id')::UUID AS shared_analysis_id,
+           (item->>'tokens_used')::INTEGER AS tokens_used, (item->>'cost')::NUMERIC AS cost
+    FROM jsonb_array_elements(p_items) AS item
+  ), upserted AS (
+    INSERT INTO video_analysis (video_id, user_id, shared_analysis_id)
+    SELECT video_id, p_user_id, shared_analysis_id FROM items
+    ON CONFLICT (video_id, user_id) DO UPDATE SET shared_analysis_id = EXCLUDED.shared_analysis_id
+    RETURNING id, video_id, (xmax = 0) AS inserted
+  ), usage AS (
+    INSERT INTO user_usage (user_id, analysis_id, tokens_used, cost)
+    SELECT p_user_id, upserted.id, items.tokens_used, items.cost
+    FROM upserted JOIN items ON items.video_id = upserted.video_id
+    WHERE upserted.inserted
+  )
+  SELECT COALESCE(jsonb_agg(jsonb_build_object('id', id, 'video_id', video_id)), '[]'::jsonb), count(*) FILTER (WHERE inserted)
+  INTO v_analyses, v_charged
+  FROM upserted;
+
+  -- Free users can't go below zero, whatever else charged them since the batch started
+  UPDATE users SET credits_remaining = credits_remaining - v_charged
+  WHERE id = p_user_id AND (tier <> 'free' OR credits_remaining >= v_charged)
+  RETURNING credits_remaining INTO v_credits;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'credits_exhausted';
+  END IF;
+
+  RETURN jsonb_build_object('analyses', v_analyses, 'charged', v_charged, 'credits_remaining', v_credits);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transcript search. Each video_transcripts row carries a compact inverted index
+-- of its lines (see app/services/search.py) for in-video search, and its distinct
+-- words for the Postgres full-text index used by library search. Rows stored
+-- before this get both on their first in-video search.
+ALTER TABLE video_transcripts
+ADD COLUMN IF NOT EXISTS search_index TEXT, -- base64 zlib postings, see encode_index
+ADD COLUMN IF NOT EXISTS search_terms TEXT;
+
+ALTER TABLE video_transcripts
+ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (setweight(to_tsvector('english', coalesce(search_terms, '')), 'C')) STORED;
+
+ALTER TABLE videos
+ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (setweight(to_tsvector('english', coalesce(title, '') || ' ' || coalesce(channel_name, '')), 'A')) STORED;
+
+ALTER TABLE shared_analysis
+ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (
+  setweight(to_tsvector('english', coalesce(summary, '')), 'B') ||
+  setweight(to_tsvector('english', coalesce(key_takeaways::text, '') || ' ' || coalesce(hashtags::text, '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_video_transcripts_search ON video_transcripts USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_videos_search ON videos USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_shared_analysis_search ON shared_analysis USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_video_analysis_user_id ON video_analysis(user_id);
+
+-- A user's analyses matching a web-search style query (quotes, OR, -word), best first
+CREATE OR REPLACE FUNCTION search_library(p_clerk_id TEXT, p_query TEXT, p_limit INTEGER DEFAULT 20)
+RETURNS JSONB AS $$
+  WITH q AS (
+    SELECT websearch_to_tsquery('english', p_query) AS query
+  ), matches AS (
+    SELECT va.id AS analysis_id, v.youtube_video_id, v.title, v.channel_name, v.thumbnail_url, sa.summary,
+           coalesce(vt.search_vector @@ q.query, false) AS transcript_match,
+           ts_rank(v.search_vector || sa.search_vector || coalesce(vt.search_vector, ''::tsvector), q.query) AS rank
+    FROM q, users u
+    JOIN video_analysis va ON va.user_id = u.id
+    JOIN videos v ON v.id = va.video_id
+    JOIN shared_analysis sa ON sa.id = va.shared_analysis_id
+    LEFT JOIN video_transcripts vt ON vt.youtube_video_id = v.youtube_video_id
+    WHERE u.clerk_id = p_clerk_id
+      AND (v.search_vector @@ q.query OR sa.search_vector @@ q.query OR vt.search_vector @@ q.query)
+    ORDER BY rank DESC
+    LIMIT p_limit
+  )
+  -- ts_headline is slow, so only for the rows returned
+  SELECT coalesce(jsonb_agg(jsonb_build_object(
+    'analysis_id', m.analysis_id,
+    'youtube_video_id', m.youtube_video_id,
+    'title', m.title,
+    'channel_name', m.channel_name,
+    'thumbnail_url', m.thumbnail_url,
+    'rank', m.rank,
+    'headline', ts_headline('english', coalesce(m.summary, ''), q.query, 'MaxFragments=1, MinWords=10, MaxWords=30'),
+    'transcript_match', m.transcript_match
+  ) ORDER BY m.rank DESC), '[]'::jsonb)
+  FROM matches m, q;
+$$ LANGUAGE sql STABLE;
+
+-- rate_limit_buckets table: token buckets for admission control, shared by every
+-- API worker (used when ADMISSION_BACKEND=supabase)
+CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+  key TEXT PRIMARY KEY,
+  tokens DOUBLE PRECISION NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL
+);
+
+-- p_buckets: [{"key": ..., "rate": tokens per second, "capacity": ...}]. Takes p_amount
+-- from every bucket and returns 0, or takes nothing and returns the seconds to wait.
+CREATE OR REPLACE FUNCTION take_rate_limit_tokens(p_buckets JSONB, p_amount DOUBLE PRECISION DEFAULT 1)
+RETURNS DOUBLE PRECISION AS $$
+DECLARE
+  v_now TIMESTAMPTZ := clock_timestamp();
+  v_wait DOUBLE PRECISION;
+BEGIN
+  -- Create and lock the rows in key order, so overlapping calls can't deadlock
+  INSERT INTO rate_limit_buckets (key, tokens, updated_at)
+  SELECT b->>'key', (b->>'capacity')::DOUBLE PRECISION, v_now
+  FROM jsonb_array_elements(p_buckets) AS b
+  ORDER BY b->>'key'
+  ON CONFLICT (key) DO NOTHING;
+
+  PERFORM 1 FROM rate_limit_buckets
+  WHERE key IN (SELECT b->>'key' FROM jsonb_array_elements(p_buckets) AS b)
+  ORDER BY key
+  FOR UPDATE;
+
+  WITH levels AS (
+    SELECT least((b->>'capacity')::DOUBLE PRECISION, r.tokens + extract(epoch FROM v_now - r.updated_at) * (b->>'rate')::DOUBLE PRECISION) AS tokens,
+           least(p_amount, (b->>'capacity')::DOUBLE PRECISION) AS needed,
+           (b->>'rate')::DOUBLE PRECISION AS rate
+    FROM jsonb_array_elements(p_buckets) AS b
+    JOIN rate_limit_buckets r ON r.key = b->>'key'
+  )
+  SELECT coalesce(max((needed - tokens) / rate) FILTER (WHERE tokens < needed), 0) INTO v_wait FROM levels;
+
+  IF v_wait > 0 THEN
+    RETURN v_wait;
+  END IF;
+
+  UPDATE rate_limit_buckets r
+  SET tokens = least((b->>'capacity')::DOUBLE PRECISION, r.tokens + extract(epoch FROM v_now - r.updated_at) * (b->>'rate')::DOUBLE PRECISION)
+               - least(p_amount, (b->>'capacity')::DOUBLE PRECISION),
+      updated_at = v_now
+  FROM jsonb_array_elements(p_buckets) AS b
+  WHERE r.key = b->>'key';
+  RETURN 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Jobs whose lease expired on their last allowed attempt (the worker crashed or
+-- was killed) fail instead of being reclaimed forever
+CREATE OR REPLACE FUNCTION claim_analysis_job(p_worker TEXT, p_visibility_seconds DOUBLE PRECISION)
+RETURNS SETOF analysis_jobs AS $$
+  UPDATE analysis_jobs SET
+    status = 'failed',
+    error = 'lease expired',
+    lease_owner = NULL,
+    lease_expires_at = NULL,
+    updated_at = now()
+  WHERE status = 'running' AND lease_expires_at <= now() AND attempts >= max_attempts;
+
+  UPDATE analysis_jobs SET
+    status = 'running',
+    attempts = attempts + 1,
+    lease_owner = p_worker,
+    lease_expires_at = now() + make_interval(secs => p_visibility_seconds),
+    updated_at = now()
+  WHERE id = (
+    SELECT id FROM analysis_jobs
+    WHERE (status = 'queued' AND available_at <= now())
+       OR (status = 'running' AND lease_expires_at <= now())
+    ORDER BY priority, created_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING *;
+$$ LANGUAGE sql;
+
+-- analysis_batches table: progress of /analyze/batch runs, saved by the worker
+-- running each batch so any worker can report it (used when JOB_BACKEND=supabase)
+CREATE TABLE IF NOT EXISTS analysis_batches (
+  id UUID PRIMARY KEY,
+  user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  status TEXT NOT NULL CHECK (status IN ('running', 'completed', 'failed')),
+  state JSONB NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT timezone('utc'::text, now()),
+  updated_at TIMESTAMPTZ DEFAULT timezone('utc'::text, now())
+);
+
+CREATE INDEX IF NOT EXISTS idx_analysis_batches_user_id ON analysis_batches(user_id);
+
+-- begin_analysis for a user known by ID: queued jobs carry users.id, not the Clerk ID
+CREATE OR REPLACE FUNCTION begin_job_analysis(p_user_id UUID, p_youtube_video_id TEXT, p_monthly_credits INTEGER DEFAULT 5)
+RETURNS JSONB AS $$
+  SELECT begin_analysis(clerk_id, email, p_youtube_video_id, p_monthly_credits) FROM users WHERE id = p_user_id;
+$$ LANGUAGE sql;
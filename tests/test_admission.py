@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from app.services.admission import AdmissionController, LocalRateLimitBackend, OverloadedError, RateLimitedError, SQLiteRateLimitBackend
+
+# Slow refill, so the buckets don't visibly change while a test runs
+RATE = 1 / 3600
+
+def test_local_take_refunds_earlier_buckets_when_a_later_one_denies():
+    backend = LocalRateLimitBackend()
+    buckets = [("user:a", RATE, 5), ("tier:free", RATE, 1)]
+    assert backend.take(buckets, 1) == 0
+    assert backend.take(buckets, 1) > 0
+    assert backend.buckets.get("user:a").tokens == pytest.approx(4, abs=0.01)
+    assert backend.buckets.get("tier:free").tokens == pytest.approx(0, abs=0.01)
+
+def test_sqlite_take_leaves_every_bucket_untouched_on_denial(tmp_path):
+    backend = SQLiteRateLimitBackend(str(tmp_path / "limits.db"))
+    buckets = [("user:a", RATE, 5), ("tier:free", RATE, 1)]
+    assert backend.take(buckets, 1) == 0
+    assert backend.take(buckets, 1) > 0
+    # Four tokens are left in the user bucket: four more takes succeed, the fifth waits
+    for _ in range(4):
+        assert backend.take([("user:a", RATE, 5)], 1) == 0
+    assert backend.take([("user:a", RATE, 5)], 1) > 0
+
+def test_admit_charges_user_and_tier_buckets():
+    controller = AdmissionController(LocalRateLimitBackend(), user_limits="free:1/2", tier_limits="free:1/3")
+
+    async def scenario():
+        await controller.admit("a")
+        await controller.admit("a")
+        with pytest.raises(RateLimitedError) as denied:
+            await controller.admit("a")
+        assert denied.value.retry_after >= 1
+        # The tier bucket has one token left for another user
+        await controller.admit("b")
+        with pytest.raises(RateLimitedError):
+            await controller.admit("c")
+
+    asyncio.run(scenario())
+
+def test_unlimited_tier_is_always_admitted():
+    controller = AdmissionController(LocalRateLimitBackend(), user_limits="free:1/1", tier_limits="")
+    controller.remember_tier("a", "pro")
+
+    async def scenario():
+        for _ in range(5):
+            await controller.admit("a")
+
+    asyncio.run(scenario())
+
+def test_pipeline_slot_turns_callers_away_when_waiting_is_full():
+    controller = AdmissionController(LocalRateLimitBackend(), max_concurrent=1, max_waiting=1, wait_seconds=5)
+
+    async def hold(release: asyncio.Event):
+        async with controller.pipeline_slot():
+            await release.wait()
+
+    async def scenario():
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(release))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold(asyncio.Event()))
+        await asyncio.sleep(0)
+        assert (controller.running, controller.waiting) == (1, 1)
+        with pytest.raises(OverloadedError):
+            async with controller.pipeline_slot():
+                pass
+        release.set()
+        await holder
+        await asyncio.sleep(0.01)
+        assert (controller.running, controller.waiting) == (1, 0)
+        waiter.cancel()
+
+    asyncio.run(scenario())
+
+def test_pipeline_slot_times_out_waiting():
+    controller = AdmissionController(LocalRateLimitBackend(), max_concurrent=1, max_waiting=4, wait_seconds=0.05)
+
+    async def scenario():
+        async with controller.pipeline_slot():
+            with pytest.raises(OverloadedError):
+                async with controller.pipeline_slot():
+                    pass
+        assert (controller.running, controller.waiting) == (0, 0)
+
+    asyncio.run(scenario())
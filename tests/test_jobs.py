@@ -0,0 +1,76 @@
+import time
+import pytest
+from app.services.jobs import LEASE_EXPIRED_ERROR, LocalJobBackend, QueueFullError, SQLiteJobBackend
+
+@pytest.fixture(params=["local", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "local":
+        return LocalJobBackend(max_attempts=2)
+    return SQLiteJobBackend(str(tmp_path / "jobs.db"), max_attempts=2)
+
+def enqueue(backend, user_id="user", video_id="video", tier="free"):
+    return backend.enqueue(user_id, video_id, tier, max_pending=10, max_pending_per_user=2)
+
+def test_enqueue_is_idempotent_while_active(backend):
+    job, created = enqueue(backend)
+    again, created_again = enqueue(backend)
+    assert created and not created_again
+    assert again["id"] == job["id"]
+
+def test_enqueue_refuses_when_user_has_too_many_queued(backend):
+    enqueue(backend, video_id="a")
+    enqueue(backend, video_id="b")
+    with pytest.raises(QueueFullError):
+        enqueue(backend, video_id="c")
+
+def test_claim_prefers_higher_tier(backend):
+    enqueue(backend, user_id="free-user", tier="free")
+    pro, _ = enqueue(backend, user_id="pro-user", tier="pro")
+    assert backend.claim("worker", visibility=60)["id"] == pro["id"]
+
+def test_claim_hides_job_until_visibility_timeout(backend):
+    job, _ = enqueue(backend)
+    assert backend.claim("worker-a", visibility=60)["id"] == job["id"]
+    assert backend.claim("worker-b", visibility=60) is None
+
+def test_expired_lease_is_reclaimed_by_another_worker(backend):
+    job, _ = enqueue(backend)
+    backend.claim("dead-worker", visibility=0.05)
+    time.sleep(0.1)
+    reclaimed = backend.claim("worker-b", visibility=60)
+    assert reclaimed["id"] == job["id"]
+    assert reclaimed["attempts"] == 2
+    assert reclaimed["lease_owner"] == "worker-b"
+    # The dead worker's late completion must not clobber the new owner's run
+    backend.complete(job["id"], "dead-worker", {"summary": "stale"})
+    assert backend.get(job["id"])["status"] == "running"
+
+def test_expired_lease_on_last_attempt_fails_the_job(backend):
+    job, _ = enqueue(backend)
+    backend.claim("worker-a", visibility=0.05)
+    time.sleep(0.1)
+    backend.claim("worker-b", visibility=0.05)
+    time.sleep(0.1)
+    assert backend.claim("worker-c", visibility=60) is None
+    failed = backend.get(job["id"])
+    assert failed["status"] == "failed"
+    assert failed["error"] == LEASE_EXPIRED_ERROR
+    # A failed job no longer blocks a fresh request for the same video
+    _, created = enqueue(backend)
+    assert created
+
+def test_fail_with_retry_requeues_after_delay(backend):
+    job, _ = enqueue(backend)
+    backend.claim("worker", visibility=60)
+    backend.fail(job["id"], "worker", "transcript timeout", retry_in=0.05)
+    assert backend.claim("worker", visibility=60) is None
+    time.sleep(0.1)
+    assert backend.claim("worker", visibility=60)["id"] == job["id"]
+
+def test_complete_stores_result(backend):
+    job, _ = enqueue(backend)
+    backend.claim("worker", visibility=60)
+    backend.complete(job["id"], "worker", {"analysis_id": "abc"})
+    done = backend.get(job["id"])
+    assert done["status"] == "succeeded"
+    assert done["result"] == {"analysis_id": "abc"}
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from app.services.llm import LLMError, LLMResult, LLMService, LLMTransport, RateLimitedError
+
+class StubTransport(LLMTransport):
+    def __init__(self, delay: float = 0.0, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.started = asyncio.Event()
+
+    async def complete(self, messages, *, model, max_tokens, temperature, timeout, response_format=None, on_delta=None):
+        self.started.set()
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return LLMResult(content="ok", prompt_tokens=10, completion_tokens=5)
+
+def make_service(transport: LLMTransport, **kwargs) -> LLMService:
+    kwargs.setdefault("initial_concurrency", 4)
+    return LLMService(transport=transport, requests_per_minute=60000, tokens_per_minute=10_000_000, **kwargs)
+
+def test_cancelled_call_releases_its_slot():
+    transport = StubTransport(delay=10)
+    service = make_service(transport)
+
+    async def scenario():
+        call = asyncio.create_task(service.generate("hello", max_tokens=16))
+        await transport.started.wait()
+        assert service.concurrency.in_flight == 1
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+    asyncio.run(scenario())
+    assert service.concurrency.in_flight == 0
+
+def test_timed_out_attempt_releases_slot_and_backs_off():
+    service = make_service(StubTransport(delay=10), max_retries=0)
+
+    async def scenario():
+        with pytest.raises(LLMError):
+            await service.generate("hello", max_tokens=16, deadline=0.1)
+
+    asyncio.run(scenario())
+    assert service.concurrency.in_flight == 0
+    assert service.concurrency.limit == 2
+
+def test_rate_limited_attempt_backs_off_and_other_errors_do_not():
+    limited = make_service(StubTransport(error=RateLimitedError("slow down")), max_retries=0)
+    broken = make_service(StubTransport(error=ValueError("bad request")), max_retries=0)
+
+    async def scenario():
+        with pytest.raises(LLMError):
+            await limited.generate("hello", max_tokens=16)
+        with pytest.raises(ValueError):
+            await broken.generate("hello", max_tokens=16)
+
+    asyncio.run(scenario())
+    assert (limited.concurrency.in_flight, limited.concurrency.limit) == (0, 2)
+    assert broken.concurrency.in_flight == 0
+    assert broken.concurrency.limit > 4
+
+def test_successful_call_releases_slot():
+    service = make_service(StubTransport())
+    result = asyncio.run(service.generate("hello", max_tokens=16))
+    assert result.content == "ok"
+    assert service.concurrency.in_flight == 0
@@ -0,0 +1,18 @@
+from app.services.preprocess import strip_overlap, transcript_preprocessor
+
+def test_strip_overlap_removes_rolling_caption_repeat():
+    assert strip_overlap("we are going to look at the", "going to look at the system") == "system"
+
+def test_strip_overlap_keeps_single_shared_word():
+    assert strip_overlap("I told you no", "no way that works") == "no way that works"
+    assert strip_overlap("it is time to go", "go go go") == "go go go"
+
+def test_strip_overlap_keeps_two_shared_words():
+    assert strip_overlap("we did it all the", "all the way down") == "all the way down"
+
+def test_process_keeps_words_across_lines():
+    result = transcript_preprocessor.process([
+        {"start": 0.0, "text": "I told you no"},
+        {"start": 1.5, "text": "no way that works."},
+    ])
+    assert [segment["text"] for segment in result.segments] == ["I told you no no way that works."]
@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from app.services.singleflight import LocalInFlightBackend, SQLiteInFlightBackend, SingleFlight
+
+@pytest.fixture(params=["local", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "local":
+        return LocalInFlightBackend()
+    return SQLiteInFlightBackend(str(tmp_path / "inflight.db"))
+
+def test_takes_over_lease_left_by_dead_worker(backend):
+    # Another worker acquired the lease and died without releasing it
+    assert backend.try_acquire("video", "dead-worker", 0.2)
+    flight = SingleFlight(backend, lease_seconds=5, poll_seconds=0.05)
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        return "fresh"
+
+    async def lookup():
+        return None
+
+    assert asyncio.run(flight.do("video", fn, lookup)) == "fresh"
+    assert calls == [1]
+    assert not backend.is_held("video")
+
+def test_follower_reads_leader_result_through_lookup(backend):
+    assert backend.try_acquire("video", "leader", 5)
+    flight = SingleFlight(backend, lease_seconds=5, poll_seconds=0.05)
+    stored = {}
+
+    async def fn():
+        raise AssertionError("follower must not run the pipeline")
+
+    async def lookup():
+        return stored.get("video")
+
+    async def scenario():
+        follower = asyncio.create_task(flight.do("video", fn, lookup))
+        await asyncio.sleep(0.1)
+        assert flight.in_flight("video")
+        stored["video"] = "from leader"
+        backend.release("video", "leader")
+        return await follower
+
+    assert asyncio.run(scenario()) == "from leader"
+    assert not flight.in_flight("video")
+
+def test_concurrent_callers_share_one_run(backend):
+    flight = SingleFlight(backend, lease_seconds=5, poll_seconds=0.05)
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "shared"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("video", fn) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["shared"] * 5
+    assert calls == [1]
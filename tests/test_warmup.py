@@ -0,0 +1,19 @@
+import pytest
+from app import warmup
+
+def test_warmup_is_refused_without_a_configured_token(monkeypatch):
+    monkeypatch.setattr(warmup, "WARMUP_TOKEN", "")
+    assert not warmup.warmup_authorized("Bearer ")
+    assert not warmup.warmup_authorized(None)
+
+@pytest.mark.parametrize("header, allowed", [
+    ("Bearer s3cret", True),
+    ("bearer s3cret", True),
+    ("Bearer wrong", False),
+    ("Basic s3cret", False),
+    ("s3cret", False),
+    (None, False),
+])
+def test_warmup_requires_matching_bearer_token(monkeypatch, header, allowed):
+    monkeypatch.setattr(warmup, "WARMUP_TOKEN", "s3cret")
+    assert warmup.warmup_authorized(header) is allowed
@@ -0,0 +1,42 @@
+import pytest
+from app.utils.youtube import extract_video_id
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+@pytest.mark.parametrize("url", [
+    VIDEO_ID,
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://youtube.com/watch?feature=share&v={VIDEO_ID}&t=42",
+    f"http://m.youtube.com/watch?v={VIDEO_ID}",
+    f"https://music.youtube.com/watch?v={VIDEO_ID}&list=RD{VIDEO_ID}",
+    f"www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}?si=abc",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}",
+    f"https://www.youtube.com/embed/{VIDEO_ID}?start=10",
+    f"https://www.youtube.com/live/{VIDEO_ID}",
+    f"https://www.youtube.com/v/{VIDEO_ID}",
+    f"  https://WWW.YouTube.com/watch?v={VIDEO_ID}  ",
+])
+def test_extracts_id_from_youtube_urls(url):
+    assert extract_video_id(url) == VIDEO_ID
+
+@pytest.mark.parametrize("url", [
+    f"https://evil.example/watch?v={VIDEO_ID}",
+    f"https://youtube.com.evil.example/watch?v={VIDEO_ID}",
+    f"https://notyoutu.be/{VIDEO_ID}",
+    f"https://example.com/?redirect=https://youtu.be/{VIDEO_ID}",
+    f"javascript://www.youtube.com/watch?v={VIDEO_ID}",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQX",
+    "https://www.youtube.com/watch?v=dQw4w9WgXc",
+    "https://youtu.be/dQw4w9WgXcé",
+    "dQw4w9WgXcé",
+    "https://www.youtube.com/channel/UCuAXFkgsw1L7xaCfnd5JJOw",
+    "",
+])
+def test_rejects_other_urls(url):
+    assert extract_video_id(url) is None
+
+def test_rejects_non_ascii_word_characters():
+    # \w would accept these; YouTube IDs are ASCII only
+    assert extract_video_id("dQw4w9WgXcé") is None
+    assert extract_video_id("https://www.youtube.com/shorts/ａｂｃｄｅｆｇｈｉｊｋ") is None